@@ -3,16 +3,38 @@ import sys
 import discord
 from discord.ext import commands, tasks
 import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.sql import SQL, Identifier, Literal
 from dotenv import load_dotenv
 import requests
 import io
 import asyncio
 import re
+import bisect
+import itertools
+import random
+import contextlib
+import tempfile
+import zipfile
+import shutil
+import gzip
+import csv
+from html import escape as escapar_html
+import codecs
+from html.parser import HTMLParser
+import math
+import hashlib
+import time
+import json
+import uuid
+import typing
 import aiohttp
 from bs4 import BeautifulSoup
 from discord.ext import tasks
 from deep_translator import GoogleTranslator
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # --- CONFIGURAÇÕES ---
 def carregar_config():
@@ -53,182 +75,721 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.voice_states = True # <-- ESSA LINHA É OBRIGATÓRIA
-bot = commands.Bot(command_prefix="/", intents=intents)
+class BotRep(commands.Bot):
+    async def close(self):
+        try: await livro_rep.descarregar()
+        except Exception as e: print(f"❌ Erro ao gravar reputação pendente: {e}")
+        livro_rep.fechar()
+        try: await cache_nomes.gravar()
+        except Exception as e: print(f"❌ Erro ao gravar nomes pendentes: {e}")
+        tradutor_noticias.fechar()
+        await http.fechar()
+        await db.fechar()
+        await super().close()
+
+bot = BotRep(command_prefix="/", intents=intents)
 
 # IDs de Configuração
 CANAL_NOTICIAS_ID = 1412423357541908524
 CANAL_MIDIA_ID = 1412423357382529098
 URL_BASE = "https://arcraiders.com"
 URL_NEWS = "https://arcraiders.com/news"
-ULTIMA_NOTICIA_URL = None
-ULTIMO_VIDEO_ID = None
-ULTIMO_SHORTS_ID = None
+NOTICIAS_POR_VARREDURA = 10
+VIDEOS_POR_VARREDURA = 10
+TRADUCAO_CACHE = os.getenv('TRADUCAO_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traducoes_cache.json'))
+TRADUCAO_TIMEOUT = int(os.getenv('TRADUCAO_TIMEOUT', 15))
+
+# --- CLIENTE HTTP COMPARTILHADO ---
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36", "Accept-Language": "en-US,en;q=0.9"}
+
+class ClienteHTTP:
+    """Uma única sessão aiohttp para todos os monitores: pool de conexões com keep-alive,
+    limite de conexões por host, mesmos timeouts/headers e retry com backoff + jitter."""
+
+    STATUS_TEMPORARIOS = (429, 500, 502, 503, 504)
+
+    def __init__(self, limite=20, limite_por_host=4, timeout=40, tentativas=3):
+        self.limite = limite
+        self.limite_por_host = limite_por_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=10)
+        self.tentativas = tentativas
+        self.validadores = {}   # url -> {"etag", "modificado", "hash"} da última resposta
+        self._sessao = None
+
+    def sessao(self):
+        # Criada sob demanda porque o aiohttp precisa do loop já rodando
+        if self._sessao is None or self._sessao.closed:
+            conector = aiohttp.TCPConnector(limit=self.limite, limit_per_host=self.limite_por_host, ttl_dns_cache=300, keepalive_timeout=60)
+            self._sessao = aiohttp.ClientSession(connector=conector, timeout=self.timeout, headers=HTTP_HEADERS)
+        return self._sessao
+
+    @staticmethod
+    def _espera(tentativa, retry_after=None):
+        if retry_after and retry_after.isdigit(): return min(60, int(retry_after))
+        return random.uniform(0, min(30, 2 ** tentativa))  # "full jitter"
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        """GET com retry em erro de rede e status temporário. Uso: async with http.get(url) as resp."""
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                resp = await self.sessao().get(url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if tentativa == self.tentativas: raise
+                await asyncio.sleep(self._espera(tentativa))
+                continue
+            if resp.status in self.STATUS_TEMPORARIOS and tentativa < self.tentativas:
+                espera = self._espera(tentativa, resp.headers.get("Retry-After"))
+                resp.release()
+                print(f"⚠️ [HTTP] {url} respondeu {resp.status}, nova tentativa em {espera:.1f}s")
+                await asyncio.sleep(espera)
+                continue
+            try:
+                yield resp
+            finally:
+                resp.release()
+            return
+
+    async def buscar_se_mudou(self, url, extrator, pedaco=16384):
+        """GET condicional com leitura em streaming. O corpo vai pedaço por pedaço para o extrator
+        e a leitura para assim que ele achar o que procura. Devolve extrator.encontrados, ou None
+        se nada mudou desde a última chamada (304, ou os mesmos itens quando o servidor ignora
+        If-None-Match/If-Modified-Since)."""
+        anterior = self.validadores.get(url, {})
+        headers = {}
+        if anterior.get("etag"): headers["If-None-Match"] = anterior["etag"]
+        if anterior.get("modificado"): headers["If-Modified-Since"] = anterior["modificado"]
+        async with self.get(url, headers=headers) as resp:
+            if resp.status == 304:
+                return None
+            if resp.status != 200:
+                print(f"⚠️ [HTTP] Erro ao acessar {url}: Status {resp.status}")
+                return None
+            decodificador = codecs.getincrementaldecoder(resp.charset or "utf-8")(errors="replace")
+            async for bloco in resp.content.iter_chunked(pedaco):
+                extrator.alimentar(decodificador.decode(bloco))
+                if extrator.terminou:
+                    # Não vale a pena ler o resto (a página do YouTube tem vários MB): fecha a conexão
+                    resp.close()
+                    break
+            etag, modificado = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        digest = hashlib.sha1(json.dumps(extrator.encontrados).encode("utf-8")).hexdigest()
+        self.validadores[url] = {"etag": etag, "modificado": modificado, "hash": digest}
+        if digest == anterior.get("hash"):
+            return None
+        return extrator.encontrados
+
+    async def baixar(self, url, destino, pedaco=64 * 1024):
+        """Baixa url em streaming para um arquivo aberto (sem o timeout total: anexos podem ser grandes)."""
+        tamanho = 0
+        async with self.get(url, timeout=aiohttp.ClientTimeout(total=None, connect=10, sock_read=60)) as resp:
+            if resp.status != 200: raise ValueError(f"status {resp.status}")
+            async for bloco in resp.content.iter_chunked(pedaco):
+                destino.write(bloco)
+                tamanho += len(bloco)
+        return tamanho
+
+    async def fechar(self):
+        if self._sessao and not self._sessao.closed:
+            await self._sessao.close()
+
+http = ClienteHTTP()
+
+# --- EXTRATORES EM STREAMING ---
+class ExtratorLinks(HTMLParser):
+    """Parser incremental de HTML: guarda os primeiros hrefs que contêm o filtro."""
+
+    def __init__(self, filtro, limite=1):
+        super().__init__(convert_charrefs=True)
+        self.filtro = filtro
+        self.limite = limite
+        self.encontrados = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a" or self.terminou: return
+        href = dict(attrs).get("href")
+        if href and self.filtro in href and href not in self.encontrados:
+            self.encontrados.append(href)
+
+    @property
+    def terminou(self):
+        return len(self.encontrados) >= self.limite
+
+    def alimentar(self, texto):
+        self.feed(texto)
+
+class ScannerRegex:
+    """Aplica um regex compilado nos pedaços conforme chegam, guardando só o fim do pedaço
+    anterior para não perder um match que ficou cortado entre dois pedaços."""
+
+    def __init__(self, padrao, limite=1, sobreposicao=256):
+        self.padrao = padrao
+        self.limite = limite
+        self.sobreposicao = sobreposicao
+        self.encontrados = []
+        self._resto = ""
+
+    @property
+    def terminou(self):
+        return len(self.encontrados) >= self.limite
+
+    def alimentar(self, texto):
+        buffer = self._resto + texto
+        fim = 0
+        for match in self.padrao.finditer(buffer):
+            fim = match.end()
+            if match.group(1) not in self.encontrados:
+                self.encontrados.append(match.group(1))
+                if self.terminou: break
+        self._resto = buffer[max(fim, len(buffer) - self.sobreposicao):]
+
+RE_VIDEO_ID = re.compile(r'"videoId":"([^"]+)"')
+
+# --- SERVIÇO DE TRADUÇÃO ---
+def traduzir_google(textos):
+    return GoogleTranslator(source='en', target='pt').translate_batch(textos)
+
+class ServicoTraducao:
+    """Traduz fora do loop do bot, em lote por artigo, com cache em disco (LRU por hash do texto).
+    Se o tradutor demorar mais que o timeout ou falhar, devolve o texto original.
+
+    Uma chamada que estoura o timeout não tem como ser interrompida (o deep_translator não
+    aceita timeout de HTTP) e segue ocupando a thread. Por isso as chamadas em andamento são
+    contadas: com todas as threads presas, a tradução é pulada na hora em vez de entrar na fila."""
+
+    def __init__(self, backend, caminho_cache, limite=500, timeout=15, threads=2):
+        self.backend = backend              # callable(lista de textos) -> lista de traduções, bloqueante
+        self.caminho_cache = caminho_cache
+        self.limite = limite
+        self.timeout = timeout
+        self.threads = threads
+        self.cache = OrderedDict()          # sha256 do texto -> tradução, do menos para o mais usado
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="traducao")
+        self._carregado = False
+        self._em_andamento = 0              # chamadas ao backend que ainda não voltaram (inclusive as que estouraram o timeout)
+
+    @staticmethod
+    def _chave(texto):
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _ler_disco(self):
+        try:
+            with open(self.caminho_cache, encoding="utf-8") as f:
+                return OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            return OrderedDict()
+
+    def _gravar_disco(self, itens):
+        temporario = self.caminho_cache + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(itens, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho_cache)
+
+    async def traduzir(self, textos):
+        if not self._carregado:
+            self.cache = await asyncio.to_thread(self._ler_disco)
+            self._carregado = True
+        resultado = list(textos)
+        faltando = {}                       # texto -> posições no resultado
+        for i, texto in enumerate(textos):
+            if not texto: continue
+            chave = self._chave(texto)
+            if chave in self.cache:
+                self.cache.move_to_end(chave)
+                resultado[i] = self.cache[chave]
+            else:
+                faltando.setdefault(texto, []).append(i)
+        if not faltando: return resultado
+
+        if self._em_andamento >= self.threads:
+            print(f"⚠️ Tradutor com {self._em_andamento} chamadas presas, postando o texto original.")
+            return resultado
+
+        originais = list(faltando)
+        loop = asyncio.get_running_loop()
+        try:
+            futuro = self._executor.submit(self.backend, originais)
+            self._em_andamento += 1
+            futuro.add_done_callback(lambda _: self._liberar(loop))
+            traducoes = await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Tradução passou de {self.timeout}s, postando o texto original.")
+            return resultado
+        except Exception as e:
+            print(f"⚠️ Erro na tradução, postando o texto original: {e}")
+            return resultado
+
+        for original, traducao in zip(originais, traducoes):
+            if not traducao: continue
+            for i in faltando[original]: resultado[i] = traducao
+            self.cache[self._chave(original)] = traducao
+        while len(self.cache) > self.limite:
+            self.cache.popitem(last=False)
+        await asyncio.to_thread(self._gravar_disco, list(self.cache.items()))
+        return resultado
+
+    def _liberar(self, loop):
+        # Roda na thread do backend: o contador só é mexido dentro do loop
+        try: loop.call_soon_threadsafe(self._descontar)
+        except RuntimeError: pass   # loop já fechado (bot desligando)
+
+    def _descontar(self):
+        self._em_andamento -= 1
+
+    def fechar(self):
+        """Não espera as chamadas presas no backend; as que ainda estão na fila são canceladas."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+tradutor_noticias = ServicoTraducao(traduzir_google, TRADUCAO_CACHE, timeout=TRADUCAO_TIMEOUT)
+
+# --- FILA DE ENVIO ---
+class FilaEnvio:
+    """Fila de saída com um worker por canal. As mensagens de um canal caem no mesmo bucket
+    de rate limit do Discord, então ali saem em ordem, uma de cada vez (o discord.py espera o
+    bucket liberar); canais diferentes são enviados em paralelo."""
+
+    def __init__(self, links_por_mensagem=5, ocioso=60):
+        self.links_por_mensagem = links_por_mensagem  # o Discord só mostra a prévia dos primeiros links
+        self.ocioso = ocioso
+        self.filas = {}      # canal_id -> asyncio.Queue
+        self.workers = {}    # canal_id -> asyncio.Task
+
+    def enviar(self, canal_id, reacao=None, **kwargs):
+        """Enfileira um canal.send(**kwargs). Devolve um future com a mensagem enviada."""
+        futuro = asyncio.get_running_loop().create_future()
+        fila = self.filas.setdefault(canal_id, asyncio.Queue())
+        fila.put_nowait((kwargs, reacao, futuro))
+        worker = self.workers.get(canal_id)
+        if worker is None or worker.done():
+            self.workers[canal_id] = asyncio.create_task(self._worker(canal_id, fila))
+        return futuro
+
+    def enviar_links(self, canal_id, cabecalho, links):
+        """Junta cabeçalho + links no menor número de mensagens possível."""
+        mensagens, atual, qtd_links = [], [cabecalho], 0
+        for link in links:
+            if qtd_links == self.links_por_mensagem or len("\n".join(atual + [link])) > 2000:
+                mensagens.append(atual)
+                atual, qtd_links = [], 0
+            atual.append(link)
+            qtd_links += 1
+        mensagens.append(atual)
+        return [self.enviar(canal_id, content="\n".join(partes)) for partes in mensagens if partes]
+
+    async def _worker(self, canal_id, fila):
+        while True:
+            try:
+                kwargs, reacao, futuro = await asyncio.wait_for(fila.get(), self.ocioso)
+            except asyncio.TimeoutError:
+                # Canal parado: encerra o worker (enviar() cria outro quando precisar)
+                if fila.empty():
+                    del self.workers[canal_id]
+                    return
+                continue
+            canal = bot.get_channel(canal_id)
+            if canal is None:
+                print(f"⚠️ [FILA] Canal {canal_id} não encontrado, mensagem descartada.")
+                if not futuro.done(): futuro.set_result(None)
+                continue
+            try:
+                msg = await canal.send(**kwargs)
+            except Exception as e:
+                if not futuro.done(): futuro.set_exception(e)
+                continue
+            # A mensagem já saiu: quem espera recebe ela mesmo se a reação falhar
+            if not futuro.done(): futuro.set_result(msg)
+            if reacao:
+                try: await msg.add_reaction(reacao)
+                except Exception as e: print(f"⚠️ [FILA] Erro ao reagir com {reacao} no canal {canal_id}: {e}")
+
+fila_envio = FilaEnvio()
 
 # --- TRADUTOR DE NOTÍCIAS DO SITE E EXTRATOR DE MÍDIAS OFICIAIS ---
-@tasks.loop(minutes=15)
+async def publicar_noticia(url_completa, marcar_visto):
+    # --- ENTRANDO NA NOTÍCIA ---
+    async with http.get(url_completa) as resp_interna:
+        html_interno = await resp_interna.text()
+        soup_int = BeautifulSoup(html_interno, 'html.parser')
+        
+        titulo_tag = soup_int.find('h1') or soup_int.find('h2')
+        titulo_en = titulo_tag.text.strip() if titulo_tag else "Nova Atualização"
+        
+        corpo = soup_int.find('article') or soup_int.find('main')
+        
+        texto_en = ""
+        links_video = []
+        links_imagem = []
+
+        if corpo:
+            # Extração de texto
+            for p in corpo.find_all('p')[:8]:
+                if len(p.text) > 20: texto_en += p.text + "\n\n"
+            
+            # Extração de Vídeos (Youtube/Shorts/Vimeo)
+            for iframe in corpo.find_all('iframe'):
+                src = iframe.get('src', '')
+                if any(x in src for x in ['youtube.com', 'youtu.be', 'vimeo.com']):
+                    video_clean = src.split('?')[0].replace('embed/', 'watch?v=')
+                    links_video.append(video_clean)
+
+            for a in corpo.find_all('a', href=True):
+                href = a['href']
+                if 'youtube.com/shorts/' in href or 'youtu.be/' in href:
+                    if href not in links_video: links_video.append(href)
+
+            # Extração de Imagens
+            for img in corpo.find_all('img'):
+                img_src = img.get('src') or img.get('data-src')
+                if img_src and img_src.startswith('http') and not any(x in img_src for x in ['icon', 'logo']):
+                    links_imagem.append(img_src)
+
+        print(f"📊 Dados coletados: {len(texto_en)} caracteres de texto, {len(links_video)} vídeos, {len(links_imagem)} imagens.")
+
+        # --- TRADUÇÃO ---
+        titulo_pt, resumo_pt = await tradutor_noticias.traduzir([titulo_en, texto_en[:2000]])
+        if not texto_en: resumo_pt = "Confira os detalhes no site oficial."
+
+    # --- POSTAGEM: CANAL NOTÍCIAS ---
+    embed = discord.Embed(
+        title=f"🚨 {titulo_pt}",
+        description=f"{resumo_pt}\n\n🔗 [Artigo Original]({url_completa})",
+        color=0x3498db,
+        timestamp=datetime.now()
+    )
+    if links_imagem: embed.set_image(url=links_imagem[0])
+    await fila_envio.enviar(CANAL_NOTICIAS_ID, content="@everyone", embed=embed, reacao="🔥")
+    # O @everyone já saiu: daqui para frente uma falha não pode fazer a notícia ser postada de novo
+    await marcar_visto()
+
+    # --- POSTAGEM: CANAL MÍDIA ---
+    midias = links_video + links_imagem[1:4]
+    envios = []
+    if midias:
+        envios = fila_envio.enviar_links(CANAL_MIDIA_ID, f"🎬 **Mídias da Atualização:** *{titulo_pt}*", midias)
+
+    await asyncio.gather(*envios)
+    print(f"📡 Notícia enviada: 1 embed + {len(envios)} mensagem(ns) de mídia ({len(links_video)} vídeos, {len(links_imagem[1:4])} imagens extras).")
+
 async def monitorar_noticias_pro():
-    global ULTIMA_NOTICIA_URL
-    
+    """Uma varredura do site oficial. Devolve True se postou algo novo."""
     print(f"--- [LOG {datetime.now().strftime('%H:%M:%S')}] Iniciando varredura no site oficial ---")
     
-    timeout = aiohttp.ClientTimeout(total=40)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        try:
-            async with session.get(URL_NEWS) as response:
-                if response.status != 200:
-                    print(f"⚠️ Erro ao acessar o site: Status {response.status}")
-                    return
-                
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Identifica links de notícias
-                links_news = [a for a in soup.find_all('a', href=True) if '/news/' in a['href']]
-                
-                if not links_news:
-                    print("🔍 Nenhuma notícia encontrada no feed principal.")
-                    return
-                
-                url_relativa = links_news[0]['href']
-                url_completa = f"{URL_BASE}{url_relativa}" if url_relativa.startswith('/') else url_relativa
-                
-                if url_completa == ULTIMA_NOTICIA_URL:
-                    print("✅ Nenhuma novidade. O site continua com a mesma notícia no topo.")
-                    return
-                
-                print(f"🆕 NOVA NOTÍCIA DETECTADA: {url_completa}")
-                ULTIMA_NOTICIA_URL = url_completa
-
-                # --- ENTRANDO NA NOTÍCIA ---
-                async with session.get(url_completa) as resp_interna:
-                    html_interno = await resp_interna.text()
-                    soup_int = BeautifulSoup(html_interno, 'html.parser')
-                    
-                    titulo_tag = soup_int.find('h1') or soup_int.find('h2')
-                    titulo_en = titulo_tag.text.strip() if titulo_tag else "Nova Atualização"
-                    
-                    corpo = soup_int.find('article') or soup_int.find('main')
-                    
-                    texto_en = ""
-                    links_video = []
-                    links_imagem = []
-
-                    if corpo:
-                        # Extração de texto
-                        for p in corpo.find_all('p')[:8]:
-                            if len(p.text) > 20: texto_en += p.text + "\n\n"
-                        
-                        # Extração de Vídeos (Youtube/Shorts/Vimeo)
-                        for iframe in corpo.find_all('iframe'):
-                            src = iframe.get('src', '')
-                            if any(x in src for x in ['youtube.com', 'youtu.be', 'vimeo.com']):
-                                video_clean = src.split('?')[0].replace('embed/', 'watch?v=')
-                                links_video.append(video_clean)
-
-                        for a in corpo.find_all('a', href=True):
-                            href = a['href']
-                            if 'youtube.com/shorts/' in href or 'youtu.be/' in href:
-                                if href not in links_video: links_video.append(href)
-
-                        # Extração de Imagens
-                        for img in corpo.find_all('img'):
-                            img_src = img.get('src') or img.get('data-src')
-                            if img_src and img_src.startswith('http') and not any(x in img_src for x in ['icon', 'logo']):
-                                links_imagem.append(img_src)
-
-                    print(f"📊 Dados coletados: {len(texto_en)} caracteres de texto, {len(links_video)} vídeos, {len(links_imagem)} imagens.")
-
-                    # --- TRADUÇÃO ---
-                    tradutor = GoogleTranslator(source='en', target='pt')
-                    titulo_pt = tradutor.translate(titulo_en)
-                    resumo_pt = tradutor.translate(texto_en[:2000]) if texto_en else "Confira os detalhes no site oficial."
-
-                    # --- POSTAGEM: CANAL NOTÍCIAS ---
-                    canal_news = bot.get_channel(CANAL_NOTICIAS_ID)
-                    if canal_news:
-                        embed = discord.Embed(
-                            title=f"🚨 {titulo_pt}",
-                            description=f"{resumo_pt}\n\n🔗 [Artigo Original]({url_completa})",
-                            color=0x3498db,
-                            timestamp=datetime.now()
-                        )
-                        if links_imagem: embed.set_image(url=links_imagem[0])
-                        msg = await canal_news.send(content="@everyone", embed=embed)
-                        await msg.add_reaction("🔥")
-                        print("📡 Mensagem de texto enviada para o canal de notícias.")
-
-                    # --- POSTAGEM: CANAL MÍDIA ---
-                    canal_midia = bot.get_channel(CANAL_MIDIA_ID)
-                    if canal_midia and (links_video or len(links_imagem) > 1):
-                        await canal_midia.send(f"🎬 **Mídias da Atualização:** *{titulo_pt}*")
-                        
-                        for vid in links_video:
-                            await canal_midia.send(vid)
-                            print(f"🎥 Vídeo postado: {vid}")
-                        
-                        if len(links_imagem) > 1:
-                            for img_extra in links_imagem[1:4]:
-                                await canal_midia.send(img_extra)
-                        print("📸 Mídias extras (vídeos/fotos) enviadas para o canal de mídia.")
+    try:
+        # Identifica links de notícias (a leitura da página para depois dos primeiros links)
+        links_news = await http.buscar_se_mudou(URL_NEWS, ExtratorLinks('/news/', limite=NOTICIAS_POR_VARREDURA))
+        if links_news is None:
+            print("✅ Nenhuma novidade. O feed continua igual à última varredura.")
+            return False
+        
+        if not links_news:
+            print("🔍 Nenhuma notícia encontrada no feed principal.")
+            return False
+        
+        urls = [f"{URL_BASE}{url}" if url.startswith('/') else url for url in links_news]
+        return await publicar_novos("noticias", urls, publicar_noticia, URL_NEWS) > 0
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR NO MONITOR: {e}")
+        return False
 
+async def publicar_novos(fonte, itens, publicar, url_feed):
+    """Posta (do mais antigo para o mais novo) tudo do feed que ainda não foi visto."""
+    if not vistos.conhecida(fonte):
+        # Primeira varredura dessa fonte: registra o que já existe sem postar nada
+        await vistos.marcar(fonte, itens)
+        print(f"📌 [{fonte}] Primeira varredura: {len(itens)} itens registrados sem postar.")
+        return 0
+    novos = vistos.novos(fonte, itens)
+    if not novos:
+        print(f"✅ [{fonte}] Nenhuma novidade.")
+    falhas = set()
+    for item in reversed(novos):
+        print(f"🆕 [{fonte}] NOVO ITEM DETECTADO: {item}")
+        marcado = []
+
+        async def marcar_visto(item=item):
+            # O publicar chama assim que o post principal sai, antes das partes extras
+            await vistos.marcar(fonte, [item])
+            marcado.append(item)
+
+        try:
+            await publicar(item, marcar_visto)
         except Exception as e:
-            print(f"❌ CRITICAL ERROR NO MONITOR: {e}")
+            if marcado:
+                print(f"⚠️ [{fonte}] {item} foi postado, mas uma parte extra falhou: {e}")
+                continue
+            # Esquece o ETag/hash do feed para a próxima varredura tentar de novo
+            http.validadores.pop(url_feed, None)
+            falhas.add(item)
+            print(f"❌ [{fonte}] Erro ao postar {item}: {e}")
+            continue
+        if not marcado: await vistos.marcar(fonte, [item])
+    # Renova o TTL de tudo que ainda aparece no feed
+    await vistos.marcar(fonte, [item for item in itens if item not in falhas])
+    return len(novos) - len(falhas)
+
+async def monitorar_youtube_arc(fonte, tipo, url):
+    """Uma varredura de uma aba do canal (vídeos ou shorts). Devolve True se postou algo novo."""
+    try:
+        video_ids = await http.buscar_se_mudou(url, ScannerRegex(RE_VIDEO_ID, limite=VIDEOS_POR_VARREDURA))
+        if not video_ids: return False
 
-@tasks.loop(minutes=15)
-async def monitorar_youtube_arc():
-    global ULTIMO_VIDEO_ID, ULTIMO_SHORTS_ID
-    
-    # Dicionário para gerenciar os dois tipos de busca
-    fontes = {
-        "Vídeo": CANAL_YOUTUBE_URL,
-        "Shorts": CANAL_SHORTS_URL
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-        
-        for tipo, url in fontes.items():
-            try:
-                async with session.get(url, headers=headers) as resp:
-                    if resp.status != 200: continue
-                    
-                    html = await resp.text()
-                    video_ids = re.findall(r'"videoId":"([^"]+)"', html)
-                    if not video_ids: continue
-                    
-                    video_recente = video_ids[0]
-
-                    # Comparação individual por tipo
-                    if tipo == "Vídeo" and video_recente == ULTIMO_VIDEO_ID:
-                        continue
-                    if tipo == "Shorts" and video_recente == ULTIMO_SHORTS_ID:
-                        continue
-
-                    # Atualiza a variável global específica
-                    if tipo == "Vídeo": ULTIMO_VIDEO_ID = video_recente
-                    else: ULTIMO_SHORTS_ID = video_recente
-                    
-                    link_final = f"https://www.youtube.com/watch?v={video_recente}"
-                    canal_midia = bot.get_channel(1412423357382529098)
-                    
-                    if canal_midia:
-                        await canal_midia.send(f"🎬 **Novo {tipo} detectado no canal oficial!**\n{link_final}")
-                        print(f"✅ [YT] Postagem realizada: {video_recente}")
+        async def publicar_video(video_id, marcar_visto):
+            link_final = f"https://www.youtube.com/watch?v={video_id}"
+            await fila_envio.enviar(CANAL_MIDIA_ID, content=f"🎬 **Novo {tipo} detectado no canal oficial!**\n{link_final}")
+            await marcar_visto()
+            print(f"✅ [YT] Postagem realizada: {video_id}")
+
+        return await publicar_novos(fonte, video_ids, publicar_video, url) > 0
+
+    except Exception as e:
+        print(f"❌ Erro ao monitorar {tipo}: {e}")
+        return False
 
+# --- AGENDADOR DOS MONITORES ---
+class FonteMonitorada:
+    def __init__(self, nome, verificar, minimo, maximo):
+        self.nome = nome
+        self.verificar = verificar   # corrotina sem argumentos que devolve True se achou novidade
+        self.minimo = minimo
+        self.maximo = maximo
+        self.intervalo = minimo
+        self.proxima = 0.0           # time.monotonic() da próxima varredura
+        self.tarefa = None
+
+class AgendadorFontes:
+    """Roda as fontes em paralelo (com limite) e adapta o intervalo de cada uma: volta ao mínimo
+    logo depois de uma novidade e vai espaçando (até o máximo) enquanto nada muda."""
+
+    def __init__(self, paralelo=2, fator=1.5):
+        self.fontes = {}
+        self.fator = fator
+        self._vagas = asyncio.Semaphore(paralelo)
+
+    def registrar(self, nome, verificar, minimo=5 * 60, maximo=30 * 60):
+        self.fontes[nome] = FonteMonitorada(nome, verificar, minimo, maximo)
+
+    def tique(self):
+        agora = time.monotonic()
+        for fonte in self.fontes.values():
+            if agora < fonte.proxima: continue
+            if fonte.tarefa and not fonte.tarefa.done():
+                print(f"⏭️ [{fonte.nome}] Varredura anterior ainda rodando, pulando esta.")
+                continue
+            fonte.tarefa = asyncio.create_task(self._rodar(fonte))
+
+    async def _rodar(self, fonte):
+        async with self._vagas:
+            try: mudou = await fonte.verificar()
             except Exception as e:
-                print(f"❌ Erro ao monitorar {tipo}: {e}")
+                print(f"❌ [{fonte.nome}] Erro na varredura: {e}")
+                mudou = False
+        fonte.intervalo = fonte.minimo if mudou else min(fonte.maximo, fonte.intervalo * self.fator)
+        # Um pouco de jitter para as fontes não sincronizarem
+        fonte.proxima = time.monotonic() + fonte.intervalo * random.uniform(0.9, 1.1)
+
+agendador = AgendadorFontes()
+agendador.registrar("noticias", monitorar_noticias_pro)
+agendador.registrar("videos", lambda: monitorar_youtube_arc("videos", "Vídeo", CANAL_YOUTUBE_URL))
+agendador.registrar("shorts", lambda: monitorar_youtube_arc("shorts", "Shorts", CANAL_SHORTS_URL))
+
+@tasks.loop(seconds=30)
+async def rodar_agendador():
+    agendador.tique()
 
 # --- BANCO DE DADOS ---
-def get_db_connection():
-    if not DATABASE_URL: return None
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+
+def conectar_postgres():
+    if not DATABASE_URL: raise psycopg2.OperationalError("DATABASE_URL não configurada")
     url = DATABASE_URL.replace("postgres://", "postgresql://", 1) if DATABASE_URL.startswith("postgres://") else DATABASE_URL
-    try: return psycopg2.connect(url, sslmode='require', connect_timeout=10)
-    except: return None
+    return psycopg2.connect(url, sslmode='require', connect_timeout=10)
+
+class PoolBanco:
+    """Pool de conexões assíncrono. O driver (psycopg2) roda em threads próprias,
+    então nenhum handshake ou query lenta trava o loop do bot."""
+
+    def __init__(self, fabrica, minimo=1, maximo=5, ocioso_max=300):
+        self.fabrica = fabrica          # qualquer callable que devolva uma conexão DB-API
+        self.minimo = minimo
+        self.maximo = maximo
+        self.ocioso_max = ocioso_max    # segundos parada antes de testar a conexão de novo
+        self._executor = ThreadPoolExecutor(max_workers=maximo, thread_name_prefix="db")
+        self._vagas = asyncio.Semaphore(maximo)
+        self._livres = []               # [(conexao, ultimo_uso)]
+        self._abertas = 0               # conexões existentes (em uso + ociosas), nunca acima do máximo
+        self._preparados = {}           # id(conexao) -> nomes já preparados nela
+
+    async def _rodar(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _saudavel(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    async def _conectar(self):
+        self._abertas += 1   # reserva antes do await, para duas aberturas simultâneas não passarem do máximo
+        try:
+            return await self._rodar(self.fabrica)
+        except BaseException:
+            self._abertas -= 1
+            raise
+
+    def _descartar(self, conn):
+        self._abertas -= 1
+        self._preparados.pop(id(conn), None)
+        try: conn.close()
+        except Exception: pass
+
+    async def _pegar(self):
+        await self._vagas.acquire()
+        try:
+            while self._livres:
+                conn, ultimo_uso = self._livres.pop()
+                if getattr(conn, "closed", False):
+                    self._descartar(conn)
+                elif time.monotonic() - ultimo_uso > self.ocioso_max and not await self._rodar(self._saudavel, conn):
+                    self._descartar(conn)
+                else:
+                    return conn
+            return await self._conectar()
+        except BaseException:
+            self._vagas.release()
+            raise
+
+    def _devolver(self, conn, quebrada=False):
+        if quebrada or getattr(conn, "closed", False) or len(self._livres) >= self.maximo:
+            self._descartar(conn)
+        else:
+            self._livres.append((conn, time.monotonic()))
+        self._vagas.release()
 
-def setup_db():
-    conn = get_db_connection()
-    if conn:
+    def _executar_transacao(self, conn, func, args):
         cursor = conn.cursor()
+        try:
+            res = func(cursor, *args)
+            conn.commit()
+            return res
+        except Exception:
+            try: conn.rollback()
+            except Exception: pass
+            raise
+        finally:
+            try: cursor.close()
+            except Exception: pass
+
+    async def transacao(self, func, *args):
+        """Roda func(cursor, *args) numa conexão do pool, com commit no fim (ou rollback se der erro)."""
+        conn = await self._pegar()
+        futuro = asyncio.get_running_loop().run_in_executor(self._executor, self._executar_transacao, conn, func, args)
+        try:
+            res = await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            # A thread ainda está usando a conexão: só devolve quando ela terminar
+            futuro.add_done_callback(lambda f: self._devolver(conn, quebrada=f.cancelled() or f.exception() is not None))
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self._devolver(conn, quebrada=True)
+            raise
+        except Exception:
+            self._devolver(conn)
+            raise
+        self._devolver(conn)
+        return res
+
+    def preparar(self, cursor, nome, sql, params=()):
+        """Executa sql como prepared statement do Postgres, preparando uma única vez por conexão."""
+        preparados = self._preparados.setdefault(id(cursor.connection), set())
+        if nome not in preparados:
+            contador = iter(range(1, len(params) + 1))
+            cursor.execute(f"PREPARE {nome} AS " + re.sub(r"%s", lambda _: f"${next(contador)}", sql))
+            preparados.add(nome)
+        if params:
+            cursor.execute(f"EXECUTE {nome} (" + ", ".join(["%s"] * len(params)) + ")", params)
+        else:
+            cursor.execute(f"EXECUTE {nome}")
+
+    async def buscar_um(self, sql, params=(), nome=None):
+        def _query(cursor):
+            if nome: self.preparar(cursor, nome, sql, params)
+            else: cursor.execute(sql, params)
+            return cursor.fetchone()
+        return await self.transacao(_query)
+
+    async def buscar_todos(self, sql, params=(), nome=None):
+        def _query(cursor):
+            if nome: self.preparar(cursor, nome, sql, params)
+            else: cursor.execute(sql, params)
+            return cursor.fetchall()
+        return await self.transacao(_query)
+
+    async def executar(self, sql, params=()):
+        def _query(cursor):
+            cursor.execute(sql, params)
+            return cursor.rowcount
+        return await self.transacao(_query)
+
+    async def abrir(self):
+        """Aquece o pool com o mínimo de conexões."""
+        while len(self._livres) < self.minimo and self._abertas < self.maximo:
+            self._livres.append((await self._conectar(), time.monotonic()))
+
+    async def manter_vivo(self):
+        """Pinga as conexões ociosas, descarta as quebradas e repõe o mínimo. Cada ping ocupa
+        uma vaga como um uso normal: enquanto isso o _pegar não abre conexão além do máximo."""
+        for _ in range(len(self._livres)):
+            await self._vagas.acquire()
+            try:
+                if not self._livres: break
+                conn, _ = self._livres.pop(0)
+                if await self._rodar(self._saudavel, conn):
+                    self._livres.append((conn, time.monotonic()))
+                else:
+                    self._descartar(conn)
+            finally:
+                self._vagas.release()
+        await self.abrir()
+        return len(self._livres)
+
+    async def fechar(self):
+        ociosas, self._livres = self._livres, []
+        for conn, _ in ociosas:
+            self._descartar(conn)
+        self._executor.shutdown(wait=False)
+
+db = PoolBanco(conectar_postgres, minimo=DB_POOL_MIN, maximo=DB_POOL_MAX)
+
+# Correções de dados que rodam uma vez só por banco, na ordem da lista
+MIGRACOES = [
+    # Saldo de quem já tinha reputação antes do histórico existir: um evento por usuário
+    # para a soma dos eventos bater com usuarios.rep
+    ("saldo_inicial", '''
+        INSERT INTO rep_eventos (chave, receiver_id, delta, tipo, criado_em)
+        SELECT 'saldo_inicial:' || u.id, u.id, u.rep - COALESCE(e.soma, 0), 'saldo_inicial', COALESCE(u.ultima_rep, CURRENT_TIMESTAMP)
+        FROM usuarios u
+        LEFT JOIN (SELECT receiver_id, SUM(delta) AS soma FROM rep_eventos GROUP BY receiver_id) e ON e.receiver_id = u.id
+        WHERE COALESCE(u.rep, 0) <> COALESCE(e.soma, 0)
+        ON CONFLICT (chave) DO NOTHING'''),
+]
+
+def aplicar_migracao(cursor, nome, sql):
+    """Roda o SQL se a migração ainda não está em "migracoes". A marca entra na mesma
+    transação: se o SQL falhar, ela roda de novo no próximo start."""
+    cursor.execute("INSERT INTO migracoes (nome) VALUES (%s) ON CONFLICT (nome) DO NOTHING", (nome,))
+    if not cursor.rowcount: return False
+    cursor.execute(sql)
+    print(f"🛠️ Migração aplicada: {nome}")
+    return True
+
+async def setup_db():
+    def _criar_tabelas(cursor):
         cursor.execute('''CREATE TABLE IF NOT EXISTS usuarios (id BIGINT PRIMARY KEY, rep INTEGER DEFAULT 0, ultima_rep TIMESTAMP)''')
         # Adicionada a coluna "tipo" (TEXT) para diferenciar Scam de Hack
         cursor.execute('''CREATE TABLE IF NOT EXISTS blacklist (
@@ -237,23 +798,759 @@ def setup_db():
             staff_id BIGINT, 
             tipo TEXT DEFAULT 'scam', 
             data_blacklist TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-def alterar_rep(user_id, quantidade, definir=False):
-    conn = get_db_connection()
-    if not conn: return 0
-    cursor = conn.cursor()
-    if definir:
-        cursor.execute('INSERT INTO usuarios (id, rep) VALUES (%s, %s) ON CONFLICT (id) DO UPDATE SET rep = EXCLUDED.rep RETURNING rep', (user_id, quantidade))
-    else:
-        cursor.execute('INSERT INTO usuarios (id, rep) VALUES (%s, %s) ON CONFLICT (id) DO UPDATE SET rep = usuarios.rep + EXCLUDED.rep RETURNING rep', (user_id, quantidade))
-    res = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return res[0] if res else 0
+        # Histórico de reputação: só cresce, "usuarios" guarda os agregados atualizados a cada lote
+        cursor.execute('''CREATE TABLE IF NOT EXISTS rep_eventos (
+            id BIGSERIAL PRIMARY KEY,
+            chave TEXT UNIQUE NOT NULL,
+            giver_id BIGINT,
+            receiver_id BIGINT NOT NULL,
+            delta INTEGER NOT NULL,
+            canal_id BIGINT,
+            thread_id BIGINT,
+            tipo TEXT NOT NULL DEFAULT 'rep',
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rep_eventos_receiver ON rep_eventos (receiver_id, criado_em)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rep_eventos_giver ON rep_eventos (giver_id, criado_em)')
+        cursor.execute('ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS positivos INTEGER DEFAULT 0')
+        cursor.execute('ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS negativos INTEGER DEFAULT 0')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_rep ON usuarios (rep DESC)')
+        # O que os monitores de notícias/vídeos já postaram
+        cursor.execute('''CREATE TABLE IF NOT EXISTS itens_vistos (
+            fonte TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            visto_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (fonte, item_id))''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_itens_vistos_visto_em ON itens_vistos (visto_em)')
+        # Ponto de parada das tarefas longas (ex: ressincronização de cargos)
+        cursor.execute('''CREATE TABLE IF NOT EXISTS tarefas_checkpoint (
+            nome TEXT PRIMARY KEY,
+            guild_id BIGINT,
+            cursor BIGINT,
+            canal_id BIGINT,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        # Tickets abertos: um por usuário
+        cursor.execute('''CREATE TABLE IF NOT EXISTS tickets_abertos (
+            user_id BIGINT PRIMARY KEY,
+            canal_id BIGINT UNIQUE NOT NULL,
+            guild_id BIGINT,
+            staff_id BIGINT,
+            aberto_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_abertos_staff ON tickets_abertos (staff_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_abertos_aberto_em ON tickets_abertos (aberto_em)')
+        # Usos de /rep e /neg que contam para os limites (cooldown que sobrevive a restart)
+        cursor.execute('''CREATE TABLE IF NOT EXISTS rep_cooldowns (
+            id BIGSERIAL PRIMARY KEY,
+            giver_id BIGINT NOT NULL,
+            receiver_id BIGINT NOT NULL,
+            tipo TEXT NOT NULL,
+            usado_em TIMESTAMP NOT NULL)''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rep_cooldowns_giver ON rep_cooldowns (giver_id, usado_em)')
+        # Chamadas de /raid abertas (o botão continua funcionando depois de um restart)
+        cursor.execute('''CREATE TABLE IF NOT EXISTS raids (
+            message_id BIGINT PRIMARY KEY,
+            canal_id BIGINT NOT NULL,
+            host_id BIGINT NOT NULL,
+            mapa TEXT NOT NULL,
+            vagas SMALLINT NOT NULL,
+            participantes BIGINT[] NOT NULL,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        # Alertas do antifraude já enviados, um por (usuário, regra); o detalhe muda sem alertar de novo
+        cursor.execute('''CREATE TABLE IF NOT EXISTS suspeitos_regras (
+            user_id BIGINT NOT NULL,
+            regra TEXT NOT NULL,
+            detalhe TEXT NOT NULL,
+            alertado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, regra))''')
+        # Último nome/avatar conhecido de cada usuário (ranking e backup sem chamar a API)
+        cursor.execute('''CREATE TABLE IF NOT EXISTS nomes_usuarios (
+            user_id BIGINT PRIMARY KEY,
+            nome TEXT NOT NULL,
+            avatar TEXT,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS migracoes (
+            nome TEXT PRIMARY KEY,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        for nome, sql in MIGRACOES:
+            aplicar_migracao(cursor, nome, sql)
+    try:
+        await db.abrir()
+        await db.transacao(_criar_tabelas)
+        await livro_rep.iniciar()
+        if not ranking.pronto: await carregar_ranking()
+        if not blacklist_cache.pronto: await blacklist_cache.recarregar()
+        if not vistos.pronto: await vistos.carregar()
+        if not tickets.pronto: await tickets.carregar()
+        if not cache_nomes.pronto: await cache_nomes.carregar()
+        if not raids.pronto: await raids.carregar()
+    except Exception as e:
+        print(f"❌ Erro ao preparar o banco: {e}")
+
+# --- LIVRO DE REPUTAÇÃO (WRITE-BEHIND) ---
+REP_JOURNAL = os.getenv('REP_JOURNAL', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rep_journal.log'))
+REP_FLUSH_LIMITE = int(os.getenv('REP_FLUSH_LIMITE', 200))
+REP_CACHE_LIMITE = int(os.getenv('REP_CACHE_LIMITE', 20000))   # fichas em memória (LRU)
+REP_CACHE_TTL = int(os.getenv('REP_CACHE_TTL', 300))            # segundos até reler a ficha do banco
+
+class LivroRep:
+    """Buffer de reputação: responde o total novo na hora pelo cache e grava os eventos
+    em lote no banco. Cada evento vai antes para um journal local, que é reaplicado no
+    próximo start se o bot cair antes do flush (a chave do evento evita gravar duas vezes).
+    Um journal só é apagado depois que o que está nele foi gravado no banco."""
+
+    def __init__(self, banco, caminho, limite=200, cache_limite=20000, cache_ttl=300):
+        self.banco = banco
+        self.caminho = caminho
+        self.limite = limite
+        self.cache_limite = cache_limite
+        self.cache_ttl = cache_ttl
+        self.fichas = OrderedDict()  # user_id -> [rep, positivos, negativos] (banco + pendentes), LRU
+        self._lidas_em = {}          # user_id -> quando a ficha foi lida do banco
+        self.pendentes = []    # eventos ainda não gravados no banco
+        self._gravando = set() # receivers do lote que está indo para o banco agora
+        self._journal = None
+        self._trava = asyncio.Lock()
+        self._flush_agendado = None
+        self._iniciado = False
+        self._liberado = asyncio.Event()   # limpo enquanto o livro está pausado (ex: /restore)
+        self._liberado.set()
+
+    def _abrir_journal(self):
+        if self._journal is None:
+            self._journal = open(self.caminho, "a", encoding="utf-8")
+
+    @classmethod
+    def _gravar(cls, cursor, eventos):
+        # Na ordem em que aconteceram: cada sequência de deltas vai num statement só,
+        # cada "definir" (/setrep, /resetar, denúncia) grava o valor absoluto.
+        lote = []
+        for ev in eventos:
+            if ev.get("valor") is None:
+                lote.append(ev)
+                continue
+            if lote: cls._somar(cursor, lote)
+            lote = []
+            cls._definir(cursor, ev)
+        if lote: cls._somar(cursor, lote)
+
+    @staticmethod
+    def _definir(cursor, ev):
+        # O delta do histórico sai do valor do banco com a linha travada, não do cache
+        cursor.execute("INSERT INTO usuarios (id) VALUES (%s) ON CONFLICT (id) DO NOTHING", (ev["receiver"],))
+        cursor.execute("SELECT rep FROM usuarios WHERE id = %s FOR UPDATE", (ev["receiver"],))
+        atual = cursor.fetchone()[0] or 0
+        cursor.execute('''
+            INSERT INTO rep_eventos (chave, giver_id, receiver_id, delta, canal_id, thread_id, tipo, criado_em)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT (chave) DO NOTHING''',
+            (ev["chave"], ev["giver"], ev["receiver"], ev["valor"] - atual, ev["canal"], ev["thread"], ev["tipo"], ev["em"]))
+        if cursor.rowcount:
+            cursor.execute("UPDATE usuarios SET rep = %s, ultima_rep = GREATEST(ultima_rep, %s) WHERE id = %s",
+                           (ev["valor"], ev["em"], ev["receiver"]))
+
+    @staticmethod
+    def _somar(cursor, eventos):
+        # Insere os eventos e soma nos agregados só o que foi realmente inserido,
+        # tudo no mesmo statement: reaplicar um journal já gravado não conta nada duas vezes.
+        linhas = [(ev["chave"], ev["giver"], ev["receiver"], ev["delta"], ev["canal"], ev["thread"], ev["tipo"], ev["em"]) for ev in eventos]
+        execute_values(cursor, '''
+            WITH novos AS (
+                INSERT INTO rep_eventos (chave, giver_id, receiver_id, delta, canal_id, thread_id, tipo, criado_em)
+                VALUES %s ON CONFLICT (chave) DO NOTHING
+                RETURNING receiver_id, delta, tipo, criado_em
+            )
+            INSERT INTO usuarios (id, rep, positivos, negativos, ultima_rep)
+            SELECT receiver_id, SUM(delta),
+                   COUNT(*) FILTER (WHERE tipo = 'rep' AND delta > 0),
+                   COUNT(*) FILTER (WHERE tipo = 'rep' AND delta < 0),
+                   MAX(criado_em)
+            FROM novos GROUP BY receiver_id
+            ON CONFLICT (id) DO UPDATE SET
+                rep = usuarios.rep + EXCLUDED.rep,
+                positivos = usuarios.positivos + EXCLUDED.positivos,
+                negativos = usuarios.negativos + EXCLUDED.negativos,
+                ultima_rep = GREATEST(usuarios.ultima_rep, EXCLUDED.ultima_rep)
+        ''', linhas, page_size=len(linhas))
+
+    async def iniciar(self):
+        """Reaplica no banco o que ficou no journal de uma execução anterior."""
+        if self._iniciado: return
+        gravados = await self.descarregar()
+        if gravados: print(f"♻️ Journal de reputação reaplicado: {gravados} eventos.")
+
+    @staticmethod
+    def _ler_journal(caminho):
+        eventos = []
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                for linha in f:
+                    try: eventos.append(json.loads(linha))
+                    except ValueError: continue  # linha cortada no meio de um crash
+        return eventos
+
+    @classmethod
+    def _juntar_no_flush(cls, girado, flush):
+        """Roda numa thread (fsync bloqueia): passa o journal girado para o fim do .flush
+        e devolve os eventos do .flush, um por chave."""
+        if os.path.exists(girado):
+            with open(flush, "a", encoding="utf-8") as antigo, open(girado, encoding="utf-8") as atual:
+                antigo.write(atual.read())
+                antigo.flush()
+                os.fsync(antigo.fileno())
+            os.remove(girado)
+        return list({ev["chave"]: ev for ev in cls._ler_journal(flush)}.values())
+
+    def _com_pendentes(self):
+        # O lote em gravação já saiu de self.pendentes, mas o banco ainda não tem esses eventos
+        return {ev["receiver"] for ev in self.pendentes} | self._gravando
+
+    def esquecer(self, user_ids=None):
+        """Tira fichas do cache (todas, se user_ids for None), menos as que têm evento ainda não
+        gravado: essas só existem aqui. A próxima leitura vem do banco."""
+        ocupados = self._com_pendentes()
+        for uid in list(self.fichas) if user_ids is None else user_ids:
+            if uid in ocupados: continue
+            self.fichas.pop(uid, None)
+            self._lidas_em.pop(uid, None)
+
+    def atualizar_ficha(self, user_id, linha):
+        """Se a ficha está em cache, troca pela linha (rep, positivos, negativos) recém-lida do
+        banco. Devolve o total atual: o do banco, ou o do cache se ainda há evento não gravado."""
+        if user_id in self.fichas and user_id in self._com_pendentes(): return self.fichas[user_id][0]
+        if user_id in self.fichas:
+            self.fichas[user_id] = list(linha)
+            self._lidas_em[user_id] = time.monotonic()
+        return linha[0]
+
+    async def ficha(self, user_id):
+        lida_em = self._lidas_em.get(user_id)
+        if user_id in self.fichas and lida_em is not None and time.monotonic() - lida_em > self.cache_ttl:
+            self.esquecer([user_id])   # pode ter mudado por fora do bot
+        if user_id not in self.fichas:
+            res = await self.banco.buscar_um('SELECT rep, positivos, negativos FROM usuarios WHERE id = %s', (user_id,), nome="ficha_usuario")
+            # Outra corrotina pode ter carregado (e alterado) a ficha enquanto esperávamos o banco
+            if user_id not in self.fichas:
+                self.fichas[user_id] = list(res) if res else [0, 0, 0]
+                self._lidas_em[user_id] = time.monotonic()
+                if len(self.fichas) > self.cache_limite:
+                    ocupados = self._com_pendentes()
+                    for uid in [u for u in itertools.islice(self.fichas, len(self.fichas) - self.cache_limite + len(ocupados)) if u not in ocupados and u != user_id]:
+                        self.fichas.pop(uid, None)
+                        self._lidas_em.pop(uid, None)
+        self.fichas.move_to_end(user_id)
+        return self.fichas[user_id]
+
+    async def total(self, user_id):
+        return (await self.ficha(user_id))[0]
+
+    async def alterar(self, user_id, quantidade, definir=False, giver=None, canal=None, thread=None, tipo=None):
+        while True:
+            await self._liberado.wait()
+            ficha = await self.ficha(user_id)
+            # Um pausado() (ex: /restore) pode ter começado enquanto a ficha era lida do banco
+            if self._liberado.is_set(): break
+        # "Definir" vai para o banco como valor absoluto; o delta do histórico é calculado lá
+        delta = quantidade - ficha[0] if definir else quantidade
+        tipo = tipo or ("definir" if definir else "rep")
+        evento = {"chave": uuid.uuid4().hex, "giver": giver, "receiver": user_id, "delta": None if definir else delta,
+                  "valor": quantidade if definir else None,
+                  "canal": canal, "thread": thread, "tipo": tipo, "em": datetime.utcnow().isoformat()}
+        self._abrir_journal()
+        self._journal.write(json.dumps(evento) + "\n")
+        self._journal.flush()
+        self.pendentes.append(evento)
+        ficha[0] += delta
+        if tipo == "rep" and delta > 0: ficha[1] += 1
+        elif tipo == "rep" and delta < 0: ficha[2] += 1
+        if len(self.pendentes) >= self.limite and (self._flush_agendado is None or self._flush_agendado.done()):
+            self._flush_agendado = asyncio.create_task(self.descarregar())
+        return ficha[0]
+
+    async def descarregar(self):
+        """Grava todos os eventos pendentes e seus agregados numa única transação."""
+        async with self._trava:
+            return await self._descarregar()
+
+    @contextlib.asynccontextmanager
+    async def pausado(self):
+        """Grava o que está pendente e segura flushes e novas alterações até o fim do bloco.
+        No fim o cache é descartado: o banco pode ter mudado por baixo (ex: /restore)."""
+        async with self._trava:
+            self._liberado.clear()
+            try:
+                await self._descarregar()
+                yield
+            finally:
+                self.esquecer()
+                self._liberado.set()
+
+    async def _descarregar(self):
+        if not self.pendentes and self._iniciado: return 0
+        # Gira o journal: ele é renomeado e o que chegar durante a gravação vai para um journal
+        # novo. Numa thread, o girado vai para o fim do .flush (que pode ter sobrado de um flush
+        # que falhou ou de um crash) com fsync. O .flush só é apagado depois do commit.
+        flush, girado = self.caminho + ".flush", self.caminho + ".girado"
+        while os.path.exists(girado):
+            # Sobrou de uma rotação interrompida: entra no .flush antes de girar de novo
+            await asyncio.to_thread(self._juntar_no_flush, girado, flush)
+        self.fechar()
+        if os.path.exists(self.caminho): os.rename(self.caminho, girado)
+        lote, self.pendentes = self.pendentes, []
+        self._gravando = {ev["receiver"] for ev in lote}
+        try:
+            eventos = await asyncio.to_thread(self._juntar_no_flush, girado, flush)
+            self._gravando |= {ev["receiver"] for ev in eventos}
+            if eventos: await self.banco.transacao(self._gravar, eventos)
+        except Exception:
+            # Devolve o lote para a fila, antes do que chegou depois dele; o .flush fica
+            self.pendentes = lote + self.pendentes
+            raise
+        finally:
+            self._gravando = set()
+        if os.path.exists(flush): os.remove(flush)
+        if not self._iniciado:
+            # O banco acabou de receber eventos de uma execução anterior que o cache não viu
+            self._iniciado = True
+            self.esquecer()
+        else:
+            self.esquecer({ev["receiver"] for ev in lote})
+        return len(eventos)
+
+    def fechar(self):
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+livro_rep = LivroRep(db, REP_JOURNAL, limite=REP_FLUSH_LIMITE, cache_limite=REP_CACHE_LIMITE, cache_ttl=REP_CACHE_TTL)
+
+async def alterar_rep(user_id, quantidade, definir=False, ctx=None, tipo=None):
+    giver = canal = thread = None
+    if ctx:
+        giver = ctx.author.id
+        if isinstance(ctx.channel, discord.Thread): canal, thread = ctx.channel.parent_id, ctx.channel.id
+        else: canal = ctx.channel.id
+    try:
+        nova = await livro_rep.alterar(user_id, quantidade, definir, giver=giver, canal=canal, thread=thread, tipo=tipo)
+    except Exception as e:
+        print(f"❌ Erro ao alterar rep: {e}")
+        return None
+    if ranking.pronto: ranking.atualizar(user_id, nova)
+    return nova
+
+# --- LIMITES DE /REP E /NEG ---
+# Janela deslizante: no máximo LIMITE usos nos últimos JANELA segundos
+REP_LIMITE_USUARIO = int(os.getenv('REP_LIMITE_USUARIO', 1))      # por quem dá, por comando
+REP_JANELA_USUARIO = int(os.getenv('REP_JANELA_USUARIO', 7200))
+REP_LIMITE_PAR = int(os.getenv('REP_LIMITE_PAR', 1))              # para a mesma pessoa, por comando
+REP_JANELA_PAR = int(os.getenv('REP_JANELA_PAR', 86400))
+REP_JANELA_RECIPROCA = int(os.getenv('REP_JANELA_RECIPROCA', 604800))  # uma troca de +rep por par nesse período (0 desliga)
+
+class LimitesRep:
+    """Cooldowns do /rep e /neg gravados no banco, com cache em memória. O cache só serve para
+    negar rápido (um uso que ele conhece é real); liberar sempre passa pelo banco, sob um advisory
+    lock nos dois usuários, então mais de um processo do bot pode rodar sem furar os limites.
+    Sem banco o comando é negado: um cache frio (logo após um restart) liberaria tudo."""
+
+    def __init__(self, banco):
+        self.banco = banco
+        self.usos = {}   # giver_id -> [(giver, receiver, tipo, usado_em, id)] dentro da maior janela
+
+    @staticmethod
+    def janela_max():
+        return max(REP_JANELA_USUARIO, REP_JANELA_PAR, REP_JANELA_RECIPROCA)
+
+    @staticmethod
+    def avaliar(usos, giver, receiver, tipo, agora):
+        """Devolve (segundos de espera, motivo) da regra mais restritiva, ou (0, None)."""
+        regras = [
+            (REP_LIMITE_USUARIO, REP_JANELA_USUARIO, "Você já usou este comando recentemente.",
+             lambda u: u[0] == giver and u[2] == tipo),
+            (REP_LIMITE_PAR, REP_JANELA_PAR, "Você já avaliou este raider recentemente.",
+             lambda u: u[0] == giver and u[1] == receiver and u[2] == tipo),
+        ]
+        espera, motivo = 0, None
+        for limite, janela, texto, filtro in regras:
+            recentes = sorted(u[3] for u in usos if filtro(u) and (agora - u[3]).total_seconds() < janela)
+            if len(recentes) >= limite:
+                falta = janela - (agora - recentes[-limite]).total_seconds()
+                if falta > espera: espera, motivo = falta, texto
+        if tipo == "rep" and REP_JANELA_RECIPROCA:
+            # Devolver o +rep de quem te deu é normal; o que trava é repetir a troca dentro da janela
+            def ultimo(de, para):
+                return max((u[3] for u in usos if u[0] == de and u[1] == para and u[2] == "rep"
+                            and (agora - u[3]).total_seconds() < REP_JANELA_RECIPROCA), default=None)
+            ida, volta = ultimo(giver, receiver), ultimo(receiver, giver)
+            if ida and volta:
+                falta = REP_JANELA_RECIPROCA - (agora - min(ida, volta)).total_seconds()
+                if falta > espera: espera, motivo = falta, "Vocês dois já trocaram +rep recentemente."
+        return espera, motivo
+
+    def _podar(self, user_id, agora):
+        usos = [u for u in self.usos.get(user_id, []) if (agora - u[3]).total_seconds() < self.janela_max()]
+        if usos: self.usos[user_id] = usos
+        else: self.usos.pop(user_id, None)
+        return usos
+
+    def _gravar(self, cursor, giver, receiver, tipo, agora):
+        # A->B e B->A disputam as mesmas travas (a regra recíproca olha os dois lados);
+        # sempre na mesma ordem, para duas transações não ficarem esperando uma pela outra
+        for user_id in sorted({giver, receiver}):
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (user_id,))
+        corte = agora - timedelta(seconds=self.janela_max())
+        cursor.execute('''SELECT giver_id, receiver_id, tipo, usado_em, id FROM rep_cooldowns
+            WHERE usado_em > %s AND (giver_id = %s OR (giver_id = %s AND receiver_id = %s))''', (corte, giver, receiver, giver))
+        usos = cursor.fetchall()
+        espera, motivo = self.avaliar(usos, giver, receiver, tipo, agora)
+        if espera: return usos, None, espera, motivo
+        cursor.execute("INSERT INTO rep_cooldowns (giver_id, receiver_id, tipo, usado_em) VALUES (%s, %s, %s, %s) RETURNING id",
+                       (giver, receiver, tipo, agora))
+        return usos, cursor.fetchone()[0], 0, None
+
+    async def consumir(self, giver, receiver, tipo):
+        """Registra um uso se os limites deixarem. Devolve (id do uso ou None, espera, motivo)."""
+        agora = datetime.utcnow()
+        conhecidos = self._podar(giver, agora) + self._podar(receiver, agora)
+        espera, motivo = self.avaliar(conhecidos, giver, receiver, tipo, agora)
+        if espera: return None, espera, motivo
+        try:
+            usos, uso_id, espera, motivo = await self.banco.transacao(self._gravar, giver, receiver, tipo, agora)
+        except Exception as e:
+            print(f"⚠️ Limites de rep sem banco, negando o comando: {e}")
+            return None, 60, "Não consegui verificar seus limites agora (banco fora do ar)."
+        self.usos[giver] = [u for u in usos if u[0] == giver]
+        if uso_id is None: return None, espera, motivo
+        self.usos[giver].append((giver, receiver, tipo, agora, uso_id))
+        return uso_id, 0, None
+
+    async def devolver(self, giver, uso_id):
+        """Desfaz um uso (a reputação não chegou a ser salva)."""
+        self.usos[giver] = [u for u in self.usos.get(giver, []) if u[4] != uso_id]
+        if uso_id:
+            await self.banco.executar('DELETE FROM rep_cooldowns WHERE id = %s', (uso_id,))
+
+    async def expirar(self):
+        return await self.banco.executar('DELETE FROM rep_cooldowns WHERE usado_em < %s',
+                                         (datetime.utcnow() - timedelta(seconds=self.janela_max()),))
+
+limites_rep = LimitesRep(db)
+
+def formatar_espera(segundos):
+    minutos = max(1, math.ceil(segundos / 60))
+    return f"{minutos // 60}h{minutos % 60:02d}min" if minutos >= 60 else f"{minutos} minutos"
+
+@tasks.loop(hours=1)
+async def expirar_cooldowns():
+    try: await limites_rep.expirar()
+    except Exception as e: print(f"❌ Erro ao expirar cooldowns: {e}")
+
+# --- RANKING EM MEMÓRIA ---
+class Ranking:
+    """Ranking de reputação em memória: lista sempre ordenada (bisect) + índice por usuário.
+    O /top lê daqui sem ir ao banco e cada página renderizada fica em cache até mudar."""
+
+    def __init__(self, por_pagina=10):
+        self.por_pagina = por_pagina
+        self.pontos = {}      # user_id -> rep
+        self.ordem = []       # [(-rep, user_id)] em ordem crescente = maior rep primeiro
+        self.embeds = {}      # pagina -> discord.Embed já renderizado
+        self.pronto = False
+
+    def carregar(self, pontos):
+        self.pontos = dict(pontos)
+        self.ordem = sorted((-rep, uid) for uid, rep in self.pontos.items())
+        self.embeds.clear()
+        self.pronto = True
+
+    def total_paginas(self):
+        return max(1, -(-len(self.ordem) // self.por_pagina))
+
+    def atualizar(self, user_id, rep):
+        antigo = self.pontos.get(user_id)
+        if antigo == rep: return
+        paginas_antes = self.total_paginas()
+        if antigo is None:
+            pos_antiga = len(self.ordem)  # usuário novo empurra todo mundo abaixo dele
+        else:
+            pos_antiga = bisect.bisect_left(self.ordem, (-antigo, user_id))
+            del self.ordem[pos_antiga]
+        pos_nova = bisect.bisect_left(self.ordem, (-rep, user_id))
+        self.ordem.insert(pos_nova, (-rep, user_id))
+        self.pontos[user_id] = rep
+        if self.total_paginas() != paginas_antes:
+            self.embeds.clear()  # o rodapé "Página x/y" muda em todas
+            return
+        # Só as páginas entre a posição antiga e a nova mudaram
+        for pagina in range(min(pos_antiga, pos_nova) // self.por_pagina + 1, max(pos_antiga, pos_nova) // self.por_pagina + 2):
+            self.embeds.pop(pagina, None)
+
+    def invalidar_usuario(self, user_id):
+        """Descarta a página renderizada onde o usuário aparece (ex: mudou de nome)."""
+        if user_id not in self.pontos: return
+        pos = bisect.bisect_left(self.ordem, (-self.pontos[user_id], user_id))
+        self.embeds.pop(pos // self.por_pagina + 1, None)
+
+    def pagina(self, numero):
+        inicio = (numero - 1) * self.por_pagina
+        return [(inicio + i, uid, -neg) for i, (neg, uid) in enumerate(self.ordem[inicio:inicio + self.por_pagina], 1)]
+
+ranking = Ranking()
+
+async def carregar_ranking():
+    await livro_rep.descarregar()
+    pontos = dict(await db.buscar_todos('SELECT id, rep FROM usuarios'))
+    # O que já está no cache do livro é mais novo que o banco
+    pontos.update({uid: ficha[0] for uid, ficha in livro_rep.fichas.items()})
+    ranking.carregar(pontos)
+    print(f"🏆 Ranking carregado: {len(pontos)} usuários.")
+
+# --- CACHE DA BLACKLIST ---
+class FiltroBloom:
+    """Filtro de Bloom compacto: "não está" é sempre certo, "talvez esteja" precisa confirmar."""
+
+    def __init__(self, capacidade=1000, erro=0.01):
+        self.capacidade = capacidade
+        self.itens = 0            # acima da capacidade a taxa de falso positivo passa de `erro`
+        self.tamanho = max(64, int(-capacidade * math.log(erro) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.tamanho / capacidade * math.log(2)))
+        self.bits = bytearray((self.tamanho + 7) // 8)
+
+    def _posicoes(self, chave):
+        digest = hashlib.blake2b(str(chave).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.tamanho for i in range(self.hashes)]
+
+    def adicionar(self, chave):
+        self.itens += 1
+        for pos in self._posicoes(chave):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, chave):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._posicoes(chave))
+
+class CacheBlacklist:
+    """Blacklist inteira em memória. A maioria das consultas é de quem não está nela,
+    e essas o filtro de Bloom responde sem tocar no set nem no banco."""
+
+    def __init__(self, banco):
+        self.banco = banco
+        self.registros = {}      # user_id -> (motivo, tipo)
+        self.filtro = FiltroBloom()
+        self.pronto = False
+        self.acertos = 0         # consultas de quem está na blacklist
+        self.falhas = 0          # consultas de quem não está
+        self.falsos_positivos = 0
+        self._mudancas = None    # alterações feitas enquanto a tabela está sendo relida
+        self._trava = asyncio.Lock()   # uma releitura por vez (elas dividem o _mudancas)
+
+    @staticmethod
+    def _montar_filtro(registros):
+        filtro = FiltroBloom(max(1000, 2 * len(registros)))
+        for user_id in registros: filtro.adicionar(user_id)
+        return filtro
+
+    async def recarregar(self):
+        async with self._trava:
+            self._mudancas = []
+            try:
+                linhas = await self.banco.buscar_todos('SELECT user_id, motivo, tipo FROM blacklist')
+                registros = {uid: (motivo, tipo) for uid, motivo, tipo in linhas}
+                # Reaplica o que /denunciar e /perdoar mudaram durante a leitura
+                for user_id, registro in self._mudancas:
+                    if registro is None: registros.pop(user_id, None)
+                    else: registros[user_id] = registro
+            finally:
+                self._mudancas = None
+            self.registros, self.filtro = registros, self._montar_filtro(registros)
+            self.pronto = True
+            return len(registros)
+
+    async def buscar(self, user_id):
+        if not self.pronto: await self.recarregar()
+        if user_id not in self.filtro:
+            self.falhas += 1
+            return None
+        registro = self.registros.get(user_id)
+        if registro is None:
+            self.falsos_positivos += 1
+            self.falhas += 1
+        else:
+            self.acertos += 1
+        return registro
+
+    def adicionar(self, user_id, motivo, tipo):
+        self.registros[user_id] = (motivo, tipo)
+        if self.filtro.itens >= self.filtro.capacidade:
+            # Cheio antes da próxima reconciliação: refaz maior em vez de deixar os falsos positivos subirem
+            self.filtro = self._montar_filtro(self.registros)
+        else:
+            self.filtro.adicionar(user_id)
+        if self._mudancas is not None: self._mudancas.append((user_id, (motivo, tipo)))
+
+    def remover(self, user_id):
+        # O bit no filtro só sai na próxima reconciliação; até lá vira um falso positivo
+        self.registros.pop(user_id, None)
+        if self._mudancas is not None: self._mudancas.append((user_id, None))
+
+blacklist_cache = CacheBlacklist(db)
+
+@tasks.loop(minutes=30)
+async def reconciliar_blacklist():
+    try: await blacklist_cache.recarregar()
+    except Exception as e: print(f"❌ Erro ao reconciliar blacklist: {e}")
+
+# --- ITENS JÁ POSTADOS (NOTÍCIAS / VÍDEOS) ---
+class RegistroVistos:
+    """Tudo que os monitores já postaram, por fonte, salvo no banco e espelhado em memória.
+    Itens que saem do feed expiram depois do TTL; os que continuam nele são renovados a cada varredura."""
+
+    def __init__(self, banco, ttl_dias=90):
+        self.banco = banco
+        self.ttl_dias = ttl_dias
+        self.itens = {}   # fonte -> set de ids/urls
+        self.pronto = False
+
+    async def carregar(self):
+        itens = {}
+        for fonte, item_id in await self.banco.buscar_todos('SELECT fonte, item_id FROM itens_vistos'):
+            itens.setdefault(fonte, set()).add(item_id)
+        self.itens = itens
+        self.pronto = True
+
+    def conhecida(self, fonte):
+        return bool(self.itens.get(fonte))
+
+    def novos(self, fonte, itens):
+        vistos = self.itens.get(fonte, set())
+        return [item for item in dict.fromkeys(itens) if item not in vistos]
+
+    async def marcar(self, fonte, itens):
+        itens = list(dict.fromkeys(itens))
+        if not itens: return
+        self.itens.setdefault(fonte, set()).update(itens)
+        def _gravar(cursor):
+            execute_values(cursor, '''INSERT INTO itens_vistos (fonte, item_id) VALUES %s
+                ON CONFLICT (fonte, item_id) DO UPDATE SET visto_em = CURRENT_TIMESTAMP''', [(fonte, item) for item in itens])
+        await self.banco.transacao(_gravar)
+
+    async def expirar(self):
+        removidos = await self.banco.executar("DELETE FROM itens_vistos WHERE visto_em < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'", (self.ttl_dias,))
+        if removidos: await self.carregar()
+        return removidos
+
+vistos = RegistroVistos(db)
+
+@tasks.loop(hours=24)
+async def expirar_itens_vistos():
+    try: await vistos.expirar()
+    except Exception as e: print(f"❌ Erro ao expirar itens vistos: {e}")
+
+@tasks.loop(seconds=5)
+async def descarregar_reputacao():
+    try: await livro_rep.descarregar()
+    except Exception as e: print(f"❌ Erro ao gravar reputação: {e}")
+
+async def conferir_saldos(banco, amostra=10):
+    """Compara usuarios.rep com a soma do histórico. Os dois mudam na mesma transação, então
+    uma diferença veio de fora do bot (SQL na mão, restore parcial). Devolve (quantos usuários
+    divergem, [(id, rep, soma)] dos maiores desvios)."""
+    linhas = await banco.buscar_todos('''
+        SELECT COALESCE(u.id, e.receiver_id), COALESCE(u.rep, 0), COALESCE(e.soma, 0)::int, COUNT(*) OVER ()
+        FROM usuarios u
+        FULL JOIN (SELECT receiver_id, SUM(delta) AS soma FROM rep_eventos GROUP BY receiver_id) e ON e.receiver_id = u.id
+        WHERE COALESCE(u.rep, 0) <> COALESCE(e.soma, 0)
+        ORDER BY ABS(COALESCE(u.rep, 0) - COALESCE(e.soma, 0)) DESC, 1 LIMIT %s''', (amostra,))
+    return (linhas[0][3] if linhas else 0), [linha[:3] for linha in linhas]
+
+@tasks.loop(hours=24)
+async def conferir_reputacao():
+    # A primeira volta seria no start; a conta pesa, então só a partir de 24h depois
+    if conferir_reputacao.current_loop == 0: return
+    try:
+        total, amostra = await conferir_saldos(db)
+        if not total: return
+        detalhes = "\n".join(f"• `{uid}`: rep {rep}, histórico {soma}" for uid, rep, soma in amostra)
+        print(f"⚠️ Reputação fora do histórico em {total} usuário(s).")
+        await fila_envio.enviar(ID_CANAL_STAFF, content=f"⚠️ **Reputação divergente do histórico** em {total} usuário(s):\n{detalhes}")
+    except Exception as e: print(f"❌ Erro ao conferir saldos de reputação: {e}")
+
+# --- REGISTRO DE TICKETS ---
+class RegistroTickets:
+    """Tickets abertos por usuário, salvos no banco e indexados em memória (por usuário e por canal).
+    A criação passa por uma trava por usuário, então dois cliques seguidos não abrem dois canais."""
+
+    def __init__(self, banco):
+        self.banco = banco
+        self.por_usuario = {}   # user_id -> {"canal_id", "guild_id", "staff_id", "aberto_em"}
+        self.por_canal = {}     # canal_id -> user_id
+        self.travas = {}
+        self.pronto = False
+
+    async def carregar(self):
+        por_usuario, por_canal = {}, {}
+        for uid, canal_id, guild_id, staff_id, aberto_em in await self.banco.buscar_todos(
+                'SELECT user_id, canal_id, guild_id, staff_id, aberto_em FROM tickets_abertos'):
+            por_usuario[uid] = {"canal_id": canal_id, "guild_id": guild_id, "staff_id": staff_id, "aberto_em": aberto_em}
+            por_canal[canal_id] = uid
+        self.por_usuario, self.por_canal = por_usuario, por_canal
+        self.pronto = True
+
+    def trava(self, user_id):
+        if user_id not in self.travas: self.travas[user_id] = asyncio.Lock()
+        return self.travas[user_id]
+
+    def liberar(self, user_id):
+        trava = self.travas.get(user_id)
+        if trava and not trava.locked(): del self.travas[user_id]
+
+    def do_usuario(self, user_id):
+        return self.por_usuario.get(user_id)
+
+    def do_canal(self, canal_id):
+        return self.por_canal.get(canal_id)
+
+    async def abrir(self, user_id, canal_id, guild_id):
+        # Índice primeiro: se a gravação falhar, o canal já criado continua contando como o ticket do usuário
+        aberto_em = datetime.now()
+        antigo = self.por_usuario.get(user_id)
+        if antigo: self.por_canal.pop(antigo["canal_id"], None)
+        self.por_usuario[user_id] = {"canal_id": canal_id, "guild_id": guild_id, "staff_id": None, "aberto_em": aberto_em}
+        self.por_canal[canal_id] = user_id
+        await self.banco.executar('''INSERT INTO tickets_abertos (user_id, canal_id, guild_id, aberto_em) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET canal_id = EXCLUDED.canal_id, guild_id = EXCLUDED.guild_id,
+            staff_id = NULL, aberto_em = EXCLUDED.aberto_em''', (user_id, canal_id, guild_id, aberto_em))
+
+    async def fechar(self, canal_id):
+        """Remove o ticket do canal; não faz nada se o canal não for um ticket registrado."""
+        user_id = self.por_canal.pop(canal_id, None)
+        if user_id is None: return False
+        self.por_usuario.pop(user_id, None)
+        await self.banco.executar('DELETE FROM tickets_abertos WHERE canal_id = %s', (canal_id,))
+        return True
+
+    async def atribuir(self, canal_id, staff_id):
+        """Marca o staff responsável; só o primeiro que responder fica com o ticket."""
+        user_id = self.por_canal.get(canal_id)
+        if user_id is None: return False
+        ticket = self.por_usuario[user_id]
+        if ticket["staff_id"] is not None: return False
+        ticket["staff_id"] = staff_id
+        await self.banco.executar('UPDATE tickets_abertos SET staff_id = %s WHERE canal_id = %s AND staff_id IS NULL', (staff_id, canal_id))
+        return True
+
+    def por_staff(self, staff_id):
+        return [(uid, t) for uid, t in self.por_usuario.items() if t["staff_id"] == staff_id]
+
+    def mais_antigos_que(self, horas):
+        limite = datetime.now() - timedelta(hours=horas)
+        return sorted(((uid, t) for uid, t in self.por_usuario.items() if t["aberto_em"] <= limite), key=lambda item: item[1]["aberto_em"])
+
+    async def reconciliar(self, guild):
+        """Esquece tickets cujo canal foi apagado enquanto o bot estava fora."""
+        orfaos = [canal_id for canal_id in self.por_canal
+                  if self.por_usuario[self.por_canal[canal_id]]["guild_id"] == guild.id and guild.get_channel(canal_id) is None]
+        for canal_id in orfaos: await self.fechar(canal_id)
+        return len(orfaos)
+
+tickets = RegistroTickets(db)
 
 # --- SISTEMA DE LOGS ---
 async def enviar_log(origem, mensagem, cor=0xffa500):
@@ -265,57 +1562,752 @@ async def enviar_log(origem, mensagem, cor=0xffa500):
         embed.set_footer(text=f"Executor: {autor.name}")
         await canal.send(embed=embed)
 
+# --- AUTORIZAÇÃO ---
+class Autorizacao:
+    """Quem é staff, pré-calculado por servidor: os IDs dos cargos de staff ("mods" ou com
+    administrador) e o conjunto de membros que têm algum deles. Os eventos de membro/cargo
+    mantêm tudo atualizado, então checks, views e o /ajuda respondem com um lookup só."""
+
+    CANAIS_LIVRES = frozenset({ID_FORUM_TROCA, ID_CANAL_RAID})   # onde usuários comuns podem usar comandos
+
+    def __init__(self):
+        self.cargos = {}     # guild_id -> set de ids dos cargos de staff
+        self.cargo_mods = {} # guild_id -> id do cargo "mods" (mencionado nos tickets)
+        self.membros = {}    # guild_id -> set de ids dos membros da staff
+
+    def atualizar(self, guild):
+        cargos, mods = set(), None
+        for role in guild.roles:
+            if role.name.lower() == "mods":
+                cargos.add(role.id)
+                if mods is None: mods = role.id
+            elif role.permissions.administrator:
+                cargos.add(role.id)
+        membros = {guild.owner_id} if guild.owner_id else set()
+        for role_id in cargos:
+            membros.update(m.id for m in guild.get_role(role_id).members)
+        self.cargos[guild.id], self.cargo_mods[guild.id], self.membros[guild.id] = cargos, mods, membros
+
+    def atualizar_membro(self, membro):
+        membros = self.membros.get(membro.guild.id)
+        if membros is None: return
+        cargos = self.cargos[membro.guild.id]
+        if membro.id == membro.guild.owner_id or any(role.id in cargos for role in membro.roles): membros.add(membro.id)
+        else: membros.discard(membro.id)
+
+    def remover_membro(self, membro):
+        self.membros.get(membro.guild.id, set()).discard(membro.id)
+
+    def eh_staff(self, membro):
+        guild = getattr(membro, "guild", None)
+        if guild is None: return False
+        membros = self.membros.get(guild.id)
+        if membros is None:
+            # Servidor ainda não indexado (ex: antes do on_ready)
+            self.atualizar(guild)
+            membros = self.membros[guild.id]
+        return membro.id in membros
+
+    def pode_usar_canal(self, canal, membro):
+        if self.eh_staff(membro): return True
+        return canal.id in self.CANAIS_LIVRES or getattr(canal, "parent_id", None) == ID_FORUM_TROCA
+
+    def cargo_mods_de(self, guild):
+        if guild.id not in self.cargo_mods: self.atualizar(guild)
+        role_id = self.cargo_mods[guild.id]
+        return guild.get_role(role_id) if role_id else None
+
+autorizacao = Autorizacao()
+
 # --- CHECKS (VERIFICAÇÕES) ---
 @bot.check
 async def verificar_canal(ctx):
     if isinstance(ctx.channel, discord.DMChannel): 
         return False
-    
-    # Staff/ADM ignora todas as restrições de canal abaixo
-    is_admin = ctx.author.guild_permissions.administrator
-    is_mod = any(role.name.lower() == "mods" for role in ctx.author.roles)
-    
-    if is_admin or is_mod:
-        return True
-    
-    # Restrição apenas para usuários comuns
-    parent_id = getattr(ctx.channel, "parent_id", None)
-    no_forum_troca = (ctx.channel.id == ID_FORUM_TROCA or parent_id == ID_FORUM_TROCA)
-    no_canal_raid = (ctx.channel.id == ID_CANAL_RAID)
-    
-    return no_forum_troca or no_canal_raid
+    # Staff/ADM ignora as restrições de canal; usuários comuns só no fórum de trocas e no canal de raid
+    return autorizacao.pode_usar_canal(ctx.channel, ctx.author)
 
 def eh_staff():
     async def predicate(ctx):
-        is_mod = any(role.name.lower() == "mods" for role in ctx.author.roles)
-        is_admin = ctx.author.guild_permissions.administrator
-        if is_mod or is_admin: return True
+        if autorizacao.eh_staff(ctx.author): return True
         await ctx.send("❌ Você não tem permissão para usar este comando.", delete_after=5)
         return False
     return commands.check(predicate)
 
-def ignora_cooldown_staff():
-    async def predicate(ctx):
-        is_mod = any(role.name.lower() == "mods" for role in ctx.author.roles)
-        is_admin = ctx.author.guild_permissions.administrator
-        if is_mod or is_admin:
-            ctx.command.reset_cooldown(ctx)
+# --- SISTEMA DE CARGOS ---
+# Tabela única de níveis (usada pelos cargos e pelo /perfil), do maior para o menor.
+# Os níveis positivos acumulam: quem tem 100 pts fica com os três cargos.
+NIVEIS_REP = [
+    {"limite": 100, "nome": "trocador oficial", "status": "Trocador Oficial 💎"},
+    {"limite": 50, "nome": "trocador confiavel", "status": "Trocador Confiável ✅"},
+    {"limite": 10, "nome": "trocador iniciante", "status": "Trocador Iniciante ✅"},
+]
+NIVEL_PERIGOSO = {"limite": -10, "nome": "trocador perigoso", "status": "Trocador Perigoso ❌"}
+
+def cargos_para_pontos(pontos):
+    if pontos <= NIVEL_PERIGOSO["limite"]: return {NIVEL_PERIGOSO["nome"]}
+    return {nivel["nome"] for nivel in NIVEIS_REP if pontos >= nivel["limite"]}
+
+def status_para_pontos(pontos):
+    if pontos <= NIVEL_PERIGOSO["limite"]: return NIVEL_PERIGOSO["status"]
+    for nivel in NIVEIS_REP:
+        if pontos >= nivel["limite"]: return nivel["status"]
+    return "Neutro"
+
+class MotorCargos:
+    """Guarda os IDs dos cargos de nível por servidor (atualizados nos eventos de cargo) e
+    troca só os cargos de nível do membro, numa edição; os outros cargos dele seguem como estão."""
+
+    NOMES = {nivel["nome"] for nivel in NIVEIS_REP} | {NIVEL_PERIGOSO["nome"]}
+
+    def __init__(self):
+        self.ids = {}   # guild_id -> {nome do cargo: role_id}
+
+    def atualizar(self, guild):
+        self.ids[guild.id] = {role.name: role.id for role in guild.roles if role.name in self.NOMES}
+
+    def resolver(self, guild):
+        if guild.id not in self.ids: self.atualizar(guild)
+        return self.ids[guild.id]
+
+    def diferenca(self, membro, pontos):
+        """(cargos de nível a pôr, cargos de nível a tirar); duas listas vazias se ele já está certo."""
+        ids = self.resolver(membro.guild)
+        alvo = {ids[nome] for nome in cargos_para_pontos(pontos) if nome in ids}
+        atuais = {role.id for role in membro.roles} & set(ids.values())
+        por = [role for role in map(membro.guild.get_role, alvo - atuais) if role]
+        tirar = [role for role in map(membro.guild.get_role, atuais - alvo) if role]
+        return por, tirar
+
+    async def aplicar(self, membro, pontos, motivo=None):
+        por, tirar = self.diferenca(membro, pontos)
+        if not (por or tirar): return False
+        # Um PATCH só, a partir dos cargos que o gateway já mantém em membro.roles:
+        # os outros cargos vão como estão e só os de nível mudam (@everyone não entra na lista)
+        cargos = [role for role in membro.roles if not role.is_default() and role not in tirar] + por
+        await membro.edit(roles=cargos, reason=motivo or f"Nível de reputação: {pontos} pts")
         return True
-    return commands.check(predicate)
 
-# --- SISTEMA DE CARGOS ---
-async def verificar_cargos_nivel(ctx, membro, pontos):
-    niveis = [{"limite": 100, "nome": "trocador oficial"}, {"limite": 50, "nome": "trocador confiavel"}, {"limite": 10, "nome": "trocador iniciante"}]
-    cargo_perigoso = discord.utils.get(ctx.guild.roles, name="trocador perigoso")
-    if pontos <= -10 and cargo_perigoso:
-        if cargo_perigoso not in membro.roles: await membro.add_roles(cargo_perigoso)
-    elif cargo_perigoso and cargo_perigoso in membro.roles and pontos > -10:
-        await membro.remove_roles(cargo_perigoso)
-    for nivel in niveis:
-        cargo = discord.utils.get(ctx.guild.roles, name=nivel["nome"])
-        if cargo:
-            if pontos >= nivel["limite"] and cargo not in membro.roles: await membro.add_roles(cargo)
-            elif pontos < nivel["limite"] and cargo in membro.roles: await membro.remove_roles(cargo)
+motor_cargos = MotorCargos()
+
+async def verificar_cargos_nivel(membro, pontos):
+    await motor_cargos.aplicar(membro, pontos)
+
+# --- RESSINCRONIZAÇÃO DE CARGOS ---
+RESYNC_LOTE = 1000
+RESYNC_EDICOES_POR_SEGUNDO = float(os.getenv('RESYNC_EDICOES_POR_SEGUNDO', 2))
+RESYNC_TRABALHADORES = 3
+tarefa_resync = None
+
+class LimitadorTaxa:
+    """Token bucket: no máximo `taxa` liberações por segundo, com rajada de até `rajada`."""
+
+    def __init__(self, taxa, rajada=1):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.fichas = rajada
+        self.ultimo = time.monotonic()
+
+    async def aguardar(self):
+        while True:
+            agora = time.monotonic()
+            self.fichas = min(self.rajada, self.fichas + (agora - self.ultimo) * self.taxa)
+            self.ultimo = agora
+            if self.fichas >= 1:
+                self.fichas -= 1
+                return
+            await asyncio.sleep((1 - self.fichas) / self.taxa)
+
+async def ler_checkpoint(nome):
+    return await db.buscar_um('SELECT guild_id, cursor, canal_id FROM tarefas_checkpoint WHERE nome = %s', (nome,))
+
+async def salvar_checkpoint(nome, guild_id, cursor, canal_id):
+    await db.executar('''INSERT INTO tarefas_checkpoint (nome, guild_id, cursor, canal_id) VALUES (%s, %s, %s, %s)
+        ON CONFLICT (nome) DO UPDATE SET guild_id = EXCLUDED.guild_id, cursor = EXCLUDED.cursor,
+        canal_id = EXCLUDED.canal_id, atualizado_em = CURRENT_TIMESTAMP''', (nome, guild_id, cursor, canal_id))
+
+async def apagar_checkpoint(nome):
+    await db.executar('DELETE FROM tarefas_checkpoint WHERE nome = %s', (nome,))
+
+async def ressincronizar_cargos(guild, canal, inicio=0):
+    """Recalcula os cargos de nível de todo mundo: lê "usuarios" em lotes por id (keyset),
+    compara com os cargos em cache de cada membro e só edita quem está errado, por um
+    pool de trabalhadores com limite de taxa. Salva o último id de cada lote concluído,
+    então dá para retomar de onde parou."""
+    limitador = LimitadorTaxa(RESYNC_EDICOES_POR_SEGUNDO, rajada=5)
+    fila = asyncio.Queue(maxsize=RESYNC_LOTE)
+    progresso = {"linhas": 0, "edicoes": 0, "erros": 0}
+
+    async def trabalhador():
+        while True:
+            membro, pontos = await fila.get()
+            try:
+                await limitador.aguardar()
+                # Os pontos podem ter mudado enquanto o membro esperava na fila
+                if membro.id in livro_rep.fichas: pontos = livro_rep.fichas[membro.id][0]
+                if await motor_cargos.aplicar(membro, pontos, motivo="Ressincronização dos cargos de reputação"):
+                    progresso["edicoes"] += 1
+            except Exception as e:
+                progresso["erros"] += 1
+                print(f"❌ [RESYNC] Erro ao editar {membro.id}: {e}")
+            finally:
+                fila.task_done()
+
+    async def enfileirar(membro, pontos):
+        if any(motor_cargos.diferenca(membro, pontos)): await fila.put((membro, pontos))
+
+    def texto_progresso(titulo):
+        return (f"{titulo}\n**Registros lidos:** `{progresso['linhas']}` | **Cargos corrigidos:** `{progresso['edicoes']}`"
+                f" | **Erros:** `{progresso['erros']}`")
+
+    trabalhadores = [asyncio.create_task(trabalhador()) for _ in range(RESYNC_TRABALHADORES)]
+    relatorio = await canal.send(texto_progresso("🔄 **Ressincronização de cargos iniciada...**" + (f" (retomando após o id `{inicio}`)" if inicio else "")))
+    ultimo_relatorio = time.monotonic()
+    try:
+        await livro_rep.descarregar()
+        cursor = inicio
+        while True:
+            linhas = await db.buscar_todos('SELECT id, rep, positivos, negativos FROM usuarios WHERE id > %s ORDER BY id LIMIT %s', (cursor, RESYNC_LOTE))
+            if not linhas: break
+            for uid, *ficha in linhas:
+                # Vale o banco (pode ter mudado por fora do bot); o cache só ganha se tiver evento ainda não gravado
+                pontos = livro_rep.atualizar_ficha(uid, ficha)
+                if ranking.pronto: ranking.atualizar(uid, pontos)
+                membro = guild.get_member(uid)
+                if membro is None: continue
+                await enfileirar(membro, pontos)
+            await fila.join()
+            cursor = linhas[-1][0]
+            progresso["linhas"] += len(linhas)
+            await salvar_checkpoint("resync_cargos", guild.id, cursor, canal.id)
+            if time.monotonic() - ultimo_relatorio >= 5:
+                await relatorio.edit(content=texto_progresso(f"🔄 **Ressincronizando...** (último id: `{cursor}`)"))
+                ultimo_relatorio = time.monotonic()
+
+        # Quem tem cargo de nível mas não tem registro na tabela está com 0 pts
+        gerenciados = set(motor_cargos.resolver(guild).values())
+        com_cargo = []
+        for i, membro in enumerate(guild.members):
+            if any(role.id in gerenciados for role in membro.roles): com_cargo.append(membro)
+            if i % 5000 == 0: await asyncio.sleep(0)
+        if com_cargo:
+            registrados = {uid for (uid,) in await db.buscar_todos('SELECT id FROM usuarios WHERE id = ANY(%s)', ([m.id for m in com_cargo],))}
+            for membro in com_cargo:
+                if membro.id in registrados: continue
+                livro_rep.esquecer([membro.id])
+                await enfileirar(membro, livro_rep.fichas[membro.id][0] if membro.id in livro_rep.fichas else 0)
+            await fila.join()
+
+        await apagar_checkpoint("resync_cargos")
+        await relatorio.edit(content=texto_progresso("✅ **Ressincronização de cargos concluída!**"))
+    except Exception as e:
+        print(f"❌ [RESYNC] Interrompido: {e}")
+        await relatorio.edit(content=texto_progresso(f"❌ **Ressincronização interrompida:** {e}\nUse `/resync_cargos` para retomar."))
+    finally:
+        for t in trabalhadores: t.cancel()
+
+def iniciar_resync(guild, canal, inicio=0):
+    global tarefa_resync
+    if tarefa_resync and not tarefa_resync.done(): return False
+    tarefa_resync = asyncio.create_task(ressincronizar_cargos(guild, canal, inicio))
+    return True
+
+async def retomar_resync():
+    """Continua, depois de um restart, uma ressincronização que não terminou."""
+    checkpoint = await ler_checkpoint("resync_cargos")
+    if not checkpoint: return
+    guild_id, cursor, canal_id = checkpoint
+    guild, canal = bot.get_guild(guild_id), bot.get_channel(canal_id)
+    if guild and canal and iniciar_resync(guild, canal, cursor):
+        print(f"🔄 Retomando ressincronização de cargos após o id {cursor}.")
+
+# --- CACHE DE NOMES ---
+NOMES_CONSULTAS_POR_SEGUNDO = float(os.getenv('NOMES_CONSULTAS_POR_SEGUNDO', 1))
+NOMES_FETCH_MAX = int(os.getenv('NOMES_FETCH_MAX', 10))   # fetch_user (REST) por chamada, para quem saiu do servidor
+NOMES_LOTE_ON_READY = 1000   # membros por passada no on_ready antes de devolver o loop
+
+class CacheNomes:
+    """Nome e avatar de cada usuário, em memória e no banco (gravados em lote).
+    Atualizado pelos eventos de membro/usuário; o que faltar é buscado em lotes de 100
+    pelo gateway (query_members) e só em último caso pela API, dentro de um orçamento."""
+
+    def __init__(self, banco, taxa=1, fetch_max=10):
+        self.banco = banco
+        self.fetch_max = fetch_max
+        self.limitador = LimitadorTaxa(taxa, rajada=2)
+        self.nomes = {}        # user_id -> (nome, avatar)
+        self.pendentes = {}    # user_id -> (nome, avatar) ainda não gravados
+        self.ausentes = set()  # contas apagadas/inacessíveis: não tenta de novo nesta execução
+        self.pronto = False
+
+    async def carregar(self):
+        self.nomes = {uid: (nome, avatar) for uid, nome, avatar in await self.banco.buscar_todos('SELECT user_id, nome, avatar FROM nomes_usuarios')}
+        self.pronto = True
+
+    def lembrar(self, usuario, invalidar=True):
+        # display_name: apelido no servidor quando é um Member, o mesmo nome que o ranking mostra
+        dados = (usuario.display_name, usuario.display_avatar.url)
+        if self.nomes.get(usuario.id) == dados: return False
+        self.nomes[usuario.id] = self.pendentes[usuario.id] = dados
+        self.ausentes.discard(usuario.id)
+        if invalidar: ranking.invalidar_usuario(usuario.id)
+        return True
+
+    async def lembrar_todos(self, membros):
+        """lembrar() para o servidor inteiro, em lotes, devolvendo o loop entre eles;
+        as páginas do ranking são descartadas uma vez só, no fim."""
+        mudou = False
+        for i, membro in enumerate(membros, 1):
+            mudou = self.lembrar(membro, invalidar=False) or mudou
+            if i % NOMES_LOTE_ON_READY == 0: await asyncio.sleep(0)
+        if mudou: ranking.embeds.clear()
+
+    def nome(self, user_id):
+        dados = self.nomes.get(user_id)
+        return dados[0] if dados else None
+
+    def avatar(self, user_id):
+        dados = self.nomes.get(user_id)
+        return dados[1] if dados else None
+
+    async def resolver(self, guild, user_ids):
+        """Garante no cache os nomes de user_ids, com o mínimo de chamadas."""
+        faltando = [uid for uid in dict.fromkeys(user_ids) if uid not in self.nomes and uid not in self.ausentes]
+        for uid in faltando:
+            usuario = (guild.get_member(uid) if guild else None) or bot.get_user(uid)
+            if usuario: self.lembrar(usuario)
+        faltando = [uid for uid in faltando if uid not in self.nomes]
+        if guild:
+            for i in range(0, len(faltando), 100):
+                await self.limitador.aguardar()
+                try:
+                    for membro in await guild.query_members(user_ids=faltando[i:i + 100], limit=100, cache=True):
+                        self.lembrar(membro)
+                except Exception as e:
+                    print(f"⚠️ Erro ao buscar membros: {e}")
+                    break
+        # Quem saiu do servidor só aparece pela API REST
+        for uid in [uid for uid in faltando if uid not in self.nomes][:self.fetch_max]:
+            await self.limitador.aguardar()
+            try: self.lembrar(await bot.fetch_user(uid))
+            except discord.NotFound: self.ausentes.add(uid)
+            except discord.HTTPException as e:
+                print(f"⚠️ Erro ao buscar usuário {uid}: {e}")
+                break
+
+    async def gravar(self):
+        if not self.pendentes: return 0
+        lote, self.pendentes = self.pendentes, {}
+        try:
+            await self.banco.transacao(lambda cursor: execute_values(cursor, '''INSERT INTO nomes_usuarios (user_id, nome, avatar) VALUES %s
+                ON CONFLICT (user_id) DO UPDATE SET nome = EXCLUDED.nome, avatar = EXCLUDED.avatar, atualizado_em = CURRENT_TIMESTAMP''',
+                [(uid, nome, avatar) for uid, (nome, avatar) in lote.items()]))
+        except Exception:
+            # O que mudou de novo enquanto gravava é mais recente que o lote
+            self.pendentes = {**lote, **self.pendentes}
+            raise
+        return len(lote)
+
+cache_nomes = CacheNomes(db, taxa=NOMES_CONSULTAS_POR_SEGUNDO, fetch_max=NOMES_FETCH_MAX)
+
+@tasks.loop(seconds=60)
+async def gravar_nomes():
+    try: await cache_nomes.gravar()
+    except Exception as e: print(f"❌ Erro ao gravar nomes: {e}")
+
+# --- BACKUP E RESTAURAÇÃO ---
+# Tabelas exportadas (também as únicas aceitas pelo /restore)
+TABELAS_BACKUP = ("usuarios", "blacklist", "rep_eventos")
+FORMATOS_BACKUP = ("csv", "jsonl", "colunar")
+# Consultas próprias das tabelas que levam o nome junto (o /restore ignora colunas que a tabela não tem)
+CONSULTAS_BACKUP = {
+    "usuarios": "SELECT u.*, n.nome FROM usuarios u LEFT JOIN nomes_usuarios n ON n.user_id = u.id",
+    "blacklist": "SELECT b.*, n.nome FROM blacklist b LEFT JOIN nomes_usuarios n ON n.user_id = b.user_id",
+}
+BACKUP_LOTE = int(os.getenv('BACKUP_LOTE', 5000))   # linhas por ida ao servidor (e por bloco no formato colunar)
+NULO_CSV = "\\N"   # NULL no CSV (o mesmo marcador do COPY do Postgres); "" continua sendo texto vazio
+RE_ARQUIVO_BACKUP = re.compile(r"^(" + "|".join(TABELAS_BACKUP) + r")_\d{8}_\d{4}\.(" + "|".join(FORMATOS_BACKUP) + r")\.gz(?:\.(\d{3}))?$")
+
+def _valor_json(valor):
+    return valor.isoformat(sep=" ") if isinstance(valor, datetime) else str(valor)
+
+def exportar_tabela(cursor, tabela, formato, destino):
+    """Copia a tabela para destino (gzip) por um cursor nomeado: o servidor manda BACKUP_LOTE
+    linhas por vez, então a memória não cresce com o tamanho da tabela. Roda na thread do banco.
+    csv/jsonl: uma linha por registro. colunar: 1ª linha com as colunas, depois um bloco
+    JSON por lote com uma lista por coluna (valores parecidos juntos comprimem melhor)."""
+    leitor = cursor.connection.cursor(name=f"backup_{tabela}")
+    leitor.itersize = BACKUP_LOTE
+    leitor.execute(CONSULTAS_BACKUP.get(tabela) or SQL("SELECT * FROM {}").format(Identifier(tabela)))
+    total = 0
+    with gzip.GzipFile(fileobj=destino, mode="wb", compresslevel=6) as compactado, \
+            io.TextIOWrapper(compactado, encoding="utf-8", newline="") as texto:
+        escritor = csv.writer(texto) if formato == "csv" else None
+        colunas = None
+        while True:
+            linhas = leitor.fetchmany(BACKUP_LOTE)
+            if colunas is None:
+                colunas = [c[0] for c in leitor.description]
+                if formato == "csv": escritor.writerow(colunas)
+                elif formato == "colunar": texto.write(json.dumps({"tabela": tabela, "colunas": colunas}) + "\n")
+            if not linhas: break
+            total += len(linhas)
+            if formato == "csv":
+                escritor.writerows([NULO_CSV if v is None else v for v in linha] for linha in linhas)
+            elif formato == "jsonl":
+                texto.writelines(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=_valor_json) + "\n" for linha in linhas)
+            else:
+                texto.write(json.dumps({"linhas": len(linhas), "dados": [list(col) for col in zip(*linhas)]}, ensure_ascii=False, default=_valor_json) + "\n")
+    leitor.close()
+    destino.seek(0)
+    return total
+
+def ler_backup(origem, formato):
+    """Lê um arquivo de backup (gzip) em streaming. Devolve (colunas, iterador de linhas)."""
+    texto = io.TextIOWrapper(gzip.GzipFile(fileobj=origem, mode="rb"), encoding="utf-8", newline="")
+    if formato == "csv":
+        leitor = csv.reader(texto)
+        return next(leitor, []), ([None if v == NULO_CSV else v for v in linha] for linha in leitor)
+    if formato == "colunar":
+        cabecalho = json.loads(texto.readline() or "{}")
+        def _linhas():
+            for bloco in texto:
+                yield from zip(*json.loads(bloco)["dados"])
+        return cabecalho.get("colunas", []), _linhas()
+    primeira = texto.readline()
+    if not primeira: return [], iter(())
+    colunas = list(json.loads(primeira))
+    def _linhas():
+        yield [json.loads(primeira).get(c) for c in colunas]
+        for linha in texto:
+            registro = json.loads(linha)
+            yield [registro.get(c) for c in colunas]
+    return colunas, _linhas()
+
+class FluxoCSV:
+    """Objeto só-leitura que gera CSV sob demanda a partir de um iterador de linhas,
+    para o COPY FROM STDIN ler em pedaços sem o arquivo inteiro em memória."""
+
+    def __init__(self, linhas):
+        self.linhas = iter(linhas)
+        self.buffer = io.StringIO()
+        self.escritor = csv.writer(self.buffer)
+        self.sobra = ""
+
+    def read(self, tamanho=-1):
+        pedacos, total = [self.sobra], len(self.sobra)
+        while tamanho < 0 or total < tamanho:
+            linha = next(self.linhas, None)
+            if linha is None: break
+            self.escritor.writerow([NULO_CSV if v is None else v for v in linha])
+            pedacos.append(self.buffer.getvalue())
+            total += len(pedacos[-1])
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        dados = "".join(pedacos)
+        if tamanho < 0: tamanho = len(dados)
+        self.sobra = dados[tamanho:]
+        return dados[:tamanho]
+
+def restaurar_tabela(cursor, tabela, formato, origem, substituir=False):
+    """Carrega um backup com COPY numa tabela temporária e passa para a tabela real
+    (ignorando o que já existe, ou trocando tudo se substituir=True). Roda na thread do banco.
+    O cabeçalho vem do arquivo enviado: só passam colunas que existem na tabela, e os nomes
+    entram no SQL como identificadores escapados."""
+    if tabela not in TABELAS_BACKUP: raise ValueError(f"Tabela não aceita no restore: {tabela}")
+    colunas, linhas = ler_backup(origem, formato)
+    cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s", (tabela,))
+    existentes = {linha[0] for linha in cursor.fetchall()}
+    indices, aceitas = [], set()
+    for i, coluna in enumerate(colunas):
+        if coluna in existentes and coluna not in aceitas:
+            indices.append(i)
+            aceitas.add(coluna)
+    if len(indices) != len(colunas):
+        colunas = [colunas[i] for i in indices]
+        linhas = ([linha[i] for i in indices] for linha in linhas)
+    if not colunas: return 0
+    alvo, nomes = Identifier(tabela), SQL(", ").join(map(Identifier, colunas))
+    cursor.execute(SQL("CREATE TEMP TABLE restauracao (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(alvo))
+    cursor.copy_expert(SQL("COPY restauracao ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(nomes, Literal(NULO_CSV)), FluxoCSV(linhas))
+    if substituir: cursor.execute(SQL("TRUNCATE {}").format(alvo))
+    cursor.execute(SQL("INSERT INTO {} ({}) SELECT {} FROM restauracao ON CONFLICT DO NOTHING").format(alvo, nomes, nomes))
+    inseridos = cursor.rowcount
+    if tabela == "rep_eventos":
+        cursor.execute("SELECT setval(pg_get_serial_sequence('rep_eventos', 'id'), COALESCE(MAX(id), 1)) FROM rep_eventos")
+    cursor.execute("DROP TABLE restauracao")
+    return inseridos
+
+# --- ANTIFRAUDE (ANÉIS DE REPUTAÇÃO) ---
+ANTIFRAUDE_LOTE = int(os.getenv('ANTIFRAUDE_LOTE', 50000))
+ANEL_TAMANHO_MAX = int(os.getenv('ANEL_TAMANHO_MAX', 25))           # componentes maiores são a comunidade, não um anel
+ANEL_DENSIDADE = float(os.getenv('ANEL_DENSIDADE', 0.5))            # fração dos pares possíveis que trocam +rep
+ANEL_PARTICIPACAO = float(os.getenv('ANEL_PARTICIPACAO', 0.6))      # fração da +rep do membro vinda de dentro do anel
+CONTA_NOVA_DIAS = int(os.getenv('CONTA_NOVA_DIAS', 7))
+CONTAS_NOVAS_MIN = int(os.getenv('CONTAS_NOVAS_MIN', 3))
+RAJADA_JANELA = int(os.getenv('RAJADA_JANELA', 3600))
+RAJADA_MIN = int(os.getenv('RAJADA_MIN', 5))
+ANTIFRAUDE_SOBREPOSICAO = int(os.getenv('ANTIFRAUDE_SOBREPOSICAO', 2000))  # ids relidos atrás do cursor (commits atrasados)
+
+def componentes_fortes(saidas, raizes):
+    """Tarjan iterativo (sem recursão) a partir de `raizes`: visita só o que elas alcançam, e
+    cada componente visitado sai inteiro (ele está todo no alcance de qualquer membro seu).
+    saidas[v] são os vizinhos de v. Devolve (componentes com mais de um nó, nós visitados)."""
+    indice, baixo = {}, {}
+    na_pilha = set()
+    pilha, componentes, contador = [], [], 0
+    for raiz in raizes:
+        if raiz in indice: continue
+        indice[raiz] = baixo[raiz] = contador
+        contador += 1
+        pilha.append(raiz)
+        na_pilha.add(raiz)
+        chamadas = [[raiz, 0]]
+        while chamadas:
+            quadro = chamadas[-1]
+            v, i = quadro
+            vizinhos = saidas[v]
+            if i < len(vizinhos):
+                quadro[1] = i + 1
+                w = vizinhos[i]
+                if w not in indice:
+                    indice[w] = baixo[w] = contador
+                    contador += 1
+                    pilha.append(w)
+                    na_pilha.add(w)
+                    chamadas.append([w, 0])
+                elif w in na_pilha and indice[w] < baixo[v]:
+                    baixo[v] = indice[w]
+                continue
+            chamadas.pop()
+            if chamadas:
+                u = chamadas[-1][0]
+                if baixo[v] < baixo[u]: baixo[u] = baixo[v]
+            if baixo[v] == indice[v]:
+                componente = []
+                while True:
+                    w = pilha.pop()
+                    na_pilha.discard(w)
+                    componente.append(w)
+                    if w == v: break
+                if len(componente) > 1: componentes.append(componente)
+    return componentes, indice.keys()
+
+class GrafoRep:
+    """Grafo quem-deu-+rep-para-quem, montado aos poucos a partir de rep_eventos (cursor pelo id).
+    Usuários viram índices densos e a adjacência cresce junto com as arestas. Os componentes
+    fortes ficam guardados entre as análises: só uma aresta nova entre componentes diferentes
+    (que pode fechar um ciclo) faz a busca rodar de novo, a partir dela; +rep numa aresta que
+    já existe só reavalia o componente de quem recebeu."""
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.cursor = 0
+        self.ingeridos = set()  # ids já lidos dentro da sobreposição (não contam duas vezes)
+        self.indice = {}      # user_id -> índice
+        self.ids = []         # índice -> user_id
+        self.pesos = {}       # (origem, destino) -> quantas +rep
+        self.saidas = []      # índice -> destinos, um por aresta distinta
+        self.recebidos = []   # índice -> total de +rep recebida
+        self.doadores = []    # índice -> quantos doadores distintos
+        self.novos = {}       # índice -> doadores com conta recém-criada
+        self.janelas = {}     # índice -> deque com os horários da +rep recebida na última janela
+        self.rajada = {}      # índice -> (maior nº de +rep numa janela, horário em que chegou nele)
+        self.sujos = set()    # índices que receberam +rep desde a última análise
+        self.arestas_novas = []   # (origem, destino) criadas desde a última análise
+        self.componente = {}  # índice -> rótulo do componente forte (só componentes com mais de um nó)
+        self.componentes = {} # rótulo -> membros
+        self.rotulos = itertools.count()
+        self.marcados = {}    # índice -> {regra: detalhe} segundo a última análise
+
+    def _no(self, user_id):
+        idx = self.indice.get(user_id)
+        if idx is None:
+            idx = self.indice[user_id] = len(self.ids)
+            self.ids.append(user_id)
+            self.saidas.append([])
+            self.recebidos.append(0)
+            self.doadores.append(0)
+        return idx
+
+    def adicionar(self, eventos):
+        """eventos: (id, giver, receiver, criado_em em segundos epoch), em ordem de id.
+        Laço quente: tudo em variáveis locais e aritmética simples (1M eventos em poucos segundos)."""
+        indice, pesos, saidas, recebidos, janelas, rajada = self.indice, self.pesos, self.saidas, self.recebidos, self.janelas, self.rajada
+        sujos = self.sujos
+        idade_nova = CONTA_NOVA_DIAS * 86400
+        for evento_id, giver, receiver, criado_em in eventos:
+            origem = indice.get(giver)
+            if origem is None: origem = self._no(giver)
+            destino = indice.get(receiver)
+            if destino is None: destino = self._no(receiver)
+            chave = (origem, destino)
+            if chave in pesos:
+                pesos[chave] += 1
+            else:
+                pesos[chave] = 1
+                saidas[origem].append(destino)
+                self.arestas_novas.append(chave)
+                self.doadores[destino] += 1
+                # Data de criação da conta direto do snowflake (ms desde a época do Discord)
+                if criado_em - ((giver >> 22) + 1420070400000) / 1000 < idade_nova:
+                    self.novos.setdefault(destino, set()).add(origem)
+            sujos.add(destino)
+            recebidos[destino] += 1
+            janela = janelas.get(destino)
+            if janela is None: janela = janelas[destino] = deque()
+            janela.append(criado_em)
+            while criado_em - janela[0] > RAJADA_JANELA: janela.popleft()
+            if len(janela) >= RAJADA_MIN:
+                # Guarda o pico; uma rajada nova substitui a anterior que já saiu da janela
+                pico, quando = rajada.get(destino, (0, 0))
+                if len(janela) >= pico or criado_em - quando > RAJADA_JANELA:
+                    rajada[destino] = (len(janela), criado_em)
+        if eventos:
+            self.cursor = max(self.cursor, eventos[-1][0])
+            limite = self.cursor - ANTIFRAUDE_SOBREPOSICAO
+            self.ingeridos = {i for i in self.ingeridos if i > limite}
+            self.ingeridos.update(ev[0] for ev in eventos if ev[0] > limite)
+
+    def _marcar(self, v, regra, detalhe):
+        self.marcados.setdefault(v, {})[regra] = detalhe
+
+    def _desmarcar(self, v, regra):
+        regras = self.marcados.get(v)
+        if regras and regras.pop(regra, None) is not None and not regras: del self.marcados[v]
+
+    def analisar(self, agora):
+        """Atualiza as marcações com o que mudou e devolve {user_id: {regra: detalhe}} de todas
+        as contas suspeitas no momento. agora: segundos epoch (as rajadas expiram)."""
+        sujos, self.sujos = self.sujos, set()
+        novas, self.arestas_novas = self.arestas_novas, []
+        componente = self.componente
+        # u->v só muda os componentes se fechar um ciclo: u precisa receber de alguém, v precisa
+        # dar para alguém, e os dois ainda não podem estar no mesmo componente
+        raizes = [u for u, v in novas if (componente.get(u) is None or componente.get(u) != componente.get(v))
+                  and self.doadores[u] and self.saidas[v]]
+        # A busca acha inteiro todo componente que visita, inclusive os antigos que se fundiram
+        encontrados, visitados = componentes_fortes(self.saidas, dict.fromkeys(raizes))
+        for v in visitados:
+            rotulo = componente.pop(v, None)
+            if rotulo is not None: self.componentes.pop(rotulo, None)
+            self._desmarcar(v, "anel")
+        reavaliar = set()
+        for membros in encontrados:
+            rotulo = next(self.rotulos)
+            self.componentes[rotulo] = membros
+            for v in membros: componente[v] = rotulo
+            reavaliar.add(rotulo)
+        reavaliar.update(componente[v] for v in sujos if v in componente)
+        for rotulo in reavaliar:
+            grupo = self.componentes[rotulo]
+            k = len(grupo)
+            if k > ANEL_TAMANHO_MAX: continue
+            for v in grupo: self._desmarcar(v, "anel")
+            membros = set(grupo)
+            internas = sum(1 for v in grupo for w in self.saidas[v] if w in membros)
+            densidade = internas / (k * (k - 1))
+            if densidade < ANEL_DENSIDADE: continue
+            for v in grupo:
+                de_dentro = sum(self.pesos.get((u, v), 0) for u in grupo if u != v)
+                if self.recebidos[v] and de_dentro / self.recebidos[v] >= ANEL_PARTICIPACAO:
+                    self._marcar(v, "anel", f"anel de {k} contas ({densidade:.0%} trocam +rep)")
+        for v in sujos:
+            novos = self.novos.get(v, ())
+            if len(novos) >= CONTAS_NOVAS_MIN and len(novos) / self.doadores[v] >= 0.5:
+                self._marcar(v, "contas_novas", f"{len(novos)} de {self.doadores[v]} doadores com conta de menos de {CONTA_NOVA_DIAS} dias")
+            else:
+                self._desmarcar(v, "contas_novas")
+        # Rajada só vale enquanto está dentro da janela
+        for v, (pico, quando) in list(self.rajada.items()):
+            if agora - quando > RAJADA_JANELA:
+                del self.rajada[v]
+                self._desmarcar(v, "rajada")
+            else:
+                self._marcar(v, "rajada", f"{pico} +rep em menos de {RAJADA_JANELA // 60} min")
+        for v, janela in list(self.janelas.items()):
+            while janela and agora - janela[0] > RAJADA_JANELA: janela.popleft()
+            if not janela: del self.janelas[v]
+        return {self.ids[v]: dict(regras) for v, regras in self.marcados.items()}
+
+class Antifraude:
+    """Lê só os eventos novos desde a última passada (relendo uma sobreposição atrás do cursor,
+    para pegar linhas com commit atrasado), reanalisa numa thread só o que eles mexeram e avisa
+    a staff. O alerta é por (usuário, regra): mudar a contagem só atualiza o detalhe no banco,
+    e regra que deixou de valer é esquecida (se voltar, alerta de novo)."""
+
+    def __init__(self, banco):
+        self.banco = banco
+        self.grafo = GrafoRep()
+        self.alertados = None   # (user_id, regra) -> detalhe gravado
+        self._trava = asyncio.Lock()
+
+    async def reiniciar(self):
+        async with self._trava:
+            self.grafo.reiniciar()
+
+    async def rodar(self):
+        async with self._trava:
+            if self.alertados is None:
+                self.alertados = {(uid, regra): detalhe for uid, regra, detalhe in
+                                  await self.banco.buscar_todos('SELECT user_id, regra, detalhe FROM suspeitos_regras')}
+            await livro_rep.descarregar()
+            inicio = time.monotonic()
+            novos = 0
+            desde = max(0, self.grafo.cursor - ANTIFRAUDE_SOBREPOSICAO)
+            while True:
+                eventos = await self.banco.buscar_todos('''SELECT id, giver_id, receiver_id, EXTRACT(EPOCH FROM criado_em)::float8 FROM rep_eventos
+                    WHERE id > %s AND tipo = 'rep' AND delta > 0 AND giver_id IS NOT NULL AND giver_id <> receiver_id
+                    ORDER BY id LIMIT %s''', (desde, ANTIFRAUDE_LOTE))
+                if not eventos: break
+                desde = eventos[-1][0]
+                eventos = [ev for ev in eventos if ev[0] not in self.grafo.ingeridos]
+                if eventos:
+                    await asyncio.to_thread(self.grafo.adicionar, eventos)
+                    novos += len(eventos)
+            suspeitos = await asyncio.to_thread(self.grafo.analisar, time.time())
+            atuais = {(uid, regra): detalhe for uid, regras in suspeitos.items() for regra, detalhe in regras.items()}
+            alertas = {}
+            for uid, regra in atuais:
+                if (uid, regra) not in self.alertados: alertas.setdefault(uid, []).append(atuais[(uid, regra)])
+            mudados = [(uid, regra, detalhe) for (uid, regra), detalhe in atuais.items() if self.alertados.get((uid, regra)) != detalhe]
+            resolvidos = [chave for chave in self.alertados if chave not in atuais]
+            if mudados or resolvidos:
+                def _gravar(cursor):
+                    if mudados:
+                        execute_values(cursor, '''INSERT INTO suspeitos_regras (user_id, regra, detalhe) VALUES %s
+                            ON CONFLICT (user_id, regra) DO UPDATE SET detalhe = EXCLUDED.detalhe''', mudados)
+                    if resolvidos:
+                        execute_values(cursor, 'DELETE FROM suspeitos_regras WHERE (user_id, regra) IN (VALUES %s)', resolvidos)
+                await self.banco.transacao(_gravar)
+                self.alertados.update(((uid, regra), detalhe) for uid, regra, detalhe in mudados)
+                for chave in resolvidos: del self.alertados[chave]
+            alertas = list(alertas.items())
+            print(f"🕵️ Antifraude: {novos} eventos novos, {len(self.grafo.pesos)} arestas, {len(alertas)} alertas em {time.monotonic() - inicio:.1f}s")
+            return novos, alertas
+
+antifraude = Antifraude(db)
+
+async def alertar_suspeitos(alertas):
+    canal = bot.get_channel(ID_CANAL_STAFF)
+    if not canal or not alertas: return
+    # Um embed comporta 25 campos
+    for i in range(0, len(alertas), 25):
+        embed = discord.Embed(title="🕵️ Antifraude: contas suspeitas de farmar reputação", color=0xe67e22, timestamp=datetime.now())
+        for uid, motivos in alertas[i:i + 25]:
+            nome = cache_nomes.nome(uid) or uid
+            embed.add_field(name=f"{nome} ({uid})", value="\n".join(f"• {m}" for m in motivos)[:1024], inline=False)
+        embed.set_footer(text="Verifique antes de agir: é só um indício.")
+        await canal.send(embed=embed)
+
+@tasks.loop(minutes=30)
+async def rodar_antifraude():
+    try:
+        _, alertas = await antifraude.rodar()
+        await alertar_suspeitos(alertas)
+    except Exception as e: print(f"❌ Erro no antifraude: {e}")
 
 # --- CLASSES DE INTERFACE (VIEWS) ---
 class FinalizarTrocaView(discord.ui.View):
@@ -331,7 +2323,7 @@ class FinalizarTrocaView(discord.ui.View):
     async def finalizar_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         thread = interaction.channel
         is_owner = interaction.user.id == thread.owner_id
-        is_staff = any(role.name.lower() == "mods" for role in interaction.user.roles) or interaction.user.guild_permissions.administrator
+        is_staff = autorizacao.eh_staff(interaction.user)
 
         if not (is_owner or is_staff):
             return await interaction.response.send_message("❌ Apenas o dono do post ou a staff podem finalizar esta troca.", ephemeral=True)
@@ -356,38 +2348,299 @@ class VoiceSelectionView(discord.ui.View):
         for i, canal_id in enumerate(canais_voz, 1):
             self.add_item(discord.ui.Button(label=f"Sala {i}", url=f"https://discord.com/channels/{guild_id}/{canal_id}", style=discord.ButtonStyle.link))
 
-class RaidView(discord.ui.View):
-    def __init__(self, host, mapa, vagas_totais):
-        super().__init__(timeout=3600)
-        self.host = host
+# --- CHAMADAS DE RAID ---
+RAID_VALIDADE = int(os.getenv('RAID_VALIDADE', 3600))            # segundos sem ninguém entrar até a chamada expirar
+RAID_EDICAO_INTERVALO = float(os.getenv('RAID_EDICAO_INTERVALO', 1.5))  # cliques nessa janela viram uma edição só
+
+class Raid:
+    def __init__(self, message_id, canal_id, host_id, mapa, vagas, participantes, atualizado_em=None):
+        self.message_id = message_id
+        self.canal_id = canal_id
+        self.host_id = host_id
         self.mapa = mapa
-        self.vagas_totais = vagas_totais
-        self.participantes = [host]
+        self.vagas = vagas
+        self.participantes = list(participantes)
+        self.atualizado_em = atualizado_em or datetime.now()
+        self.edicao = None   # tarefa da edição agendada
+
+    @property
+    def completo(self):
+        return len(self.participantes) >= self.vagas
+
+    def embed(self):
+        embed = discord.Embed(title=f"🚨Chamada p/ Raid: {'DUO' if self.vagas==2 else 'TRIO'}", color=discord.Color.gold() if self.completo else 0x2ecc71)
+        embed.add_field(name="📍 Mapa/Objetivo", value=self.mapa.upper(), inline=True)
+        embed.add_field(name=f"Membros ({len(self.participantes)}/{self.vagas})", value="\n".join(f"👤 <@{uid}>" for uid in self.participantes), inline=False)
+        return embed
+
+class RegistroRaids:
+    """Chamadas de /raid abertas, por id da mensagem, em memória e no banco. Várias entradas
+    seguidas viram uma única edição da mensagem (e uma gravação) a cada RAID_EDICAO_INTERVALO."""
+
+    def __init__(self, banco, validade=3600, intervalo=1.5):
+        self.banco = banco
+        self.validade = validade
+        self.intervalo = intervalo
+        self.raids = {}
+        self.pronto = False
+        self._desenhos = {}   # completo -> RaidView parada, só para desenhar o botão
+
+    async def carregar(self):
+        limite = datetime.now() - timedelta(seconds=self.validade)
+        await self.banco.executar('DELETE FROM raids WHERE atualizado_em < %s', (limite,))
+        self.raids = {linha[0]: Raid(*linha) for linha in await self.banco.buscar_todos(
+            'SELECT message_id, canal_id, host_id, mapa, vagas, participantes, atualizado_em FROM raids')}
+        self.pronto = True
+
+    def desenho(self, completo):
+        """Componentes da mensagem (o rótulo do botão muda quando o squad completa). A view vai
+        parada: o discord.py não guarda view parada para a mensagem, então o clique continua
+        caindo na RaidView única do bot.add_view, pelo custom_id."""
+        view = self._desenhos.get(completo)
+        if view is None:
+            view = self._desenhos[completo] = RaidView(completo)
+            view.stop()
+        return view
+
+    def buscar(self, message_id):
+        raid = self.raids.get(message_id)
+        if raid and (datetime.now() - raid.atualizado_em).total_seconds() > self.validade: return None
+        return raid
+
+    async def criar(self, message, host_id, mapa, vagas):
+        raid = self.raids[message.id] = Raid(message.id, message.channel.id, host_id, mapa, vagas, [host_id])
+        await self.banco.executar('''INSERT INTO raids (message_id, canal_id, host_id, mapa, vagas, participantes, atualizado_em)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)''', (raid.message_id, raid.canal_id, host_id, mapa, vagas, raid.participantes, raid.atualizado_em))
+        return raid
+
+    def entrar(self, raid, user_id, message):
+        raid.participantes.append(user_id)
+        raid.atualizado_em = datetime.now()
+        if raid.edicao is None or raid.edicao.done():
+            raid.edicao = asyncio.create_task(self._editar(raid, message))
+
+    async def _editar(self, raid, message):
+        await asyncio.sleep(self.intervalo)
+        # Renderiza o estado de agora: inclui todo mundo que entrou durante a espera
+        try:
+            await self.banco.executar('UPDATE raids SET participantes = %s, atualizado_em = %s WHERE message_id = %s',
+                                      (raid.participantes, raid.atualizado_em, raid.message_id))
+        except Exception as e: print(f"❌ Erro ao gravar raid: {e}")
+        try: await message.edit(embed=raid.embed(), view=self.desenho(raid.completo))
+        except Exception as e: print(f"❌ Erro ao atualizar chamada de raid: {e}")
+
+    async def expirar(self):
+        limite = datetime.now() - timedelta(seconds=self.validade)
+        for message_id in [mid for mid, raid in self.raids.items() if raid.atualizado_em < limite]:
+            del self.raids[message_id]
+        return await self.banco.executar('DELETE FROM raids WHERE atualizado_em < %s', (limite,))
+
+raids = RegistroRaids(db, validade=RAID_VALIDADE, intervalo=RAID_EDICAO_INTERVALO)
+
+@tasks.loop(minutes=10)
+async def expirar_raids():
+    try: await raids.expirar()
+    except Exception as e: print(f"❌ Erro ao expirar raids: {e}")
+
+class RaidView(discord.ui.View):
+    """View persistente única: o estado vem do registro, pelo id da mensagem clicada."""
 
-    @discord.ui.button(label="Entrar no Squad", style=discord.ButtonStyle.green, emoji="✋")
+    def __init__(self, completo=False):
+        super().__init__(timeout=None)
+        if completo:
+            self.entrar_button.label = "Squad Completo (Clique p/ Salas)"
+            self.entrar_button.style = discord.ButtonStyle.secondary
+
+    @discord.ui.button(label="Entrar no Squad", style=discord.ButtonStyle.green, emoji="✋", custom_id="btn_entrar_raid")
     async def entrar_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if len(self.participantes) >= self.vagas_totais:
-            if interaction.user.id == self.host.id:
+        raid = raids.buscar(interaction.message.id)
+        if raid is None:
+            return await interaction.response.send_message("❌ Esta chamada de raid expirou. Abra outra com `/raid`.", ephemeral=True)
+        if raid.completo:
+            if interaction.user.id == raid.host_id:
                 view_voz = VoiceSelectionView(interaction.guild.id)
-                return await interaction.response.send_message(content=f"🎮 **Sua Raid de {self.mapa.upper()} está pronta!**\n\n**Como convidar seu squad:**\n1. Escolha uma sala abaixo.\n2. Clique com o botão direito nela e selecione **'Copiar Link'**.\n3. Cole o link aqui no canal para seus parceiros entrarem.", view=view_voz, ephemeral=True)
+                return await interaction.response.send_message(content=f"🎮 **Sua Raid de {raid.mapa.upper()} está pronta!**\n\n**Como convidar seu squad:**\n1. Escolha uma sala abaixo.\n2. Clique com o botão direito nela e selecione **'Copiar Link'**.\n3. Cole o link aqui no canal para seus parceiros entrarem.", view=view_voz, ephemeral=True)
             else:
                 return await interaction.response.send_message("❌ Este squad já está completo!", ephemeral=True)
-        if interaction.user in self.participantes:
+        if interaction.user.id in raid.participantes:
             return await interaction.response.send_message("❌ Você já está neste squad!", ephemeral=True)
-        self.participantes.append(interaction.user)
-        embed = interaction.message.embeds[0]
-        lista_mentions = "\n".join([m.mention for m in self.participantes])
-        embed.set_field_at(1, name=f"Membros ({len(self.participantes)}/{self.vagas_totais})", value=lista_mentions, inline=False)
-        if len(self.participantes) >= self.vagas_totais:
-            button.label = "Squad Completo (Clique p/ Salas)"
-            button.style = discord.ButtonStyle.secondary
-            embed.color = discord.Color.gold()
-        await interaction.message.edit(embed=embed, view=self)
-        if len(self.participantes) >= self.vagas_totais and interaction.user.id == self.host.id:
+        raids.entrar(raid, interaction.user.id, interaction.message)
+        if raid.completo and interaction.user.id == raid.host_id:
             await interaction.response.send_message(content="✅ **Squad Completo!** Escolha a sala abaixo e envie o link.", view=VoiceSelectionView(interaction.guild.id), ephemeral=True)
         else:
             await interaction.response.send_message("✅ Você entrou no squad!", ephemeral=True)
 
+# --- FILA DE MATCHMAKING ---
+FILA_VALIDADE = int(os.getenv('FILA_VALIDADE', 1800))   # segundos na fila até sair sozinho
+FILA_REPOR_ESPERA = float(os.getenv('FILA_REPOR_ESPERA', 30))   # squad que não deu para avisar volta à fila depois disso
+FILA_TENTATIVAS = 3                                             # ...até essa quantidade de tentativas
+MODOS_FILA = {"duo": 2, "trio": 3}
+
+class FilaMatchmaking:
+    """Uma deque por (mapa, tamanho). Entrar, sair e formar squad são O(1) amortizado: quem sai
+    só é tirado do índice e a entrada velha na deque é pulada quando chega a vez dela.
+    Fica só em memória, como o painel: um restart esvazia as filas (quem esperava dá /fila de
+    novo) e o painel é postado numa mensagem nova. O simulador de carga fica nos testes."""
+
+    def __init__(self, validade=1800):
+        self.validade = validade
+        self.filas = {}      # (mapa, tamanho) -> deque de (user_id, ficha)
+        self.validos = {}    # (mapa, tamanho) -> quantos ainda estão esperando
+        self.entradas = {}   # user_id -> (chave, ficha, entrou_em)
+        self._fichas = itertools.count()
+
+    def entrar(self, user_id, mapa, tamanho, agora=None):
+        """Põe o jogador na fila (trocando de fila se já estava em outra). Devolve os squads formados."""
+        self.sair(user_id)
+        chave, ficha = (mapa, tamanho), next(self._fichas)
+        self.entradas[user_id] = (chave, ficha, time.monotonic() if agora is None else agora)
+        self.filas.setdefault(chave, deque()).append((user_id, ficha))
+        self.validos[chave] = self.validos.get(chave, 0) + 1
+        return self._formar(chave)
+
+    def sair(self, user_id):
+        entrada = self.entradas.pop(user_id, None)
+        if entrada is None: return False
+        chave = entrada[0]
+        self.validos[chave] -= 1
+        fila = self.filas[chave]
+        # Muita entrada morta acumulada: compacta de uma vez
+        if len(fila) > 2 * self.validos[chave] + 16:
+            self.filas[chave] = deque(item for item in fila if self._vivo(item))
+        if not self.validos[chave]:
+            del self.filas[chave], self.validos[chave]
+        return True
+
+    def _vivo(self, item):
+        entrada = self.entradas.get(item[0])
+        return entrada is not None and entrada[1] == item[1]
+
+    def _formar(self, chave):
+        tamanho = chave[1]
+        squads = []
+        while self.validos.get(chave, 0) >= tamanho:
+            fila, squad = self.filas[chave], []
+            while len(squad) < tamanho:
+                item = fila.popleft()
+                if self._vivo(item): squad.append(item[0])
+            for user_id in squad: self.sair(user_id)
+            squads.append(squad)
+        return squads
+
+    def expirar(self, agora=None):
+        agora = time.monotonic() if agora is None else agora
+        vencidos = [uid for uid, (_, _, entrou_em) in self.entradas.items() if agora - entrou_em > self.validade]
+        for user_id in vencidos: self.sair(user_id)
+        return vencidos
+
+    def posicao(self, user_id):
+        entrada = self.entradas.get(user_id)
+        if entrada is None: return None
+        return entrada[0], self.validos[entrada[0]]
+
+    def resumo(self):
+        return sorted(((mapa, tamanho, n) for (mapa, tamanho), n in self.validos.items()), key=lambda item: -item[2])
+
+class PainelFila:
+    """Uma mensagem só no canal de raid com o estado de todas as filas e os últimos squads,
+    editada no máximo uma vez por intervalo."""
+
+    def __init__(self, intervalo=2.0):
+        self.intervalo = intervalo
+        self.mensagem = None
+        self.formados = deque(maxlen=5)
+        self._edicao = None
+
+    def agendar(self, canal):
+        if self._edicao is None or self._edicao.done():
+            self._edicao = asyncio.create_task(self._atualizar(canal))
+
+    def embed(self):
+        embed = discord.Embed(title="🎯 Fila de Squads", color=0x2ecc71, timestamp=datetime.now(),
+                              description="Entre com `/fila [mapa] [duo/trio]` e o squad se forma sozinho quando fechar o número.")
+        linhas = [f"📍 **{mapa.upper()}** ({'DUO' if tamanho == 2 else 'TRIO'}) — `{n}/{tamanho}` aguardando" for mapa, tamanho, n in matchmaking.resumo()[:20]]
+        embed.add_field(name="⏳ Aguardando", value="\n".join(linhas) or "Ninguém na fila.", inline=False)
+        if self.formados:
+            embed.add_field(name="✅ Últimos squads", value="\n".join(self.formados), inline=False)
+        return embed
+
+    async def _atualizar(self, canal):
+        await asyncio.sleep(self.intervalo)
+        try:
+            if self.mensagem:
+                try: return await self.mensagem.edit(embed=self.embed())
+                except discord.NotFound: self.mensagem = None
+            self.mensagem = await canal.send(embed=self.embed())
+        except Exception as e: print(f"❌ Erro ao atualizar painel da fila: {e}")
+
+matchmaking = FilaMatchmaking(validade=FILA_VALIDADE)
+painel_fila = PainelFila()
+
+tarefas_squad = set()   # formar_squad em andamento (a referência impede o GC de coletar a task)
+
+def agendar_squads(guild, canal, mapa, tamanho, squads, tentativa=1):
+    for squad in squads:
+        tarefa = asyncio.create_task(formar_squad(guild, canal, mapa, tamanho, squad, tentativa))
+        tarefas_squad.add(tarefa)
+        tarefa.add_done_callback(tarefas_squad.discard)
+
+def links_da_sala(guild, sala):
+    """Botões de link para a sala do squad (ou para as salas fixas, sem sala reservada)."""
+    if sala is None: return VoiceSelectionView(guild.id)
+    view = discord.ui.View(timeout=None)
+    view.add_item(discord.ui.Button(label="Entrar na sala", url=sala.jump_url, style=discord.ButtonStyle.link))
+    return view
+
+async def avisar_por_dm(membros, embed, view):
+    """Plano B quando o anúncio no canal falha. Devolve quantos receberam a DM."""
+    avisados = 0
+    for membro in membros:
+        try:
+            await membro.send(embed=embed, view=view)
+            avisados += 1
+        except Exception as e: print(f"⚠️ [FILA] DM do squad não chegou para {membro.id}: {e}")
+    return avisados
+
+async def formar_squad(guild, canal, mapa, tamanho, ids, tentativa=1):
+    membros = [m for m in (guild.get_member(uid) for uid in ids) if m]
+    if len(membros) < tamanho:
+        # Alguém saiu do servidor nesse meio tempo: os outros voltam para a fila
+        for membro in membros:
+            agendar_squads(guild, canal, mapa, tamanho, matchmaking.entrar(membro.id, mapa, tamanho))
+        return
+    try: sala = await salas.reservar_squad(guild, "duo" if tamanho == 2 else "trio", membros)
+    except Exception as e:
+        print(f"❌ Erro ao reservar sala para o squad: {e}")
+        sala = None
+    embed = discord.Embed(title=f"🚨 Squad formado: {mapa.upper()} ({'DUO' if tamanho == 2 else 'TRIO'})", color=discord.Color.gold(),
+                          description="\n".join(f"👤 {m.mention}" for m in membros))
+    if sala: embed.add_field(name="🔊 Sala", value=f"{sala.mention} — já liberada para vocês.", inline=False)
+    else: embed.add_field(name="🔊 Sala", value="Escolham uma sala abaixo.", inline=False)
+    try:
+        if sala: await canal.send(content=" ".join(m.mention for m in membros), embed=embed)
+        else: await canal.send(content=" ".join(m.mention for m in membros), embed=embed, view=VoiceSelectionView(guild.id))
+    except Exception as e:
+        print(f"❌ Erro ao anunciar squad de {mapa}: {e}")
+        if not await avisar_por_dm(membros, embed, links_da_sala(guild, sala)):
+            # Ninguém ficou sabendo: a sala volta para o pool e o squad volta para a fila
+            if sala and not sala.members: await salas.devolver(sala)
+            if tentativa >= FILA_TENTATIVAS:
+                print(f"❌ [FILA] Squad de {mapa} descartado depois de {tentativa} tentativas: {[m.id for m in membros]}")
+                return
+            await asyncio.sleep(FILA_REPOR_ESPERA)
+            for membro in membros:
+                agendar_squads(guild, canal, mapa, tamanho, matchmaking.entrar(membro.id, mapa, tamanho), tentativa + 1)
+            painel_fila.agendar(canal)
+            return
+    painel_fila.formados.appendleft(f"{mapa.upper()}: " + ", ".join(m.mention for m in membros))
+    painel_fila.agendar(canal)
+
+@tasks.loop(minutes=1)
+async def expirar_fila():
+    if matchmaking.expirar():
+        canal = bot.get_channel(ID_CANAL_RAID)
+        if canal: painel_fila.agendar(canal)
+
 # --- COMANDOS ---
 @bot.command()
 async def ajuda(ctx):
@@ -411,7 +2664,7 @@ async def ajuda(ctx):
             "🌟 `/rep @membro` - Dá +1 de reputação positiva.\n"
             "💢 `/neg @membro` - Dá -1 de reputação negativa.\n"
             "👤 `/perfil @membro` - Consulta a ficha e o status do raider.\n"
-            "🏆 `/top` - Exibe os 10 raiders mais confiáveis para trocas.\n\n"
+            "🏆 `/top [página]` - Exibe os raiders mais confiáveis para trocas.\n\n"
         ),
         inline=False
     )
@@ -421,16 +2674,14 @@ async def ajuda(ctx):
         name="📡 COMUNICAÇÃO DE RAID",
         value=(
             "🚨 `/raid [mapa] 1` - Abre chamada para **DUO**.\n"
-            "🚨 `/raid [mapa] 2` - Abre chamada para **TRIO**.\n\n"
+            "🚨 `/raid [mapa] 2` - Abre chamada para **TRIO**.\n"
+            "🎯 `/fila [mapa] [duo/trio]` - Entra na fila e o squad se forma sozinho (`/sair_fila` para sair).\n\n"
         ),
         inline=False
     )
 
     # --- CATEGORIA: STAFF (SÓ APARECE SE FOR MOD/ADM) ---
-    is_mod = any(role.name.lower() == "mods" for role in ctx.author.roles)
-    is_admin = ctx.author.guild_permissions.administrator
-
-    if is_mod or is_admin:
+    if autorizacao.eh_staff(ctx.author):
         embed.add_field(
             name="🛠️ PROTOCOLOS DE COMANDO (STAFF)",
             value=(
@@ -438,6 +2689,10 @@ async def ajuda(ctx):
                 "🧹 `/limpar [n]` - Faxina rápida no canal.\n"
                 "🚨 `/denunciar @membro [tipo] [motivo]` - Blacklist global.\n"
                 "📜 `/setrep @membro [pontos]` - Alterar reputação de algum raider.\n"
+                "🔄 `/resync_cargos [reiniciar]` - Recalcula os cargos de nível de todos.\n"
+                "🎫 `/tickets_abertos [horas] [@staff]` - Tickets abertos e quem os atende.\n"
+                "🕵️ `/antifraude_agora` - Procura anéis de +rep e contas fantasmas.\n"
+                "💾 `/backup [csv/jsonl/colunar]` - Exporta o banco (`/restore` para importar).\n"
                 "⚙️ `/status` - Saúde do banco de dados e do bot.\n\n"
             ),
             inline=False
@@ -465,82 +2720,115 @@ async def raid(ctx, mapa: str = None, vagas: int = None):
     if vagas < 1 or vagas > 2:
         return await ctx.send("❌ Escolha 1 ou 2 vagas extras.")
     total = vagas + 1
-    embed = discord.Embed(title=f"🚨Chamada p/ Raid: {'DUO' if total==2 else 'TRIO'}", color=0x2ecc71)
-    embed.add_field(name="📍 Mapa/Objetivo", value=mapa.upper(), inline=True)
-    embed.add_field(name=f"Membros (1/{total})", value=f"👤 {ctx.author.mention}", inline=False)
-    await ctx.send(embed=embed, view=RaidView(ctx.author, mapa, total))
+    msg = await ctx.send(embed=Raid(0, ctx.channel.id, ctx.author.id, mapa, total, [ctx.author.id]).embed(), view=raids.desenho(False))
+    try: await raids.criar(msg, ctx.author.id, mapa, total)
+    except Exception as e: print(f"❌ Erro ao gravar raid: {e}")
 
 @bot.command()
-async def top(ctx):
-    conn = get_db_connection()
-    if not conn: return await ctx.send("❌ Erro no banco de dados.")
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, rep FROM usuarios ORDER BY rep DESC LIMIT 10')
-    usuarios = cursor.fetchall()
-    conn.close()
-    if not usuarios: return await ctx.send("⚠️ O ranking ainda está vazio.")
-    descricao = ""
-    for i, (uid, pontos) in enumerate(usuarios, 1):
-        user = bot.get_user(uid)
-        nome = user.name if user else f"Usuário Antigo ({uid})"
-        prefixo = "🥇 " if i == 1 else "🥈 " if i == 2 else "🥉 " if i == 3 else f"**{i}.** "
-        descricao += f"{prefixo}{nome} — `{pontos} pts` \n"
-    embed = discord.Embed(title="🏆 Top 10 - Maiores Reputações", description=descricao, color=0xf1c40f, timestamp=datetime.now())
-    embed.set_footer(text="ARC Raiders Brasil | Ranking de Confiança")
+async def fila(ctx, mapa: str = None, modo: str = "duo"):
+    if mapa is None or modo.lower() not in MODOS_FILA:
+        return await ctx.send("❌ Uso: `/fila [mapa/objetivo] [duo/trio]`", delete_after=10)
+    if ctx.channel.id != ID_CANAL_RAID:
+        return await ctx.send(f"❌ Use em <#{ID_CANAL_RAID}>.", delete_after=5)
+    mapa, tamanho = mapa.strip().lower()[:40], MODOS_FILA[modo.lower()]
+    agendar_squads(ctx.guild, ctx.channel, mapa, tamanho, matchmaking.entrar(ctx.author.id, mapa, tamanho))
+    try: await ctx.message.add_reaction("✅")
+    except discord.HTTPException: pass
+    painel_fila.agendar(ctx.channel)
+
+@bot.command()
+async def sair_fila(ctx):
+    if not matchmaking.sair(ctx.author.id):
+        return await ctx.send("❌ Você não está em nenhuma fila.", delete_after=5)
+    try: await ctx.message.add_reaction("👋")
+    except discord.HTTPException: pass
+    painel_fila.agendar(ctx.channel)
+
+@bot.command()
+async def top(ctx, pagina: int = 1):
+    if not ranking.pronto:
+        try: await carregar_ranking()
+        except Exception: return await ctx.send("❌ Erro no banco de dados.")
+    if not ranking.ordem: return await ctx.send("⚠️ O ranking ainda está vazio.")
+    total_paginas = ranking.total_paginas()
+    if pagina < 1 or pagina > total_paginas:
+        return await ctx.send(f"❌ Página inválida. O ranking tem `{total_paginas}` página(s).", delete_after=10)
+
+    embed = ranking.embeds.get(pagina)
+    if embed is None:
+        linhas = []
+        await cache_nomes.resolver(ctx.guild, [uid for _, uid, _ in ranking.pagina(pagina)])
+        for i, uid, pontos in ranking.pagina(pagina):
+            nome = cache_nomes.nome(uid) or f"Usuário Antigo ({uid})"
+            prefixo = "🥇 " if i == 1 else "🥈 " if i == 2 else "🥉 " if i == 3 else f"**{i}.** "
+            linhas.append(f"{prefixo}{nome} — `{pontos} pts` ")
+        titulo = "🏆 Top 10 - Maiores Reputações" if pagina == 1 else f"🏆 Ranking de Reputações - Página {pagina}"
+        embed = discord.Embed(title=titulo, description="\n".join(linhas), color=0xf1c40f, timestamp=datetime.now())
+        embed.set_footer(text=f"ARC Raiders Brasil | Ranking de Confiança | Página {pagina}/{total_paginas}")
+        ranking.embeds[pagina] = embed
     await ctx.send(embed=embed)
 
+async def consumir_limite(ctx, membro, tipo):
+    """Staff não tem limite. Devolve (pode seguir, id do uso para desfazer)."""
+    if autorizacao.eh_staff(ctx.author): return True, None
+    uso, espera, motivo = await limites_rep.consumir(ctx.author.id, membro.id, tipo)
+    if uso is None:
+        await ctx.send(f"⏳ {motivo} Aguarde {formatar_espera(espera)}.", delete_after=10)
+        return False, None
+    return True, uso
+
+async def desfazer_limite(ctx, uso):
+    if uso is None: return
+    try: await limites_rep.devolver(ctx.author.id, uso)
+    except Exception as e: print(f"❌ Erro ao desfazer cooldown: {e}")
+
 @bot.command()
-@commands.cooldown(1, 7200, commands.BucketType.user)
-@ignora_cooldown_staff()
 async def rep(ctx, membro: discord.Member):
     if membro.id == ctx.author.id:
-        ctx.command.reset_cooldown(ctx)
         return await ctx.send("❌ Você não pode dar reputação para si mesmo.")
     
     if membro.bot:
-        ctx.command.reset_cooldown(ctx)
         return await ctx.send("❌ Bots não possuem reputação.")
 
+    pode, uso = await consumir_limite(ctx, membro, "rep")
+    if not pode: return
+
     try:
-        nova = alterar_rep(membro.id, 1)
+        nova = await alterar_rep(membro.id, 1, ctx=ctx)
         if nova is not None:
             await ctx.send(f"🌟 {ctx.author.mention} deu +1 rep para {membro.mention}!")
             await enviar_log(ctx, f"🌟 **Reputação Positiva**\nPara: {membro.mention}\nTotal: `{nova}`", 0x2ecc71)
-            await verificar_cargos_nivel(ctx, membro, nova)
+            await verificar_cargos_nivel(membro, nova)
         else:
-            ctx.command.reset_cooldown(ctx)
+            await desfazer_limite(ctx, uso)
             await ctx.send("❌ Erro ao salvar no banco de dados. Verifique a conexão.")
     except Exception as e:
         print(f"Erro no comando !rep: {e}")
-        ctx.command.reset_cooldown(ctx)
+        await desfazer_limite(ctx, uso)
         await ctx.send("❌ Ocorreu um erro interno ao processar a reputação.")
 
 @bot.command()
-@commands.cooldown(1, 7200, commands.BucketType.user)
-@ignora_cooldown_staff()
 async def neg(ctx, membro: discord.Member):
     if membro.id == ctx.author.id or membro.bot:
-        ctx.command.reset_cooldown(ctx)
         return await ctx.send("❌ Comando inválido.")
-    nova = alterar_rep(membro.id, -1)
+    pode, uso = await consumir_limite(ctx, membro, "neg")
+    if not pode: return
+    nova = await alterar_rep(membro.id, -1, ctx=ctx)
+    if nova is None:
+        await desfazer_limite(ctx, uso)
+        return await ctx.send("❌ Erro ao salvar no banco de dados. Verifique a conexão.")
     await ctx.send(f"💢 {ctx.author.mention} deu -1 rep para {membro.mention}!")
     await enviar_log(ctx, f"💢 **Reputação Negativa**\nPara: {membro.mention}\nTotal: `{nova}`", 0xe74c3c)
-    await verificar_cargos_nivel(ctx, membro, nova)
+    await verificar_cargos_nivel(membro, nova)
 
 @bot.command()
 async def perfil(ctx, membro: discord.Member = None):
     membro = membro or ctx.author
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT rep FROM usuarios WHERE id = %s', (membro.id,))
-    res_rep = cursor.fetchone()
-    pontos = res_rep[0] if res_rep else 0
-    
+
+    pontos, positivos, negativos = await livro_rep.ficha(membro.id)
+
     # Busca o motivo e o TIPO do banimento
-    cursor.execute('SELECT motivo, tipo FROM blacklist WHERE user_id = %s', (membro.id,))
-    res_black = cursor.fetchone()
-    conn.close()
+    res_black = await blacklist_cache.buscar(membro.id)
 
     if res_black:
         motivo, tipo = res_black
@@ -552,15 +2840,12 @@ async def perfil(ctx, membro: discord.Member = None):
         embed.add_field(name="Status", value="BANIDO DA COMUNIDADE", inline=True)
     else:
         # Lógica normal de trocador (mantém seu código atual aqui)
-        status = "Neutro"
-        if pontos >= 100: status = "Trocador Oficial 💎"
-        elif pontos >= 50: status = "Trocador Confiável ✅"
-        elif pontos >= 10: status = "Trocador Iniciante ✅"
-        elif pontos <= -10: status = "Trocador Perigoso ❌"
+        status = status_para_pontos(pontos)
         
         embed = discord.Embed(title=f"Perfil de {membro.name}", color=0x2ecc71)
         embed.add_field(name="Pontos de Reputação", value=f"`{pontos}`", inline=True)
         embed.add_field(name="Status", value=status, inline=True)
+        embed.add_field(name="Avaliações", value=f"👍 `{positivos}` | 👎 `{negativos}`", inline=True)
 
     embed.set_thumbnail(url=membro.display_avatar.url)
     await ctx.send(embed=embed)
@@ -568,17 +2853,19 @@ async def perfil(ctx, membro: discord.Member = None):
 @bot.command()
 @eh_staff()
 async def setrep(ctx, membro: discord.Member, valor: int):
-    nova = alterar_rep(membro.id, valor, definir=True)
+    nova = await alterar_rep(membro.id, valor, definir=True, ctx=ctx)
+    if nova is None: return await ctx.send("❌ Erro no banco de dados.")
     await ctx.send(f"✅ Rep de {membro.mention} definida para `{valor}`.")
-    await verificar_cargos_nivel(ctx, membro, nova)
+    await verificar_cargos_nivel(membro, nova)
 
 @bot.command()
 @eh_staff()
 async def resetar(ctx, membro: discord.Member):
-    nova = alterar_rep(membro.id, 0, definir=True)
+    nova = await alterar_rep(membro.id, 0, definir=True, ctx=ctx)
+    if nova is None: return await ctx.send("❌ Erro no banco de dados.")
     await ctx.send(f"♻️ A reputação de {membro.mention} foi resetada para 0.")
     await enviar_log(ctx, f"♻️ **Reset de Reputação**\nAlvo: {membro.mention}", 0x95a5a6)
-    await verificar_cargos_nivel(ctx, membro, nova)
+    await verificar_cargos_nivel(membro, nova)
 
 @bot.command(aliases=['clear', 'purge'])
 @eh_staff()
@@ -613,16 +2900,8 @@ async def limpar(ctx, quantidade: int = None):
 @bot.command()
 @eh_staff()
 async def status(ctx):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # Conta usuários e blacklist
-    cursor.execute('SELECT COUNT(*) FROM usuarios')
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM blacklist')
-    total_black = cursor.fetchone()[0]
-    conn.close()
+    total_users, total_black = await db.buscar_um('SELECT (SELECT COUNT(*) FROM usuarios), (SELECT COUNT(*) FROM blacklist)')
     
     membros_totais = ctx.guild.member_count
     
@@ -630,10 +2909,40 @@ async def status(ctx):
     embed.add_field(name="👥 Membros no Servidor", value=f"`{membros_totais}`", inline=True)
     embed.add_field(name="🗄️ Registos no DB", value=f"`{total_users}`", inline=True)
     embed.add_field(name="🚫 Raiders na Blacklist", value=f"`{total_black}`", inline=True)
+    monitores = " | ".join(f"{f.nome}: `{int(f.intervalo // 60)} min`" for f in agendador.fontes.values())
+    embed.add_field(name="📡 Intervalo dos Monitores", value=monitores, inline=False)
+    embed.add_field(name="🧠 Cache da Blacklist", value=f"Acertos: `{blacklist_cache.acertos}` | Falhas: `{blacklist_cache.falhas}` | Falsos positivos: `{blacklist_cache.falsos_positivos}`", inline=False)
     embed.set_footer(text=f"Latência: {round(bot.latency * 1000)}ms")
     
     await ctx.send(embed=embed)
 
+@bot.command()
+@eh_staff()
+async def tickets_abertos(ctx, horas: typing.Optional[int] = 0, membro: discord.Member = None):
+    horas = horas or 0   # "/tickets_abertos @staff": a menção pula o "horas" e vai para o membro
+    if membro:
+        lista = sorted(tickets.por_staff(membro.id), key=lambda item: item[1]["aberto_em"])
+        titulo = f"🎫 Tickets com {membro.name}"
+    else:
+        lista = tickets.mais_antigos_que(horas)
+        titulo = f"🎫 Tickets abertos há mais de {horas}h" if horas else "🎫 Tickets abertos"
+    if horas and membro:
+        limite = datetime.now() - timedelta(hours=horas)
+        lista = [item for item in lista if item[1]["aberto_em"] <= limite]
+    if not lista:
+        return await ctx.send("✅ Nenhum ticket encontrado.")
+
+    agora = datetime.now()
+    linhas = []
+    for uid, t in lista[:25]:
+        idade = int((agora - t["aberto_em"]).total_seconds() // 3600)
+        staff = f"<@{t['staff_id']}>" if t["staff_id"] else "*sem staff*"
+        linhas.append(f"<#{t['canal_id']}> — <@{uid}> | {staff} | `{idade}h`")
+    if len(lista) > 25: linhas.append(f"... e mais `{len(lista) - 25}`.")
+    embed = discord.Embed(title=titulo, description="\n".join(linhas), color=0x3498db)
+    embed.set_footer(text=f"Total: {len(lista)} | Uso: /tickets_abertos [horas] [@staff]")
+    await ctx.send(embed=embed)
+
 @bot.command(aliases=['warn'])
 @eh_staff()
 async def avisar(ctx, membro: discord.Member, *, motivo: str = "Não especificado"):
@@ -727,17 +3036,15 @@ async def denunciar(ctx, membro: discord.Member, tipo: str, *, motivo: str):
     if tipo not in ['scam', 'hack', 'outros']:
         return await ctx.send("❌ Tipo inválido! Use: `scam`, `hack` ou `outros`.\nEx: `/denunciar @membro hack Usou aimbot na extração`")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
+        await db.executar('''
             INSERT INTO blacklist (user_id, motivo, staff_id, tipo) 
             VALUES (%s, %s, %s, %s) 
             ON CONFLICT (user_id) DO UPDATE SET motivo = EXCLUDED.motivo, tipo = EXCLUDED.tipo
         ''', (membro.id, motivo, ctx.author.id, tipo))
+        blacklist_cache.adicionar(membro.id, motivo, tipo)
         
-        conn.commit()
-        alterar_rep(membro.id, -999, definir=True)
+        await alterar_rep(membro.id, -999, definir=True, ctx=ctx, tipo="denuncia")
 
         # Embed customizada dependendo do crime
         cor = 0xff0000 if tipo == 'hack' else 0xe67e22
@@ -754,43 +3061,89 @@ async def denunciar(ctx, membro: discord.Member, tipo: str, *, motivo: str):
         
     except Exception as e: 
         await ctx.send(f"❌ Erro ao processar denúncia: {e}")
-    finally: 
-        conn.close()
 
 @bot.command()
 @eh_staff()
 async def perdoar(ctx, membro: discord.Member):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM blacklist WHERE user_id = %s', (membro.id,))
-    conn.commit()
-    conn.close()
+    await db.executar('DELETE FROM blacklist WHERE user_id = %s', (membro.id,))
+    blacklist_cache.remover(membro.id)
     await ctx.send(f"✅ {membro.mention} foi removido da lista negra.")
     await enviar_log(ctx, f"🛡️ **PERDÃO**\nAlvo: {membro.mention} removido da blacklist.", 0x2ecc71)
 
 @bot.command()
 @eh_staff()
-async def backup(ctx):
+async def resync_cargos(ctx, opcao: str = None):
+    inicio = 0
+    if opcao != "reiniciar":
+        checkpoint = await ler_checkpoint("resync_cargos")
+        if checkpoint and checkpoint[0] == ctx.guild.id: inicio = checkpoint[1]
+    if not iniciar_resync(ctx.guild, ctx.channel, inicio):
+        return await ctx.send("⏳ Já existe uma ressincronização de cargos em andamento.", delete_after=10)
+    await enviar_log(ctx, f"🔄 **Ressincronização de Cargos** iniciada em {ctx.channel.mention}", 0x3498db)
+
+@bot.command()
+@eh_staff()
+async def antifraude_agora(ctx):
+    msg = await ctx.send("🕵️ Analisando o grafo de reputação...")
+    try:
+        novos, alertas = await antifraude.rodar()
+        await alertar_suspeitos(alertas)
+        await msg.edit(content=f"✅ Análise concluída: `{novos}` eventos novos, `{len(alertas)}` alerta(s) enviados para <#{ID_CANAL_STAFF}>.")
+    except Exception as e: await msg.edit(content=f"❌ Erro: {e}")
+
+@bot.command()
+@eh_staff()
+async def backup(ctx, formato: str = "csv"):
+    formato = formato.lower()
+    if formato not in FORMATOS_BACKUP:
+        return await ctx.send(f"❌ Formatos disponíveis: {', '.join(f'`{f}`' for f in FORMATOS_BACKUP)}.")
     await ctx.send("📂 Gerando backup...")
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, rep FROM usuarios ORDER BY rep DESC')
-        usuarios = cursor.fetchall()
-        cursor.execute('SELECT user_id, motivo FROM blacklist')
-        blacklisted = cursor.fetchall()
-        conn.close()
-        buffer = io.StringIO()
-        buffer.write(f"--- BACKUP ARC RAIDERS BRASIL ({datetime.now().strftime('%d/%m/%Y %H:%M')}) ---\n\n🌟 RANKING:\n")
-        for uid, pts in usuarios:
-            u = bot.get_user(uid)
-            buffer.write(f"ID: {uid} | Nome: {u.name if u else 'Desconhecido'} | Pts: {pts}\n")
-        buffer.write("\n🚫 BLACKLIST:\n")
-        for uid, mot in blacklisted:
-            u = bot.get_user(uid)
-            buffer.write(f"ID: {uid} | Nome: {u.name if u else 'Desconhecido'} | Motivo: {mot}\n")
-        buffer.seek(0)
-        await ctx.send(content="✅ Backup concluído:", file=discord.File(fp=buffer, filename=f"backup_{datetime.now().strftime('%d_%m_%Y')}.txt"))
+        await livro_rep.descarregar()
+        await cache_nomes.gravar()
+        carimbo = datetime.now().strftime('%Y%m%d_%H%M')
+        for tabela in TABELAS_BACKUP:
+            with tempfile.TemporaryFile() as arquivo:
+                total = await db.transacao(exportar_tabela, tabela, formato, arquivo)
+                await enviar_em_partes(ctx.channel, arquivo, f"{tabela}_{carimbo}.{formato}.gz", f"✅ `{tabela}`: `{total}` registros")
+    except Exception as e: await ctx.send(f"❌ Erro: {e}")
+
+@bot.command()
+@eh_staff()
+async def restore(ctx, modo: str = None):
+    """Restaura os arquivos do /backup anexados na mensagem (partes .001, .002... são juntadas)."""
+    if not ctx.author.guild_permissions.administrator:
+        return await ctx.send("❌ Apenas administradores podem restaurar backups.", delete_after=5)
+    substituir = (modo or "").lower() == "substituir"
+    arquivos = {}
+    for att in ctx.message.attachments:
+        achado = RE_ARQUIVO_BACKUP.match(att.filename)
+        if not achado:
+            return await ctx.send(f"❌ Arquivo não reconhecido: `{att.filename}`.")
+        tabela, formato, parte = achado.groups()
+        arquivos.setdefault((tabela, formato), []).append((int(parte or 0), att.url))
+    if not arquivos:
+        return await ctx.send("❌ Uso: `/restore [substituir]` com os arquivos do `/backup` anexados.")
+
+    await ctx.send("♻️ Restaurando backup...")
+    try:
+        resumo = []
+        # Livro pausado: o pendente é gravado antes, nenhuma rep entra no meio e o cache é descartado no fim
+        async with livro_rep.pausado():
+            # Na ordem do backup, para os eventos chegarem depois dos usuários
+            for tabela, formato in sorted(arquivos, key=lambda chave: TABELAS_BACKUP.index(chave[0])):
+                with tempfile.TemporaryFile() as arquivo:
+                    for _, url in sorted(arquivos[(tabela, formato)]):
+                        await http.baixar(url, arquivo)
+                    arquivo.seek(0)
+                    inseridos = await db.transacao(restaurar_tabela, tabela, formato, arquivo, substituir)
+                resumo.append(f"`{tabela}`: `{inseridos}` registros")
+        # Os outros caches em memória vieram do banco antigo
+        await antifraude.reiniciar()
+        await carregar_ranking()
+        await blacklist_cache.recarregar()
+        await ctx.send("✅ Backup restaurado:\n" + "\n".join(resumo))
+        await enviar_log(ctx, f"♻️ **Backup Restaurado**{' (substituindo)' if substituir else ''}\n" + "\n".join(resumo), 0xe67e22)
     except Exception as e: await ctx.send(f"❌ Erro: {e}")
 
 @bot.command()
@@ -855,34 +3208,53 @@ async def postar_suporte(ctx):
 # --- EVENTOS ---
 @bot.event
 async def on_ready():
-    setup_db()
+    await setup_db()
     # Registrando todas as views persistentes
     bot.add_view(FinalizarTrocaView()) 
     bot.add_view(RegrasView())
     bot.add_view(AbrirTicketView())
     bot.add_view(TicketControlView())
-    if not monitorar_noticias_pro.is_running():
-        monitorar_noticias_pro.start()
+    bot.add_view(RaidView())
+    if not rodar_agendador.is_running():
+        rodar_agendador.start()
     if not manter_banco_vivo.is_running():
         manter_banco_vivo.start()
+    if not descarregar_reputacao.is_running():
+        descarregar_reputacao.start()
+    if not conferir_reputacao.is_running():
+        conferir_reputacao.start()
+    if not reconciliar_blacklist.is_running():
+        reconciliar_blacklist.start()
+    if not expirar_itens_vistos.is_running():
+        expirar_itens_vistos.start()
+    if not gravar_nomes.is_running():
+        gravar_nomes.start()
+    for guild in bot.guilds:
+        try: await salas.preparar(guild)
+        except Exception as e: print(f"❌ Erro ao preparar salas de voz: {e}")
+    if not ajustar_salas.is_running():
+        ajustar_salas.start()
+    if not varrer_salas.is_running():
+        varrer_salas.start()
+    if not expirar_cooldowns.is_running():
+        expirar_cooldowns.start()
+    if not rodar_antifraude.is_running():
+        rodar_antifraude.start()
+    if not expirar_raids.is_running():
+        expirar_raids.start()
+    if not expirar_fila.is_running():
+        expirar_fila.start()
+    for guild in bot.guilds:
+        autorizacao.atualizar(guild)
+        await cache_nomes.lembrar_todos(list(guild.members))
+    try: await retomar_resync()
+    except Exception as e: print(f"❌ Erro ao retomar ressincronização: {e}")
+    for guild in bot.guilds:
+        try: await tickets.reconciliar(guild)
+        except Exception as e: print(f"❌ Erro ao reconciliar tickets: {e}")
     print(f"✅ {bot.user.name} Bot Online!")
     await bot.change_presence(activity=discord.Game(name="/ajuda | ARC Raiders Brasil"))
 
-    global ULTIMO_VIDEO_ID, ULTIMO_SHORTS_ID, ULTIMA_NOTICIA_URL
-    
-    # Captura o ID atual silenciosamente para não postar o que já existe ao ligar
-    async with aiohttp.ClientSession() as session:
-        # Exemplo para o YouTube
-        async with session.get(CANAL_YOUTUBE_URL) as r:
-            ids = re.findall(r'"videoId":"([^"]+)"', await r.text())
-            if ids: ULTIMO_VIDEO_ID = ids[0]
-            
-        # Exemplo para Notícias
-        async with session.get(URL_NEWS) as r:
-            soup = BeautifulSoup(await r.text(), 'html.parser')
-            links = [a for a in soup.find_all('a', href=True) if '/news/' in a['href']]
-            if links: ULTIMA_NOTICIA_URL = f"{URL_BASE}{links[0]['href']}"
-
 
 class RegrasView(discord.ui.View):
     def __init__(self):
@@ -908,6 +3280,131 @@ class RegrasView(discord.ui.View):
         except discord.Forbidden:
             await interaction.response.send_message("❌ Eu não tenho permissão para dar cargos. Verifique minha posição na lista de cargos!", ephemeral=True)
 
+# --- TRANSCRIÇÃO DE TICKETS ---
+FORMATOS_TRANSCRICAO = ("txt", "html", "jsonl")
+ARQUIVO_MEMORIA_MAX = 1024 * 1024   # acima disso os arquivos temporários vão para o disco
+ANEXOS_PARALELOS = 4
+
+async def enviar_em_partes(canal, arquivo, nome, conteudo):
+    """Envia um arquivo (já posicionado no início) respeitando o limite de upload do servidor;
+    se não couber, manda em partes numeradas (junte com `cat nome.* > nome`)."""
+    limite = (canal.guild.filesize_limit if getattr(canal, "guild", None) else 10 * 1024 * 1024) - 64 * 1024
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(0)
+    if tamanho <= limite:
+        await canal.send(content=conteudo, file=discord.File(fp=arquivo, filename=nome))
+        return 1
+    total = -(-tamanho // limite)
+    for i in range(1, total + 1):
+        # Só uma parte por vez em memória
+        parte = io.BytesIO(arquivo.read(limite))
+        texto = f"{conteudo}\n📦 Arquivo grande: parte {i}/{total} (junte com `cat {nome}.* > {nome}`)" if i == 1 else f"📦 `{nome}` parte {i}/{total}"
+        await canal.send(content=texto, file=discord.File(fp=parte, filename=f"{nome}.{i:03d}"))
+    return total
+
+class TranscricaoTicket:
+    """Gera a transcrição em streaming: as linhas vão em blocos para um SpooledTemporaryFile
+    (memória até 1 MB, depois disco), sem limite de mensagens, em txt, html ou jsonl."""
+
+    def __init__(self, canal, fechado_por, motivo, formato="txt"):
+        self.canal = canal
+        self.fechado_por = fechado_por
+        self.motivo = motivo
+        self.formato = formato
+        self.arquivo = tempfile.SpooledTemporaryFile(max_size=ARQUIVO_MEMORIA_MAX, mode="w+b")
+        self.anexos = []            # (nome dentro do zip, url)
+        self.total_mensagens = 0
+        self._bloco = []
+        self._bloco_tamanho = 0
+
+    def _escrever(self, texto):
+        self._bloco.append(texto)
+        self._bloco_tamanho += len(texto)
+        if self._bloco_tamanho >= 64 * 1024: self._descarregar()
+
+    def _descarregar(self):
+        if self._bloco:
+            self.arquivo.write("".join(self._bloco).encode("utf-8"))
+            self._bloco, self._bloco_tamanho = [], 0
+
+    def _cabecalho(self):
+        data = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        if self.formato == "jsonl":
+            self._escrever(json.dumps({"ticket": self.canal.name, "data": data, "fechado_por": self.fechado_por.name, "motivo": self.motivo}, ensure_ascii=False) + "\n")
+        elif self.formato == "html":
+            self._escrever(
+                f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Ticket {escapar_html(self.canal.name)}</title>"
+                "<style>body{font-family:sans-serif;background:#313338;color:#dbdee1}.msg{margin:4px 0}.data{color:#949ba4}</style></head><body>"
+                f"<h2>Transcrição de ticket: {escapar_html(self.canal.name)}</h2>"
+                f"<p>Data: {data}<br>Fechado por: {escapar_html(self.fechado_por.name)}<br>MOTIVO: {escapar_html(self.motivo)}</p><hr>\n")
+        else:
+            self._escrever(
+                f"--- TRANSCRIÇÃO DE TICKET: {self.canal.name} ---\n"
+                f"Data: {data}\n"
+                f"Fechado por: {self.fechado_por.name}\n"
+                f"MOTIVO: {self.motivo}\n"
+                "------------------------------------------\n\n")
+
+    def _mensagem(self, msg):
+        self.total_mensagens += 1
+        anexos = []
+        for att in msg.attachments:
+            nome_zip = f"{msg.id}_{att.filename}"
+            self.anexos.append((nome_zip, att.url))
+            anexos.append((nome_zip, att.url))
+        if self.formato == "jsonl":
+            self._escrever(json.dumps({"id": msg.id, "autor": msg.author.name, "autor_id": msg.author.id, "data": msg.created_at.isoformat(),
+                                       "conteudo": msg.content, "anexos": [{"arquivo": n, "url": u} for n, u in anexos]}, ensure_ascii=False) + "\n")
+        elif self.formato == "html":
+            links = "".join(f"<br>&gt; Anexo: <a href='{escapar_html(u)}'>{escapar_html(n)}</a>" for n, u in anexos)
+            self._escrever(f"<div class='msg'><span class='data'>[{msg.created_at.strftime('%d/%m/%Y %H:%M')}]</span> "
+                           f"<b>{escapar_html(msg.author.name)}</b>: {escapar_html(msg.content)}{links}</div>\n")
+        else:
+            self._escrever(f"[{msg.created_at.strftime('%d/%m/%Y %H:%M')}] {msg.author.name}: {msg.content}\n")
+            for nome_zip, url in anexos:
+                self._escrever(f"   > Anexo: {nome_zip} ({url})\n")
+
+    async def gerar(self):
+        self._cabecalho()
+        async for msg in self.canal.history(limit=None, oldest_first=True):
+            self._mensagem(msg)
+        if self.formato == "html": self._escrever("</body></html>\n")
+        self._descarregar()
+        self.arquivo.seek(0)
+        return self.arquivo
+
+def _copiar_para_zip(zf, nome, origem):
+    with zf.open(nome, "w") as destino:
+        shutil.copyfileobj(origem, destino, 1024 * 1024)
+
+async def arquivar_anexos(anexos, paralelo=ANEXOS_PARALELOS):
+    """Baixa os anexos em paralelo (com limite) para um zip comprimido; os links do Discord expiram.
+    Devolve (arquivo zip, nomes que falharam)."""
+    arquivo_zip = tempfile.SpooledTemporaryFile(max_size=ARQUIVO_MEMORIA_MAX, mode="w+b")
+    zf = zipfile.ZipFile(arquivo_zip, "w", compression=zipfile.ZIP_DEFLATED)
+    vagas = asyncio.Semaphore(paralelo)
+    trava_zip = asyncio.Lock()   # o zip só aceita um arquivo sendo escrito por vez
+    falhas = []
+
+    async def baixar(nome, url):
+        async with vagas:
+            with tempfile.TemporaryFile() as temporario:
+                try:
+                    await http.baixar(url, temporario)
+                    temporario.seek(0)
+                    async with trava_zip:
+                        # Compressão roda numa thread para não travar o loop
+                        await asyncio.to_thread(_copiar_para_zip, zf, nome, temporario)
+                except Exception as e:
+                    print(f"⚠️ Anexo {nome} não arquivado: {e}")
+                    falhas.append(nome)
+
+    await asyncio.gather(*(baixar(nome, url) for nome, url in anexos))
+    await asyncio.to_thread(zf.close)
+    arquivo_zip.seek(0)
+    return arquivo_zip, falhas
+
 class MotivoFecharTicketModal(discord.ui.Modal, title='Encerrar Atendimento'):
     motivo = discord.ui.TextInput(
         label='Motivo do fechamento',
@@ -917,36 +3414,45 @@ class MotivoFecharTicketModal(discord.ui.Modal, title='Encerrar Atendimento'):
         min_length=5,
         max_length=300
     )
+    formato = discord.ui.TextInput(
+        label='Formato da transcrição (txt, html ou jsonl)',
+        placeholder='txt',
+        required=False,
+        max_length=5
+    )
 
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.send_message("🔒 Gerando transcrição e encerrando ticket...", ephemeral=True)
         
         canal_ticket = interaction.channel
+        formato = (self.formato.value or "txt").strip().lower()
+        if formato not in FORMATOS_TRANSCRICAO: formato = "txt"
         
         # --- GERAR TRANSCRIÇÃO ---
-        log_content = f"--- TRANSCRIÇÃO DE TICKET: {canal_ticket.name} ---\n"
-        log_content += f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n"
-        log_content += f"Fechado por: {interaction.user.name}\n"
-        log_content += f"MOTIVO: {self.motivo.value}\n" # <--- O motivo do Pop-up entra aqui
-        log_content += "------------------------------------------\n\n"
-
-        async for msg in canal_ticket.history(limit=500, oldest_first=True):
-            timestamp = msg.created_at.strftime('%d/%m/%Y %H:%M')
-            log_content += f"[{timestamp}] {msg.author.name}: {msg.content}\n"
-            if msg.attachments:
-                for att in msg.attachments:
-                    log_content += f"   > Anexo: {att.url}\n"
-
-        buffer = io.BytesIO(log_content.encode('utf-8'))
-        arquivo_log = discord.File(fp=buffer, filename=f"log_{canal_ticket.name}.txt")
-
-        # Log no canal de monitoramento
-        await enviar_log(interaction, f"🔒 **Ticket Encerrado**\nCanal: `{canal_ticket.name}`\nExecutor: {interaction.user.mention}\n**Motivo:** {self.motivo.value}", 0xe74c3c)
-        
-        canal_logs = bot.get_channel(LOG_CHANNEL_ID)
-        if canal_logs:
-            await canal_logs.send(content=f"📄 Transcrição completa do ticket `{canal_ticket.name}`:", file=arquivo_log)
+        transcricao = TranscricaoTicket(canal_ticket, interaction.user, self.motivo.value, formato)
+        arquivo_zip = None
+        try:
+            await transcricao.gerar()
+            if transcricao.anexos:
+                arquivo_zip, falhas = await arquivar_anexos(transcricao.anexos)
 
+            # Log no canal de monitoramento
+            await enviar_log(interaction, f"🔒 **Ticket Encerrado**\nCanal: `{canal_ticket.name}`\nExecutor: {interaction.user.mention}\n**Motivo:** {self.motivo.value}", 0xe74c3c)
+            
+            canal_logs = bot.get_channel(LOG_CHANNEL_ID)
+            if canal_logs:
+                await enviar_em_partes(canal_logs, transcricao.arquivo, f"log_{canal_ticket.name}.{formato}",
+                                       f"📄 Transcrição completa do ticket `{canal_ticket.name}` ({transcricao.total_mensagens} mensagens):")
+                if arquivo_zip:
+                    aviso = f"\n⚠️ {len(falhas)} anexo(s) não puderam ser baixados." if falhas else ""
+                    await enviar_em_partes(canal_logs, arquivo_zip, f"anexos_{canal_ticket.name}.zip",
+                                           f"🗂️ Anexos do ticket `{canal_ticket.name}` ({len(transcricao.anexos) - len(falhas)} arquivos).{aviso}")
+        finally:
+            transcricao.arquivo.close()
+            if arquivo_zip: arquivo_zip.close()
+
+        try: await tickets.fechar(canal_ticket.id)
+        except Exception as e: print(f"❌ Erro ao remover ticket do registro: {e}")
         await asyncio.sleep(3)
         await canal_ticket.delete()
 
@@ -957,9 +3463,7 @@ class TicketControlView(discord.ui.View):
     @discord.ui.button(label="Fechar Ticket", style=discord.ButtonStyle.secondary, emoji="🔒", custom_id="btn_fechar_ticket")
     async def fechar_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
         # Verifica se é Staff
-        is_staff = any(role.name.lower() == "mods" for role in interaction.user.roles) or interaction.user.guild_permissions.administrator
-        
-        if not is_staff:
+        if not autorizacao.eh_staff(interaction.user):
             return await interaction.response.send_message("❌ Apenas a staff pode encerrar tickets.", ephemeral=True)
             
         # Chama o Pop-up (Modal)
@@ -978,10 +3482,24 @@ class AbrirTicketView(discord.ui.View):
         # Nome do canal do ticket
         nome_canal = f"ticket-{user.name}".lower()
         
+        # Um clique de cada vez por usuário: o segundo não espera, só avisa
+        trava = tickets.trava(user.id)
+        if trava.locked():
+            return await interaction.response.send_message("⏳ Seu ticket já está sendo criado, aguarde.", ephemeral=True)
+        try:
+            async with trava:
+                await self._abrir_ticket(interaction, guild, user, nome_canal, id_categoria_ticket)
+        finally:
+            tickets.liberar(user.id)
+
+    async def _abrir_ticket(self, interaction, guild, user, nome_canal, id_categoria_ticket):
         # Verifica se já existe um ticket aberto para esse user
-        existente = discord.utils.get(guild.channels, name=nome_canal)
-        if existente:
-            return await interaction.response.send_message(f"❌ Você já possui um ticket aberto em {existente.mention}!", ephemeral=True)
+        aberto = tickets.do_usuario(user.id)
+        if aberto:
+            existente = guild.get_channel(aberto["canal_id"])
+            if existente:
+                return await interaction.response.send_message(f"❌ Você já possui um ticket aberto em {existente.mention}!", ephemeral=True)
+            await tickets.fechar(aberto["canal_id"])   # canal apagado por fora
 
         # Configura as permissões do canal
         overwrites = {
@@ -991,7 +3509,7 @@ class AbrirTicketView(discord.ui.View):
         }
         
         # Adiciona permissão para o cargo "mods"
-        cargo_mod = discord.utils.get(guild.roles, name="mods")
+        cargo_mod = autorizacao.cargo_mods_de(guild)
         if cargo_mod:
             overwrites[cargo_mod] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
 
@@ -1006,6 +3524,8 @@ class AbrirTicketView(discord.ui.View):
                 category=categoria,
                 reason=f"Ticket aberto por {user.name}"
             )
+            try: await tickets.abrir(user.id, ticket_channel.id, guild.id)
+            except Exception as e: print(f"❌ Erro ao registrar ticket: {e}")
             
             await interaction.response.send_message(f"✅ Ticket criado! Siga para {ticket_channel.mention}", ephemeral=True)
             
@@ -1031,6 +3551,269 @@ class AbrirTicketView(discord.ui.View):
         except Exception as e:
             await interaction.response.send_message(f"❌ Erro ao criar ticket: {e}", ephemeral=True)
 
+# --- SALAS DE VOZ (DUO / TRIO) ---
+SALAS_POOL_MIN = int(os.getenv('SALAS_POOL_MIN', 1))
+SALAS_POOL_MAX = int(os.getenv('SALAS_POOL_MAX', 6))
+SALAS_JANELA = int(os.getenv('SALAS_JANELA', 600))     # segundos de histórico para medir a demanda
+SALAS_FATOR = float(os.getenv('SALAS_FATOR', 0.5))     # salas prontas por sala pedida na janela
+SALAS_CARENCIA = int(os.getenv('SALAS_CARENCIA', 60))  # segundos que uma sala fica vazia antes de ser recolhida
+
+class TipoSala:
+    def __init__(self, nome, hub_id, categoria_id, limite, prefixo):
+        self.nome = nome
+        self.hub_id = hub_id
+        self.categoria_id = categoria_id
+        self.limite = limite
+        self.prefixo = prefixo
+        self.padrao = re.compile(re.escape(prefixo) + r" (\d+)$")
+        self.livres = deque()      # salas escondidas prontas para uso
+        self.ocupadas = {}         # canal_id -> id de quem pediu a sala
+        self.numeros = {}          # canal_id -> número no nome ("DUO 03")
+        self.pedidos = deque()     # time.monotonic() de cada sala pedida
+        self.trava = asyncio.Lock()
+
+class GerenciadorSalas:
+    """Pool de salas já criadas e escondidas em cada categoria: entrar no hub só libera uma
+    (um edit de permissões + move, sem create) e a sala vazia volta para o pool em vez de ser
+    apagada. O pool cresce e encolhe conforme quantas salas foram pedidas na última janela.
+    Os nomes são fixos ("DUO 03") porque o Discord só deixa renomear um canal 2x a cada 10 min;
+    sala que o dono renomeou é apagada ao esvaziar, em vez de renomeada de volta.
+    Sala que esvazia só é recolhida depois da carência, numa varredura periódica: quem cair e
+    voltar logo encontra a mesma sala."""
+
+    def __init__(self, minimo=1, maximo=6, janela=600, fator=0.5, carencia=60):
+        self.minimo = minimo
+        self.carencia = carencia
+        self.vazias = {}      # canal_id -> time.monotonic() de quando ficou vazia
+        self.maximo = maximo
+        self.janela = janela
+        self.fator = fator
+        self.tipos = {}
+        self.por_hub = {}
+        self.por_canal = {}   # canal_id -> TipoSala, de todas as salas do pool (livres ou ocupadas)
+        self.devolvendo = set()   # canal_id com devolver() em andamento
+        self.reposicoes = {}      # nome do tipo -> asyncio.Task do repor() em andamento
+
+    def registrar(self, nome, hub_id, categoria_id, limite, prefixo):
+        tipo = TipoSala(nome, hub_id, categoria_id, limite, prefixo)
+        self.tipos[nome] = tipo
+        self.por_hub[hub_id] = tipo
+
+    def alvo(self, tipo):
+        agora = time.monotonic()
+        while tipo.pedidos and agora - tipo.pedidos[0] > self.janela: tipo.pedidos.popleft()
+        return max(self.minimo, min(self.maximo, math.ceil(len(tipo.pedidos) * self.fator)))
+
+    @staticmethod
+    def _escondida(guild):
+        return {guild.default_role: discord.PermissionOverwrite(view_channel=False, connect=False),
+                guild.me: discord.PermissionOverwrite(view_channel=True, manage_channels=True, connect=True, move_members=True)}
+
+    @staticmethod
+    def _liberada(guild, dono):
+        return {guild.default_role: discord.PermissionOverwrite(connect=True),
+                dono: discord.PermissionOverwrite(manage_channels=True, move_members=True, manage_permissions=True, connect=True),
+                guild.me: discord.PermissionOverwrite(manage_channels=True, connect=True, move_members=True)}
+
+    def _adotar(self, tipo, canal, numero):
+        tipo.numeros[canal.id] = numero
+        self.por_canal[canal.id] = tipo
+
+    def marcar_vazia(self, canal):
+        self.vazias.setdefault(canal.id, time.monotonic())
+
+    def ocupada(self, canal_id):
+        self.vazias.pop(canal_id, None)
+
+    def esquecer(self, canal_id):
+        self.vazias.pop(canal_id, None)
+        tipo = self.por_canal.pop(canal_id, None)
+        if tipo is None: return
+        tipo.numeros.pop(canal_id, None)
+        tipo.ocupadas.pop(canal_id, None)
+        if canal_id in tipo.livres: tipo.livres.remove(canal_id)
+
+    async def _criar(self, guild, tipo, overwrites):
+        categoria = guild.get_channel(tipo.categoria_id)
+        if not categoria:
+            print(f"❌ ERRO: Categoria não encontrada! Verifique o ID.")
+            return None
+        usados = set(tipo.numeros.values())
+        numero = next(n for n in range(1, len(usados) + 2) if n not in usados)
+        tipo.numeros[-numero] = numero   # reserva o número enquanto o create não volta
+        try:
+            canal = await guild.create_voice_channel(name=f"{tipo.prefixo} {numero:02d}", category=categoria,
+                                                     user_limit=tipo.limite, overwrites=overwrites)
+        finally:
+            tipo.numeros.pop(-numero, None)
+        self._adotar(tipo, canal, numero)
+        return canal
+
+    async def repor(self, guild, tipo):
+        """Completa o pool até o alvo, fora do caminho de quem entrou no hub."""
+        async with tipo.trava:
+            while len(tipo.livres) < self.alvo(tipo):
+                try: canal = await self._criar(guild, tipo, self._escondida(guild))
+                except Exception as e:
+                    print(f"❌ Erro ao repor salas {tipo.nome}: {e}")
+                    return
+                if canal is None: return
+                tipo.livres.append(canal.id)
+
+    def agendar_repor(self, guild, tipo):
+        tarefa = self.reposicoes.get(tipo.nome)
+        if tarefa is None or tarefa.done():
+            self.reposicoes[tipo.nome] = asyncio.create_task(self.repor(guild, tipo))
+
+    async def encolher(self, guild, tipo):
+        async with tipo.trava:
+            while len(tipo.livres) > self.alvo(tipo):
+                canal = guild.get_channel(tipo.livres.pop())
+                if canal is None: continue
+                self.esquecer(canal.id)
+                try: await canal.delete()
+                except Exception as e: print(f"⚠️ Erro ao apagar sala ociosa: {e}")
+
+    async def _liberar(self, guild, tipo, dono, overwrites):
+        """Pega uma sala do pool (ou cria, se está vazio) e abre para quem vai usar."""
+        tipo.pedidos.append(time.monotonic())
+        canal = None
+        while tipo.livres and canal is None:
+            canal = guild.get_channel(tipo.livres.popleft())   # None se alguém apagou por fora
+        if canal:
+            await canal.edit(overwrites=overwrites, user_limit=tipo.limite)
+        else:
+            # Pool vazio: cria na hora, como antes
+            canal = await self._criar(guild, tipo, overwrites)
+            if canal is None: return None
+        tipo.ocupadas[canal.id] = dono.id
+        return canal
+
+    async def reservar_squad(self, guild, nome_tipo, membros, espera=300):
+        """Sala para um squad formado pela fila: todos com acesso, o primeiro como dono.
+        Quem já está em voz é movido; os outros têm `espera` segundos para entrar."""
+        tipo = self.tipos[nome_tipo]
+        overwrites = self._liberada(guild, membros[0])
+        for membro in membros[1:]:
+            overwrites[membro] = discord.PermissionOverwrite(view_channel=True, connect=True)
+        canal = None
+        try:
+            canal = await self._liberar(guild, tipo, membros[0], overwrites)
+            if canal is None: return None
+            for membro in membros:
+                if membro.voice and membro.voice.channel:
+                    try: await membro.move_to(canal)
+                    except Exception as e: print(f"⚠️ Não consegui mover {membro.name}: {e}")
+            # Sala ainda vazia: a carência só começa a contar depois da espera
+            if not canal.members: self.vazias[canal.id] = time.monotonic() + espera
+            return canal
+        except Exception as e:
+            print(f"❌ Erro ao liberar sala para o squad: {e}")
+            if canal and not canal.members: await self.devolver(canal)
+            return None
+        finally:
+            self.agendar_repor(guild, tipo)
+
+    async def reservar(self, membro, hub):
+        tipo = self.por_hub.get(hub.id)
+        if tipo is None: return
+        guild = membro.guild
+        canal = None
+        try:
+            canal = await self._liberar(guild, tipo, membro, self._liberada(guild, membro))
+            if canal is None: return
+            await membro.move_to(canal)
+            print(f"➡️ {membro.name} movido para {canal.name}.")
+        except Exception as e:
+            print(f"❌ ERRO AO CRIAR/MOVER: {e}")
+            if canal and not canal.members: await self.devolver(canal)
+        finally:
+            self.agendar_repor(guild, tipo)
+
+    async def devolver(self, canal):
+        """Sala vazia: esconde e volta para o pool (ou apaga, se o pool já está cheio)."""
+        self.vazias.pop(canal.id, None)
+        tipo = self.por_canal.get(canal.id)
+        # Marca antes do primeiro await: duas devoluções da mesma sala não a põem duas vezes no pool
+        if tipo is None or canal.id in tipo.livres or canal.id in self.devolvendo: return
+        self.devolvendo.add(canal.id)
+        tipo.ocupadas.pop(canal.id, None)
+        try:
+            nome = f"{tipo.prefixo} {tipo.numeros[canal.id]:02d}"
+            # Sala renomeada pelo dono é apagada em vez de renomeada de volta (2 renomeações a cada 10 min)
+            if len(tipo.livres) >= self.alvo(tipo) or canal.name != nome:
+                self.esquecer(canal.id)
+                await canal.delete()
+                print(f"🧹 Canal {canal.name} deletado (vazio).")
+                return
+            await canal.edit(overwrites=self._escondida(canal.guild), user_limit=tipo.limite)
+            if canal.id in self.por_canal: tipo.livres.append(canal.id)
+            print(f"♻️ Canal {nome} devolvido ao pool.")
+        except discord.NotFound:
+            self.esquecer(canal.id)
+        except Exception as e:
+            print(f"⚠️ Erro ao reciclar {canal.name}: {e}")
+        finally:
+            self.devolvendo.discard(canal.id)
+
+    async def varrer(self):
+        """Recolhe de uma vez as salas que passaram da carência ainda vazias."""
+        agora = time.monotonic()
+        vencidas = [canal_id for canal_id, desde in self.vazias.items() if agora - desde >= self.carencia]
+        for canal_id in vencidas:
+            self.vazias.pop(canal_id, None)
+            canal = bot.get_channel(canal_id)
+            if canal is None:
+                self.esquecer(canal_id)
+                continue
+            if canal.members: continue
+            if canal_id in self.por_canal:
+                await self.devolver(canal)
+                continue
+            # Sala de fora do pool (antiga ou órfã): apaga
+            try:
+                await canal.delete()
+                print(f"🧹 Canal {canal.name} deletado (vazio).")
+            except discord.NotFound: pass
+            except Exception as e: print(f"⚠️ Erro ao apagar {canal.name}: {e}")
+        return len(vencidas)
+
+    async def preparar(self, guild):
+        """Na inicialização: readota as salas do pool que já existem, agenda a limpeza das
+        órfãs vazias (criadas antes de um restart) e completa o pool."""
+        hubs = set(self.por_hub)
+        for tipo in self.tipos.values():
+            categoria = guild.get_channel(tipo.categoria_id)
+            if not categoria: continue
+            for canal in categoria.voice_channels:
+                if canal.id in hubs or canal.id in self.por_canal: continue
+                achado = tipo.padrao.match(canal.name)
+                if achado:
+                    self._adotar(tipo, canal, int(achado.group(1)))
+                    if canal.members: tipo.ocupadas[canal.id] = None
+                    else: await self.devolver(canal)
+                elif not canal.members:
+                    self.marcar_vazia(canal)
+            await self.repor(guild, tipo)
+
+salas = GerenciadorSalas(minimo=SALAS_POOL_MIN, maximo=SALAS_POOL_MAX, janela=SALAS_JANELA, fator=SALAS_FATOR, carencia=SALAS_CARENCIA)
+salas.registrar("duo", ID_HUB_DUO, ID_CAT_DUO, 2, "🛰️ DUO")
+salas.registrar("trio", ID_HUB_TRIO, ID_CAT_TRIO, 3, "🛸 TRIO")
+
+@tasks.loop(seconds=15)
+async def varrer_salas():
+    try: await salas.varrer()
+    except Exception as e: print(f"❌ Erro na limpeza das salas: {e}")
+
+@tasks.loop(minutes=5)
+async def ajustar_salas():
+    for guild in bot.guilds:
+        for tipo in salas.tipos.values():
+            try:
+                await salas.encolher(guild, tipo)
+                await salas.repor(guild, tipo)
+            except Exception as e: print(f"❌ Erro ao ajustar salas {tipo.nome}: {e}")
+
 @bot.event
 async def on_voice_state_update(member, before, after):
     # Log de teste para ver se o bot está ouvindo o evento
@@ -1039,57 +3822,83 @@ async def on_voice_state_update(member, before, after):
 
     # --- 1. DETECÇÃO DE ENTRADA NOS HUBS ---
     if after.channel and after.channel.id in [ID_HUB_DUO, ID_HUB_TRIO]:
-        print(f"🛰️ GATILHO ATIVADO: Criando canal para {member.name}...")
-        guild = member.guild
-        
-        if after.channel.id == ID_HUB_DUO:
-            categoria_alvo = guild.get_channel(ID_CAT_DUO)
-            limite, prefixo = 2, "🛰️ DUO"
-        else:
-            categoria_alvo = guild.get_channel(ID_CAT_TRIO)
-            limite, prefixo = 3, "🛸 TRIO"
+        print(f"🛰️ GATILHO ATIVADO: Liberando sala para {member.name}...")
+        await salas.reservar(member, after.channel)
 
-        if not categoria_alvo:
-            print(f"❌ ERRO: Categoria não encontrada! Verifique o ID.")
-            return
-
-        overwrites = {
-            guild.default_role: discord.PermissionOverwrite(connect=True),
-            member: discord.PermissionOverwrite(manage_channels=True, move_members=True, manage_permissions=True, connect=True),
-            guild.me: discord.PermissionOverwrite(manage_channels=True, connect=True, move_members=True)
-        }
-
-        try:
-            novo_canal = await guild.create_voice_channel(
-                name=f"{prefixo}: {member.name}",
-                category=categoria_alvo,
-                user_limit=limite,
-                overwrites=overwrites
-            )
-            print(f"✅ Canal {novo_canal.name} criado com sucesso!")
-            await member.move_to(novo_canal)
-            print(f"➡️ {member.name} movido para o novo canal.")
-        except Exception as e:
-            print(f"❌ ERRO AO CRIAR/MOVER: {e}")
-
-    # --- 2. LIMPEZA ---
+    # --- 2. LIMPEZA (com carência, feita pela varredura) ---
+    if after.channel:
+        salas.ocupada(after.channel.id)
     if before.channel and before.channel.category_id in [ID_CAT_DUO, ID_CAT_TRIO]:
         if before.channel.id not in [ID_HUB_DUO, ID_HUB_TRIO]:
             if len(before.channel.members) == 0:
-                try:
-                    await before.channel.delete()
-                    print(f"🧹 Canal {before.channel.name} deletado (vazio).")
-                except: pass
+                salas.marcar_vazia(before.channel)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    salas.esquecer(channel.id)
+    try: await tickets.fechar(channel.id)
+    except Exception as e: print(f"❌ Erro ao remover ticket do registro: {e}")
+
+@bot.listen('on_message')
+async def atribuir_ticket(message):
+    # A primeira resposta da staff dentro do ticket define o responsável
+    if message.author.bot or not message.guild: return
+    dono = tickets.do_canal(message.channel.id)
+    if dono is None or dono == message.author.id: return
+    ticket = tickets.do_usuario(dono)
+    if ticket["staff_id"] is not None: return
+    if not autorizacao.eh_staff(message.author): return
+    try: await tickets.atribuir(message.channel.id, message.author.id)
+    except Exception as e: print(f"❌ Erro ao atribuir ticket: {e}")
+
+@bot.event
+async def on_member_join(member):
+    cache_nomes.lembrar(member)
+    autorizacao.atualizar_membro(member)
+
+@bot.event
+async def on_member_update(before, after):
+    cache_nomes.lembrar(after)
+    if before.roles != after.roles:
+        autorizacao.atualizar_membro(after)
+
+@bot.event
+async def on_member_remove(member):
+    autorizacao.remover_membro(member)
+
+@bot.event
+async def on_guild_update(before, after):
+    if before.owner_id != after.owner_id:
+        autorizacao.atualizar(after)
+
+@bot.event
+async def on_user_update(before, after):
+    # Quem está no servidor fica com o apelido de lá, não com o nome global
+    membro = next(filter(None, (guild.get_member(after.id) for guild in bot.guilds)), None)
+    cache_nomes.lembrar(membro or after)
+
+@bot.event
+async def on_guild_role_create(role):
+    motor_cargos.atualizar(role.guild)
+    autorizacao.atualizar(role.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    motor_cargos.atualizar(role.guild)
+    autorizacao.atualizar(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.name != after.name:
+        motor_cargos.atualizar(after.guild)
+    if before.name != after.name or before.permissions.administrator != after.permissions.administrator:
+        autorizacao.atualizar(after.guild)
 
 @bot.event
 async def on_thread_create(thread):
     await asyncio.sleep(2)
     # 1. Checa Blacklist
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT motivo FROM blacklist WHERE user_id = %s', (thread.owner_id,))
-    blacklisted = cursor.fetchone()
-    conn.close()
+    blacklisted = await blacklist_cache.buscar(thread.owner_id)
 
     if blacklisted:
         await thread.send(f"🚨 **ALERTA DE SEGURANÇA** 🚨\n{thread.owner.mention}, você está na **LISTA NEGRA** e não pode trocar.\n**Motivo:** {blacklisted[0]}")
@@ -1119,23 +3928,16 @@ async def on_thread_create(thread):
 
 @bot.event
 async def on_command_error(ctx, error):
-    if isinstance(error, commands.CommandOnCooldown):
-        await ctx.send(f"⏳ Aguarde {int(error.retry_after // 60)} minutos.", delete_after=10)
-    elif isinstance(error, commands.CheckFailure):
+    if isinstance(error, commands.CheckFailure):
         if not ctx.author.guild_permissions.administrator:
              await ctx.send(f"❌ {ctx.author.mention}, este comando não pode ser usado aqui.", delete_after=7)
 
 @tasks.loop(minutes=10)
 async def manter_banco_vivo():
     try:
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            conn.close()
-            print("ping no banco: OK")
+        vivas = await db.manter_vivo()
+        print(f"ping no banco: OK ({vivas} conexões no pool)")
     except Exception as e: print(f"Erro ping banco: {e}")
 
 if __name__ == "__main__":
-    setup_db()
     bot.run(TOKEN)
\ No newline at end of file
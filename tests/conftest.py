@@ -0,0 +1,36 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def bot_rep():
+    """Importa o bot sem conectar em nada: só precisa das dependências instaladas e de um token qualquer."""
+    for modulo in ("discord", "psycopg2", "aiohttp", "bs4", "deep_translator", "dotenv"):
+        pytest.importorskip(modulo)
+    os.environ.setdefault("DISCORD_TOKEN", "teste")
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import bot_rep as modulo
+    return modulo
+
+
+@pytest.fixture
+def postgres(bot_rep):
+    """Fábrica de conexões para um schema novo no Postgres de TEST_DATABASE_URL, apagado no fim.
+    Os testes que dependem de SQL do Postgres (CTE, ON CONFLICT, COPY...) são pulados sem ele."""
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL não configurada")
+    import psycopg2
+    schema = f"teste_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(url)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE SCHEMA {schema}")
+    yield lambda: psycopg2.connect(url, options=f"-c search_path={schema}")
+    admin.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+    admin.close()
@@ -0,0 +1,66 @@
+import asyncio
+
+
+def test_intervalo_espaca_sem_novidade_e_volta_ao_minimo(bot_rep, monkeypatch):
+    monkeypatch.setattr(bot_rep.random, "uniform", lambda a, b: 1.0)
+    respostas = [False, False, False, True, False]
+
+    async def verificar():
+        return respostas.pop(0)
+
+    async def cenario():
+        agendador = bot_rep.AgendadorFontes(fator=2)
+        agendador.registrar("site", verificar, minimo=10, maximo=30)
+        fonte = agendador.fontes["site"]
+        intervalos = []
+        for _ in range(5):
+            fonte.proxima = 0.0
+            agendador.tique()
+            await fonte.tarefa
+            intervalos.append(fonte.intervalo)
+        return intervalos
+
+    assert asyncio.run(cenario()) == [20, 30, 30, 10, 20]
+
+
+def test_erro_conta_como_sem_novidade(bot_rep):
+    async def verificar():
+        raise RuntimeError("site fora do ar")
+
+    async def cenario():
+        agendador = bot_rep.AgendadorFontes(fator=2)
+        agendador.registrar("site", verificar, minimo=10, maximo=60)
+        agendador.tique()
+        await agendador.fontes["site"].tarefa
+        return agendador.fontes["site"].intervalo
+
+    assert asyncio.run(cenario()) == 20
+
+
+def test_nao_sobrepoe_varreduras_e_respeita_o_limite_paralelo(bot_rep):
+    liberar = None
+    rodando = {"agora": 0, "max": 0, "chamadas": 0}
+
+    async def verificar():
+        rodando["chamadas"] += 1
+        rodando["agora"] += 1
+        rodando["max"] = max(rodando["max"], rodando["agora"])
+        await liberar.wait()
+        rodando["agora"] -= 1
+        return False
+
+    async def cenario():
+        nonlocal liberar
+        liberar = asyncio.Event()
+        agendador = bot_rep.AgendadorFontes(paralelo=2)
+        for nome in ("a", "b", "c"):
+            agendador.registrar(nome, verificar)
+        agendador.tique()
+        await asyncio.sleep(0.01)
+        agendador.tique()   # nenhuma terminou: não cria tarefas novas
+        await asyncio.sleep(0.01)
+        liberar.set()
+        await asyncio.gather(*(f.tarefa for f in agendador.fontes.values()))
+
+    asyncio.run(cenario())
+    assert rodando["chamadas"] == 3 and rodando["max"] == 2
@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+
+EPOCA_DISCORD = 1420070400
+INICIO = 1714564800   # 2024-05-01 12:00 UTC
+
+
+def conta(criada_em, n):
+    """Id de usuário (snowflake) de uma conta criada em `criada_em` (segundos epoch)."""
+    return ((criada_em - EPOCA_DISCORD) * 1000 << 22) | n
+
+
+def gerar_eventos(semente, total=3000):
+    """+rep de uma comunidade grande e espalhada, com anéis, doadores recém-criados e rajadas
+    plantados no meio, em ordem de id e de horário."""
+    rnd = random.Random(semente)
+    antigas = [conta(INICIO - 400 * 86400 + i * 3600, i) for i in range(300)]
+    relogio, eventos = INICIO, []
+
+    def dar(giver, receiver):
+        eventos.append((len(eventos) + 1, giver, receiver, float(relogio)))
+
+    while len(eventos) < total:
+        relogio += rnd.randint(1, 120)
+        sorteio = rnd.random()
+        if sorteio < 0.02:
+            # Anel: 3 a 5 contas trocando +rep entre si
+            anel = rnd.sample(antigas, rnd.randint(3, 5))
+            for giver in anel:
+                for receiver in anel:
+                    if giver != receiver and rnd.random() < 0.9: dar(giver, receiver)
+        elif sorteio < 0.03:
+            # Doadores com conta criada na véspera
+            receiver = rnd.choice(antigas)
+            for i in range(rnd.randint(3, 5)):
+                dar(conta(relogio - 86400, 1000 + len(eventos) + i), receiver)
+        elif sorteio < 0.04:
+            # Rajada: muita +rep para uma conta em poucos minutos
+            receiver = rnd.choice(antigas)
+            for _ in range(rnd.randint(5, 8)):
+                relogio += rnd.randint(1, 30)
+                dar(rnd.choice(antigas), receiver)
+        else:
+            giver, receiver = rnd.sample(antigas, 2)
+            dar(giver, receiver)
+    return eventos
+
+
+def do_zero(bot_rep, eventos, agora):
+    grafo = bot_rep.GrafoRep()
+    grafo.adicionar(eventos)
+    return grafo.analisar(agora)
+
+
+@pytest.mark.parametrize("semente", range(6))
+def test_incremental_igual_a_montar_do_zero(bot_rep, semente):
+    eventos = gerar_eventos(semente)
+    rnd = random.Random(semente)
+    grafo = bot_rep.GrafoRep()
+    i, regras = 0, set()
+    while i < len(eventos):
+        lote = eventos[i:i + rnd.randint(1, 200)]
+        i += len(lote)
+        grafo.adicionar(lote)
+        # A análise roda antes do próximo evento ser criado
+        agora = eventos[i][3] if i < len(eventos) else lote[-1][3] + 1800
+        incremental = grafo.analisar(agora)
+        assert incremental == do_zero(bot_rep, eventos[:i], agora), f"divergiu depois do evento {i}"
+        regras.update(regra for marcadas in incremental.values() for regra in marcadas)
+    # Os três tipos de suspeita apareceram em algum momento
+    assert regras == {"anel", "contas_novas", "rajada"}
+
+
+def test_rajada_expira_e_anel_desfeito_pela_comunidade(bot_rep):
+    a, b, c = (conta(INICIO - 400 * 86400, n) for n in range(3))
+    grafo = bot_rep.GrafoRep()
+    grafo.adicionar([(1, a, b, INICIO), (2, b, a, INICIO + 1), (3, b, c, INICIO + 2), (4, c, a, INICIO + 3)])
+    assert {regras.get("anel", "")[:9] for regras in grafo.analisar(INICIO + 3).values()} == {"anel de 3"}
+
+    # O anel passa a receber bastante de fora: continua um componente, mas não é mais suspeito
+    de_fora = [conta(INICIO - 400 * 86400, 10 + n) for n in range(6)]
+    eventos = [(5 + i, giver, receiver, INICIO + 10 + i) for i, (giver, receiver) in
+               enumerate((g, r) for g in de_fora for r in (a, b, c))]
+    grafo.adicionar(eventos)
+    agora = eventos[-1][3]
+    resultado = grafo.analisar(agora)
+    assert all("anel" not in regras for regras in resultado.values())
+    assert {uid for uid, regras in resultado.items() if "rajada" in regras} == {a, b, c}
+
+    # Uma hora depois a rajada já não vale
+    agora += bot_rep.RAJADA_JANELA + 1
+    assert grafo.analisar(agora) == {} == do_zero(bot_rep, [(1, a, b, INICIO), (2, b, a, INICIO + 1), (3, b, c, INICIO + 2),
+                                                          (4, c, a, INICIO + 3)] + eventos, agora)
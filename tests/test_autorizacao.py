@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+
+class CargoFalso:
+    def __init__(self, id, name, admin=False):
+        self.id = id
+        self.name = name
+        self.permissions = SimpleNamespace(administrator=admin)
+        self.members = []
+
+
+class ServidorFalso:
+    def __init__(self):
+        self.id = 1
+        self.owner_id = 99
+        self.roles = [CargoFalso(10, "@everyone"), CargoFalso(11, "Mods"), CargoFalso(12, "Admin", admin=True), CargoFalso(13, "VIP")]
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def membro(self, id, *role_ids):
+        membro = SimpleNamespace(id=id, guild=self, roles=[self.get_role(r) for r in role_ids])
+        for role in membro.roles: role.members.append(membro)
+        return membro
+
+
+def test_staff_pelos_cargos_e_dono(bot_rep):
+    guild = ServidorFalso()
+    mod, admin, vip = guild.membro(1, 11), guild.membro(2, 12), guild.membro(3, 13)
+    dono = guild.membro(99)
+    autorizacao = bot_rep.Autorizacao()
+    assert [autorizacao.eh_staff(m) for m in (mod, admin, vip, dono)] == [True, True, False, True]
+    assert autorizacao.cargo_mods_de(guild).name == "Mods"
+    # Fora de um servidor (DM) ninguém é staff
+    assert autorizacao.eh_staff(SimpleNamespace(id=1)) is False
+
+
+def test_eventos_de_membro_mantem_o_indice(bot_rep):
+    guild = ServidorFalso()
+    vip = guild.membro(3, 13)
+    autorizacao = bot_rep.Autorizacao()
+    autorizacao.atualizar(guild)
+    assert not autorizacao.eh_staff(vip)
+
+    vip.roles.append(guild.get_role(11))   # ganhou o cargo de mods
+    autorizacao.atualizar_membro(vip)
+    assert autorizacao.eh_staff(vip)
+    vip.roles.pop()
+    autorizacao.atualizar_membro(vip)
+    assert not autorizacao.eh_staff(vip)
+
+    mod = guild.membro(1, 11)
+    autorizacao.atualizar(guild)
+    autorizacao.remover_membro(mod)   # saiu do servidor
+    assert not autorizacao.eh_staff(mod)
+
+
+def test_canais_liberados_para_usuarios_comuns(bot_rep):
+    guild = ServidorFalso()
+    vip, mod = guild.membro(3, 13), guild.membro(1, 11)
+    autorizacao = bot_rep.Autorizacao()
+    post_do_forum = SimpleNamespace(id=555, parent_id=bot_rep.ID_FORUM_TROCA)
+    geral = SimpleNamespace(id=556)
+    assert autorizacao.pode_usar_canal(post_do_forum, vip)
+    assert autorizacao.pode_usar_canal(SimpleNamespace(id=bot_rep.ID_CANAL_RAID), vip)
+    assert not autorizacao.pode_usar_canal(geral, vip)
+    assert autorizacao.pode_usar_canal(geral, mod)
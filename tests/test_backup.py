@@ -0,0 +1,105 @@
+import asyncio
+import gzip
+import io
+import tempfile
+
+import pytest
+
+
+def test_fluxo_csv_entrega_o_mesmo_texto_em_qualquer_tamanho_de_leitura(bot_rep):
+    linhas = [(i, f"texto, com vírgula {i}", None, "aspas \"duplas\"") for i in range(500)]
+    inteiro = bot_rep.FluxoCSV(linhas).read()
+    fluxo = bot_rep.FluxoCSV(linhas)
+    pedacos = []
+    while True:
+        pedaco = fluxo.read(37)
+        if not pedaco: break
+        pedacos.append(pedaco)
+    assert "".join(pedacos) == inteiro
+    assert inteiro.splitlines()[1] == '1,"texto, com vírgula 1",\\N,"aspas ""duplas"""'
+
+
+def test_nomes_dos_arquivos_do_backup(bot_rep):
+    assert bot_rep.RE_ARQUIVO_BACKUP.match("rep_eventos_20240501_1230.csv.gz").groups() == ("rep_eventos", "csv", None)
+    assert bot_rep.RE_ARQUIVO_BACKUP.match("usuarios_20240501_1230.colunar.gz.002").groups() == ("usuarios", "colunar", "002")
+    assert bot_rep.RE_ARQUIVO_BACKUP.match("senhas_20240501_1230.csv.gz") is None
+
+
+def criar_tabela(cursor):
+    cursor.execute('''CREATE TABLE rep_eventos (id BIGSERIAL PRIMARY KEY, chave TEXT UNIQUE NOT NULL, giver_id BIGINT,
+        receiver_id BIGINT NOT NULL, delta INTEGER NOT NULL, canal_id BIGINT, thread_id BIGINT,
+        tipo TEXT NOT NULL DEFAULT 'rep', criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('''INSERT INTO rep_eventos (chave, giver_id, receiver_id, delta, canal_id, thread_id, tipo, criado_em)
+        SELECT 'ev' || i, CASE WHEN i % 3 = 0 THEN NULL ELSE i END, i % 7, 1, 99, NULL, 'rep',
+               TIMESTAMP '2024-05-01 12:00:00' + i * INTERVAL '1 minute'
+        FROM generate_series(1, 23) AS i''')
+
+
+@pytest.mark.parametrize("formato", ["csv", "jsonl", "colunar"])
+def test_backup_e_restore_devolvem_as_mesmas_linhas(bot_rep, postgres, monkeypatch, formato):
+    monkeypatch.setattr(bot_rep, "BACKUP_LOTE", 5)
+
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(criar_tabela)
+        consulta = "SELECT * FROM rep_eventos ORDER BY id"
+        original = await banco.buscar_todos(consulta)
+        with tempfile.TemporaryFile() as arquivo:
+            assert await banco.transacao(bot_rep.exportar_tabela, "rep_eventos", formato, arquivo) == 23
+            # Restaurar por cima não duplica nada
+            assert await banco.transacao(bot_rep.restaurar_tabela, "rep_eventos", formato, arquivo) == 0
+            arquivo.seek(0)
+            await banco.executar("DELETE FROM rep_eventos WHERE id > 20")
+            assert await banco.transacao(bot_rep.restaurar_tabela, "rep_eventos", formato, arquivo) == 3
+            arquivo.seek(0)
+            assert await banco.transacao(bot_rep.restaurar_tabela, "rep_eventos", formato, arquivo, True) == 23
+        restaurado = await banco.buscar_todos(consulta)
+        # A sequência foi ajustada: o próximo evento não colide com os restaurados
+        await banco.executar("INSERT INTO rep_eventos (chave, receiver_id, delta) VALUES ('novo', 1, 1)")
+        proximo = await banco.buscar_um("SELECT id FROM rep_eventos WHERE chave = 'novo'")
+        await banco.fechar()
+        return original, restaurado, proximo
+
+    original, restaurado, proximo = asyncio.run(cenario())
+    assert restaurado == original
+    assert proximo == (24,)
+
+
+def criar_blacklist(cursor):
+    cursor.execute('''CREATE TABLE blacklist (user_id BIGINT PRIMARY KEY, motivo TEXT, staff_id BIGINT,
+        tipo TEXT DEFAULT 'scam', data_blacklist TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute("CREATE TABLE nomes_usuarios (user_id BIGINT PRIMARY KEY, nome TEXT NOT NULL, avatar TEXT)")
+    cursor.execute("INSERT INTO blacklist (user_id, motivo, staff_id) VALUES (1, '', 9), (2, NULL, NULL), (3, 'golpe', 9)")
+
+
+def test_csv_separa_null_de_texto_vazio(bot_rep, postgres):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(criar_blacklist)
+        with tempfile.TemporaryFile() as arquivo:
+            await banco.transacao(bot_rep.exportar_tabela, "blacklist", "csv", arquivo)
+            await banco.transacao(bot_rep.restaurar_tabela, "blacklist", "csv", arquivo, True)
+        linhas = await banco.buscar_todos("SELECT user_id, motivo, staff_id FROM blacklist ORDER BY user_id")
+        await banco.fechar()
+        return linhas
+
+    assert asyncio.run(cenario()) == [(1, "", 9), (2, None, None), (3, "golpe", 9)]
+
+
+def test_cabecalho_enviado_nao_entra_cru_no_sql(bot_rep, postgres):
+    arquivo = io.BytesIO()
+    with gzip.GzipFile(fileobj=arquivo, mode="wb") as compactado:
+        compactado.write('user_id,"motivo"") FROM restauracao; DROP TABLE blacklist; --",motivo,motivo\n4,x,fraude,repetida\n'.encode("utf-8"))
+
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(criar_blacklist)
+        arquivo.seek(0)
+        inseridos = await banco.transacao(bot_rep.restaurar_tabela, "blacklist", "csv", arquivo)
+        motivo = await banco.buscar_um("SELECT motivo FROM blacklist WHERE user_id = 4")
+        with pytest.raises(ValueError):
+            await banco.transacao(bot_rep.restaurar_tabela, "nomes_usuarios", "csv", io.BytesIO())
+        await banco.fechar()
+        return inseridos, motivo
+
+    assert asyncio.run(cenario()) == (1, ("fraude",))
@@ -0,0 +1,55 @@
+import asyncio
+
+
+class BancoFalso:
+    """Devolve a tabela blacklist; com `segurar`, a leitura só termina quando o evento for liberado."""
+
+    def __init__(self, linhas, segurar=None):
+        self.linhas = linhas
+        self.segurar = segurar
+        self.leituras = 0
+
+    async def buscar_todos(self, sql, params=(), nome=None):
+        self.leituras += 1
+        if self.segurar is not None: await self.segurar.wait()
+        return list(self.linhas)
+
+
+def test_filtro_nunca_da_falso_negativo(bot_rep):
+    filtro = bot_rep.FiltroBloom(capacidade=5000, erro=0.01)
+    dentro = range(10**17, 10**17 + 5000)
+    for uid in dentro: filtro.adicionar(uid)
+    assert all(uid in filtro for uid in dentro)
+    falsos = sum(1 for uid in range(5000, 25000) if uid in filtro)
+    assert falsos / 20000 < 0.03
+
+
+def test_buscar_confirma_no_set(bot_rep):
+    cache = bot_rep.CacheBlacklist(BancoFalso([(1, "scam no fórum", "scam"), (2, "aimbot", "hack")]))
+
+    async def cenario():
+        assert await cache.buscar(1) == ("scam no fórum", "scam")
+        assert await cache.buscar(3) is None
+        cache.remover(2)   # o bit fica no filtro até a próxima releitura
+        assert await cache.buscar(2) is None
+
+    asyncio.run(cenario())
+    assert cache.banco.leituras == 1
+    assert (cache.acertos, cache.falhas, cache.falsos_positivos) == (1, 2, 1)
+
+
+def test_mudancas_durante_a_releitura_nao_se_perdem(bot_rep):
+    segurar = asyncio.Event()
+    # A leitura do banco começou antes do /denunciar 3 e do /perdoar 1
+    cache = bot_rep.CacheBlacklist(BancoFalso([(1, "scam", "scam"), (2, "hack", "hack")], segurar))
+
+    async def cenario():
+        releitura = asyncio.create_task(cache.recarregar())
+        await asyncio.sleep(0)
+        cache.adicionar(3, "novo scam", "scam")
+        cache.remover(1)
+        segurar.set()
+        assert await releitura == 2
+        return [await cache.buscar(uid) for uid in (1, 2, 3)]
+
+    assert asyncio.run(cenario()) == [None, ("hack", "hack"), ("novo scam", "scam")]
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+
+def usuario(uid, nome=None, apelido=None):
+    return SimpleNamespace(id=uid, name=f"user{uid}", global_name=nome, display_name=apelido or nome or f"user{uid}",
+                           display_avatar=SimpleNamespace(url=f"https://cdn/{uid}.png"))
+
+
+class RankingFalso:
+    def __init__(self):
+        self.invalidados = []
+        self.embeds = {1: "página 1"}
+
+    def invalidar_usuario(self, user_id):
+        self.invalidados.append(user_id)
+
+
+class ServidorFalso:
+    def __init__(self, membros):
+        self.membros = membros
+        self.consultas = []
+
+    def get_member(self, user_id):
+        # Só o dono do servidor está no cache de membros, com apelido
+        return usuario(user_id, "Ana", apelido="Ana [ADM]") if user_id == 1 else None
+
+    async def query_members(self, user_ids, limit, cache):
+        self.consultas.append(len(user_ids))
+        return [usuario(uid) for uid in user_ids if uid in self.membros]
+
+
+class BancoFora:
+    async def transacao(self, func):
+        raise RuntimeError("banco fora do ar")
+
+
+def test_resolver_busca_em_lotes_e_respeita_o_orcamento_da_api(bot_rep, monkeypatch):
+    ranking = RankingFalso()
+    monkeypatch.setattr(bot_rep, "ranking", ranking)
+    monkeypatch.setattr(bot_rep.bot, "get_user", lambda uid: usuario(uid, "Ana") if uid == 1 else None)
+    buscados = []
+
+    async def fetch_user(uid):
+        buscados.append(uid)
+        if uid % 2: raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown User")
+        return usuario(uid)
+
+    monkeypatch.setattr(bot_rep.bot, "fetch_user", fetch_user)
+    guild = ServidorFalso(membros=set(range(2, 230)))
+    cache = bot_rep.CacheNomes(None, taxa=1000, fetch_max=3)
+    ids = list(range(1, 240))
+
+    asyncio.run(cache.resolver(guild, ids + [2, 3]))
+    assert guild.consultas == [100, 100, 38]
+    assert cache.nome(1) == "Ana [ADM]" and cache.nome(229) == "user229" and cache.avatar(2) == "https://cdn/2.png"
+    assert buscados == [230, 231, 232]
+    assert cache.ausentes == {231}
+    assert len(ranking.invalidados) == 231
+
+    # Na segunda vez só vai atrás de quem ainda falta (e não de quem foi apagado)
+    guild.consultas.clear()
+    asyncio.run(cache.resolver(guild, ids))
+    assert guild.consultas == [7] and buscados[3:] == [233, 234, 235]
+
+
+def test_lembrar_so_grava_o_que_mudou_e_falha_volta_para_a_fila(bot_rep, monkeypatch):
+    monkeypatch.setattr(bot_rep, "ranking", RankingFalso())
+    cache = bot_rep.CacheNomes(BancoFora())
+    assert cache.lembrar(usuario(1, "Ana")) is True
+    assert cache.lembrar(usuario(1, "Ana")) is False
+    cache.lembrar(usuario(2))
+    try:
+        asyncio.run(cache.gravar())
+    except RuntimeError:
+        pass
+    cache.lembrar(usuario(2, "Bia"))   # mudou de novo enquanto o banco estava fora
+    assert cache.pendentes == {1: ("Ana", "https://cdn/1.png"), 2: ("Bia", "https://cdn/2.png")}
+
+
+def test_nomes_gravados_voltam_no_restart(bot_rep, postgres, monkeypatch):
+    monkeypatch.setattr(bot_rep, "ranking", RankingFalso())
+
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.executar('''CREATE TABLE nomes_usuarios (user_id BIGINT PRIMARY KEY, nome TEXT NOT NULL, avatar TEXT,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        cache = bot_rep.CacheNomes(banco)
+        cache.lembrar(usuario(1, "Ana"))
+        cache.lembrar(usuario(2))
+        assert await cache.gravar() == 2
+        cache.lembrar(usuario(2, "Bia"))
+        assert await cache.gravar() == 1
+        assert await cache.gravar() == 0
+        novo = bot_rep.CacheNomes(banco)
+        await novo.carregar()
+        await banco.fechar()
+        return novo.nomes
+
+    assert asyncio.run(cenario()) == {1: ("Ana", "https://cdn/1.png"), 2: ("Bia", "https://cdn/2.png")}
+
+
+def test_lembrar_todos_descarta_as_paginas_do_ranking_uma_vez_so(bot_rep, monkeypatch):
+    ranking = RankingFalso()
+    monkeypatch.setattr(bot_rep, "ranking", ranking)
+    monkeypatch.setattr(bot_rep, "NOMES_LOTE_ON_READY", 10)
+    cache = bot_rep.CacheNomes(None)
+    asyncio.run(cache.lembrar_todos([usuario(uid) for uid in range(35)]))
+    assert len(cache.nomes) == 35 and ranking.invalidados == [] and ranking.embeds == {}
+
+    ranking.embeds[1] = "página 1"
+    asyncio.run(cache.lembrar_todos([usuario(uid) for uid in range(35)]))
+    assert ranking.embeds == {1: "página 1"}   # nada mudou: as páginas continuam valendo
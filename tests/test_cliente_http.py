@@ -0,0 +1,138 @@
+import asyncio
+
+from aiohttp import web
+
+
+async def servidor(rotas):
+    """Sobe um aiohttp local numa porta livre. Devolve (runner, url base)."""
+    app = web.Application()
+    for caminho, handler in rotas.items():
+        app.router.add_get(caminho, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    porta = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{porta}"
+
+
+def test_repete_status_temporario_e_reusa_a_sessao(bot_rep):
+    pedidos = []
+
+    async def instavel(request):
+        pedidos.append(request.headers.get("User-Agent"))
+        if len(pedidos) < 3:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(text="ok")
+
+    async def cenario():
+        runner, base = await servidor({"/": instavel})
+        cliente = bot_rep.ClienteHTTP(tentativas=3)
+        try:
+            async with cliente.get(base + "/") as resp:
+                primeiro = (resp.status, await resp.text())
+            sessao = cliente.sessao()
+            async with cliente.get(base + "/") as resp:
+                segundo = resp.status
+            assert cliente.sessao() is sessao
+        finally:
+            await cliente.fechar()
+            await runner.cleanup()
+        return primeiro, segundo
+
+    primeiro, segundo = asyncio.run(cenario())
+    assert primeiro == (200, "ok") and segundo == 200
+    assert len(pedidos) == 4
+    assert all(ua == bot_rep.HTTP_HEADERS["User-Agent"] for ua in pedidos)
+
+
+def test_devolve_o_ultimo_erro_quando_acabam_as_tentativas(bot_rep):
+    pedidos = []
+
+    async def fora_do_ar(request):
+        pedidos.append(1)
+        return web.Response(status=502, headers={"Retry-After": "0"})
+
+    async def cenario():
+        runner, base = await servidor({"/": fora_do_ar})
+        cliente = bot_rep.ClienteHTTP(tentativas=2)
+        try:
+            async with cliente.get(base + "/") as resp:
+                return resp.status
+        finally:
+            await cliente.fechar()
+            await runner.cleanup()
+
+    assert asyncio.run(cenario()) == 502
+    assert len(pedidos) == 2
+
+
+def test_get_condicional_com_etag(bot_rep):
+    condicionais = []
+
+    async def noticias(request):
+        condicionais.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="<a href='/news/um'>um</a>", headers={"ETag": '"v1"'})
+
+    async def cenario():
+        runner, base = await servidor({"/news": noticias})
+        cliente = bot_rep.ClienteHTTP()
+        try:
+            return [await cliente.buscar_se_mudou(base + "/news", bot_rep.ExtratorLinks("/news/")) for _ in range(2)]
+        finally:
+            await cliente.fechar()
+            await runner.cleanup()
+
+    primeiro, segundo = asyncio.run(cenario())
+    assert primeiro == ["/news/um"] and segundo is None
+    assert condicionais == [None, '"v1"']
+
+
+def test_servidor_sem_validadores_compara_os_itens(bot_rep):
+    paginas = ["<p>topo 1</p><a href='/news/um'>um</a>", "<p>topo 2</p><a href='/news/um'>um</a>",
+               "<p>topo 2</p><a href='/news/dois'>dois</a>"]
+
+    async def noticias(request):
+        return web.Response(text=paginas.pop(0))
+
+    async def cenario():
+        runner, base = await servidor({"/news": noticias})
+        cliente = bot_rep.ClienteHTTP()
+        try:
+            return [await cliente.buscar_se_mudou(base + "/news", bot_rep.ExtratorLinks("/news/")) for _ in range(3)]
+        finally:
+            await cliente.fechar()
+            await runner.cleanup()
+
+    primeiro, segundo, terceiro = asyncio.run(cenario())
+    assert primeiro == ["/news/um"]
+    assert segundo is None          # só o topo mudou, os links são os mesmos
+    assert terceiro == ["/news/dois"]
+
+
+def test_para_de_ler_quando_o_extrator_termina(bot_rep):
+    enviados = []
+
+    async def pagina_grande(request):
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        await resp.write(b'<script>{"videoId":"abc"}</script>')
+        for _ in range(200):
+            enviados.append(1)
+            await resp.write(b"x" * 65536)
+            await asyncio.sleep(0.001)
+        return resp
+
+    async def cenario():
+        runner, base = await servidor({"/videos": pagina_grande})
+        cliente = bot_rep.ClienteHTTP()
+        try:
+            return await cliente.buscar_se_mudou(base + "/videos", bot_rep.ScannerRegex(bot_rep.RE_VIDEO_ID))
+        finally:
+            await cliente.fechar()
+            await runner.cleanup()
+
+    assert asyncio.run(cenario()) == ["abc"]
+    assert len(enviados) < 200
@@ -0,0 +1,23 @@
+def pedacos(texto, tamanho):
+    return [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)]
+
+
+def test_links_em_pedacos_param_no_limite(bot_rep):
+    html = "<html><a href='/sobre'>x</a>" + "".join(f"<a href=\"/news/{i}\">n{i}</a>" for i in range(10)) + "<a href='/news/0'>"
+    for tamanho in (1, 7, 4096):
+        extrator = bot_rep.ExtratorLinks("/news/", limite=3)
+        for pedaco in pedacos(html, tamanho):
+            extrator.alimentar(pedaco)
+            if extrator.terminou: break
+        assert extrator.encontrados == ["/news/0", "/news/1", "/news/2"]
+
+
+def test_regex_acha_match_cortado_entre_pedacos(bot_rep):
+    texto = "a" * 1000 + '"videoId":"primeiro"' + "b" * 500 + '"videoId":"primeiro""videoId":"segundo"' + "c" * 300
+    for tamanho in (1, 13, 1005, 100000):
+        scanner = bot_rep.ScannerRegex(bot_rep.RE_VIDEO_ID, limite=5, sobreposicao=64)
+        for pedaco in pedacos(texto, tamanho):
+            scanner.alimentar(pedaco)
+        assert scanner.encontrados == ["primeiro", "segundo"], tamanho
+        assert not scanner.terminou
+        assert len(scanner._resto) <= 64 + tamanho
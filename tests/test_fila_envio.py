@@ -0,0 +1,100 @@
+import asyncio
+
+
+class MensagemFalsa:
+    def __init__(self, canal, kwargs):
+        self.canal = canal
+        self.kwargs = kwargs
+        self.reacoes = []
+
+    async def add_reaction(self, emoji):
+        self.reacoes.append(emoji)
+
+
+class CanalFalso:
+    def __init__(self, log, nome, atraso=0.0):
+        self.log = log
+        self.nome = nome
+        self.atraso = atraso
+        self.enviando = 0
+
+    async def send(self, **kwargs):
+        self.enviando += 1
+        assert self.enviando == 1, "duas mensagens ao mesmo tempo no mesmo canal"
+        self.log.append((self.nome, "inicio", kwargs.get("content")))
+        await asyncio.sleep(self.atraso)
+        self.log.append((self.nome, "fim", kwargs.get("content")))
+        self.enviando -= 1
+        return MensagemFalsa(self, kwargs)
+
+
+def test_um_canal_em_ordem_canais_diferentes_em_paralelo(bot_rep, monkeypatch):
+    log = []
+    canais = {1: CanalFalso(log, "noticias", atraso=0.05), 2: CanalFalso(log, "midia", atraso=0.01)}
+    monkeypatch.setattr(bot_rep.bot, "get_channel", canais.get)
+
+    async def cenario():
+        fila = bot_rep.FilaEnvio()
+        futuros = [fila.enviar(1, content="n1", reacao="🔥"), fila.enviar(1, content="n2"), fila.enviar(2, content="m1")]
+        return await asyncio.gather(*futuros)
+
+    n1, n2, m1 = asyncio.run(cenario())
+    assert [c for nome, etapa, c in log if nome == "noticias" and etapa == "inicio"] == ["n1", "n2"]
+    # A mídia saiu enquanto a primeira notícia ainda estava sendo enviada
+    assert log.index(("midia", "fim", "m1")) < log.index(("noticias", "fim", "n1"))
+    assert n1.reacoes == ["🔥"] and n2.reacoes == [] and m1.kwargs == {"content": "m1"}
+
+
+def test_links_agrupados_no_minimo_de_mensagens(bot_rep, monkeypatch):
+    log = []
+    monkeypatch.setattr(bot_rep.bot, "get_channel", {2: CanalFalso(log, "midia")}.get)
+    links = [f"https://youtu.be/{i:02d}" for i in range(12)]
+
+    async def cenario():
+        fila = bot_rep.FilaEnvio(links_por_mensagem=5)
+        return await asyncio.gather(*fila.enviar_links(2, "🎬 Mídias", links))
+
+    mensagens = [m.kwargs["content"].split("\n") for m in asyncio.run(cenario())]
+    assert mensagens == [["🎬 Mídias"] + links[:5], links[5:10], links[10:]]
+
+
+def test_canal_sumido_e_worker_ocioso(bot_rep, monkeypatch):
+    log = []
+    monkeypatch.setattr(bot_rep.bot, "get_channel", {1: CanalFalso(log, "noticias")}.get)
+
+    async def cenario():
+        fila = bot_rep.FilaEnvio(ocioso=0.05)
+        assert await fila.enviar(99, content="perdida") is None
+        await fila.enviar(1, content="a")
+        await asyncio.sleep(0.2)
+        assert fila.workers == {}   # os dois workers pararam sozinhos
+        return await fila.enviar(1, content="b")
+
+    assert asyncio.run(cenario()).kwargs["content"] == "b"
+    assert [c for _, etapa, c in log if etapa == "fim"] == ["a", "b"]
+
+
+class MensagemSemPermissao(MensagemFalsa):
+    async def add_reaction(self, emoji):
+        raise RuntimeError("403 Forbidden: Missing Permissions")
+
+
+def test_reacao_falhando_nao_derruba_o_envio(bot_rep, monkeypatch):
+    log = []
+    canal = CanalFalso(log, "noticias")
+    enviar_original = canal.send
+
+    async def send(**kwargs):
+        msg = await enviar_original(**kwargs)
+        return MensagemSemPermissao(canal, msg.kwargs)
+    canal.send = send
+    monkeypatch.setattr(bot_rep.bot, "get_channel", {1: canal}.get)
+
+    async def cenario():
+        fila = bot_rep.FilaEnvio()
+        return await asyncio.gather(fila.enviar(1, content="n1", reacao="🔥"), fila.enviar(1, content="n2"))
+
+    n1, n2 = asyncio.run(cenario())
+    # Quem espera recebe a mensagem já publicada, e a fila segue para a próxima
+    assert n1.kwargs == {"content": "n1"} and n2.kwargs == {"content": "n2"}
+    assert [c for _, etapa, c in log if etapa == "fim"] == ["n1", "n2"]
@@ -0,0 +1,186 @@
+"""Testes da fila de squads e o simulador de carga (que antes era o /benchmark_fila).
+
+Benchmark fora do bot: python tests/test_fila_matchmaking.py [jogadores]
+"""
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+from types import SimpleNamespace
+
+
+def simular_fila(FilaMatchmaking, jogadores=10000, mapas=8, desistencia=0.1, semente=None):
+    """Chegadas aleatórias (alguns mapas bem mais populares que outros), parte desiste antes
+    de formar squad. Mede a fila, sem tocar no Discord."""
+    rnd = random.Random(semente)
+    fila = FilaMatchmaking(validade=float("inf"))
+    chegada, esperas, esperando = {}, [], []
+    relogio, operacoes, squads = 0.0, 0, 0
+    inicio = time.perf_counter()
+    for uid in range(jogadores):
+        relogio += rnd.expovariate(2.0)   # ~2 chegadas por segundo simulado
+        if esperando and rnd.random() < desistencia:
+            i = rnd.randrange(len(esperando))
+            esperando[i], esperando[-1] = esperando[-1], esperando[i]
+            desistiu = esperando.pop()
+            if fila.sair(desistiu): chegada.pop(desistiu, None)
+            operacoes += 1
+        mapa = f"mapa{min(mapas, int(rnd.paretovariate(1.2))) - 1}"
+        chegada[uid] = relogio
+        esperando.append(uid)
+        for squad in fila.entrar(uid, mapa, rnd.choice((2, 3)), agora=relogio):
+            squads += 1
+            esperas.extend(relogio - chegada.pop(membro) for membro in squad)
+        operacoes += 1
+    duracao = time.perf_counter() - inicio
+    esperas.sort()
+    return {
+        "jogadores": jogadores, "squads": squads, "fila": fila, "operacoes": operacoes,
+        "ops_por_segundo": operacoes / duracao if duracao else float("inf"), "duracao": duracao,
+        "espera_media": sum(esperas) / len(esperas) if esperas else 0.0,
+        "espera_p95": esperas[int(len(esperas) * 0.95)] if esperas else 0.0,
+    }
+
+
+def test_forma_squad_quando_fecha_o_numero(bot_rep):
+    fila = bot_rep.FilaMatchmaking(validade=60)
+    assert fila.entrar(1, "dam", 3, agora=0) == []
+    assert fila.entrar(2, "dam", 3, agora=1) == []
+    assert fila.entrar(9, "spaceport", 3, agora=1) == []
+    assert fila.entrar(3, "dam", 3, agora=2) == [[1, 2, 3]]
+    assert fila.resumo() == [("spaceport", 3, 1)]
+
+
+def test_sair_e_trocar_de_fila(bot_rep):
+    fila = bot_rep.FilaMatchmaking(validade=60)
+    fila.entrar(1, "dam", 2, agora=0)
+    fila.entrar(2, "dam", 3, agora=0)
+    assert fila.entrar(2, "dam", 2, agora=1) == [[1, 2]]   # trocou de trio para duo
+    assert fila.posicao(2) is None and fila.resumo() == []
+    fila.entrar(3, "dam", 2, agora=2)
+    assert fila.sair(3) and not fila.sair(3)
+    assert fila.entrar(4, "dam", 2, agora=3) == []
+
+
+def test_expirar(bot_rep):
+    fila = bot_rep.FilaMatchmaking(validade=60)
+    fila.entrar(1, "dam", 2, agora=0)
+    fila.entrar(2, "buried", 2, agora=30)
+    assert fila.expirar(agora=70) == [1]
+    assert fila.posicao(2) == (("buried", 2), 1)
+
+
+def test_simulador_mantem_o_indice_consistente(bot_rep):
+    r = simular_fila(bot_rep.FilaMatchmaking, jogadores=20000, semente=7)
+    fila = r["fila"]
+    assert r["squads"] > 0
+    # Cada jogador que ainda espera está contado uma vez, na fila certa
+    assert sum(fila.validos.values()) == len(fila.entradas)
+    for chave, n in fila.validos.items():
+        assert 0 < n < chave[1]
+        assert sum(1 for item in fila.filas[chave] if fila._vivo(item)) == n
+
+
+class MembroFalso:
+    def __init__(self, id, dm_fechada=False):
+        self.id = id
+        self.mention = f"<@{id}>"
+        self.dm_fechada = dm_fechada
+        self.dms = []
+
+    async def send(self, embed, view):
+        if self.dm_fechada: raise RuntimeError("403 Cannot send messages to this user")
+        self.dms.append((embed, view))
+
+
+class CanalFalhando:
+    """Falha os primeiros `falhas` envios, como um canal sem permissão ou fora do ar."""
+
+    def __init__(self, falhas):
+        self.falhas = falhas
+        self.tentativas = 0
+        self.enviadas = []
+
+    async def send(self, **kwargs):
+        self.tentativas += 1
+        if self.tentativas <= self.falhas: raise RuntimeError("503 Service Unavailable")
+        self.enviadas.append(kwargs)
+
+
+class PainelFalso:
+    def __init__(self):
+        self.formados = deque()
+
+    def agendar(self, canal):
+        pass
+
+
+def preparar_squad(bot_rep, monkeypatch, membros):
+    guild = SimpleNamespace(id=1, get_member={m.id: m for m in membros}.get)
+
+    async def sem_sala(guild, tipo, membros):
+        return None
+    monkeypatch.setattr(bot_rep, "salas", SimpleNamespace(reservar_squad=sem_sala))
+    monkeypatch.setattr(bot_rep, "matchmaking", bot_rep.FilaMatchmaking(validade=60))
+    monkeypatch.setattr(bot_rep, "painel_fila", PainelFalso())
+    monkeypatch.setattr(bot_rep, "FILA_REPOR_ESPERA", 0)
+    return guild
+
+
+async def esperar_squads(bot_rep):
+    while bot_rep.tarefas_squad:
+        await asyncio.gather(*bot_rep.tarefas_squad)
+
+
+def test_anuncio_que_falha_vai_por_dm(bot_rep, monkeypatch):
+    membros = [MembroFalso(1), MembroFalso(2, dm_fechada=True)]
+    guild = preparar_squad(bot_rep, monkeypatch, membros)
+    canal = CanalFalhando(falhas=1)
+
+    asyncio.run(bot_rep.formar_squad(guild, canal, "dam", 2, [1, 2]))
+    assert canal.enviadas == [] and len(membros[0].dms) == 1
+    # Um recebeu os links das salas: o squad vale e ninguém volta para a fila
+    _, view = membros[0].dms[0]
+    assert all(item.url.startswith("https://discord.com/channels/1/") for item in view.children)
+    assert bot_rep.matchmaking.entradas == {} and len(bot_rep.painel_fila.formados) == 1
+
+
+def test_squad_sem_aviso_volta_para_a_fila(bot_rep, monkeypatch):
+    membros = [MembroFalso(1, dm_fechada=True), MembroFalso(2, dm_fechada=True)]
+    guild = preparar_squad(bot_rep, monkeypatch, membros)
+    canal = CanalFalhando(falhas=1)
+
+    async def cenario():
+        await bot_rep.formar_squad(guild, canal, "dam", 2, [1, 2])
+        await esperar_squads(bot_rep)
+
+    asyncio.run(cenario())
+    # Na segunda tentativa o canal voltou e o squad foi anunciado
+    assert canal.tentativas == 2 and len(canal.enviadas) == 1
+    assert "<@1> <@2>" == canal.enviadas[0]["content"]
+
+
+def test_squad_desiste_depois_de_algumas_tentativas(bot_rep, monkeypatch):
+    membros = [MembroFalso(1, dm_fechada=True), MembroFalso(2, dm_fechada=True)]
+    guild = preparar_squad(bot_rep, monkeypatch, membros)
+    canal = CanalFalhando(falhas=99)
+
+    async def cenario():
+        await bot_rep.formar_squad(guild, canal, "dam", 2, [1, 2])
+        await esperar_squads(bot_rep)
+
+    asyncio.run(cenario())
+    assert canal.tentativas == bot_rep.FILA_TENTATIVAS
+    assert bot_rep.matchmaking.entradas == {}
+
+
+if __name__ == "__main__":
+    import os
+    os.environ.setdefault("DISCORD_TOKEN", "teste")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import bot_rep
+    r = simular_fila(bot_rep.FilaMatchmaking, int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+    print(f"{r['jogadores']} jogadores, {r['squads']} squads, {len(r['fila'].entradas)} na fila")
+    print(f"{r['operacoes']} operações em {r['duracao'] * 1000:.0f} ms ({r['ops_por_segundo']:,.0f} ops/s)")
+    print(f"espera simulada: média {r['espera_media']:.0f}s, p95 {r['espera_p95']:.0f}s")
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta
+
+
+AGORA = datetime(2024, 5, 1, 12, 0)
+
+
+def uso(giver, receiver, tipo, horas_atras):
+    return (giver, receiver, tipo, AGORA - timedelta(hours=horas_atras), 0)
+
+
+def test_regras_da_janela_deslizante(bot_rep):
+    avaliar = bot_rep.LimitesRep.avaliar
+    assert avaliar([], 1, 2, "rep", AGORA) == (0, None)
+    # Um /rep há 1h: faltam 1h para o limite por usuário (2h) e 23h para o mesmo par (24h)
+    espera, motivo = avaliar([uso(1, 2, "rep", 1)], 1, 2, "rep", AGORA)
+    assert espera == 23 * 3600 and "avaliou este raider" in motivo
+    espera, motivo = avaliar([uso(1, 2, "rep", 1)], 1, 3, "rep", AGORA)
+    assert espera == 3600 and "usou este comando" in motivo
+    # /neg tem limites próprios
+    assert avaliar([uso(1, 2, "rep", 1)], 1, 2, "neg", AGORA) == (0, None)
+    # Usos fora da janela não contam
+    assert avaliar([uso(1, 2, "rep", 25)], 1, 2, "rep", AGORA) == (0, None)
+
+
+def test_rep_reciproca(bot_rep, monkeypatch):
+    avaliar = bot_rep.LimitesRep.avaliar
+    # Devolver o +rep de quem te deu é liberado
+    assert avaliar([uso(2, 1, "rep", 3)], 1, 2, "rep", AGORA) == (0, None)
+    # Repetir a troca não: a ida de 3 dias atrás só sai da janela (7 dias) em 4 dias
+    trocados = [uso(1, 2, "rep", 72), uso(2, 1, "rep", 48)]
+    espera, motivo = avaliar(trocados, 1, 2, "rep", AGORA)
+    assert espera == 4 * 24 * 3600 and "trocaram" in motivo
+    # Nem voltando pelo outro lado
+    assert avaliar(trocados, 2, 1, "rep", AGORA)[1] == motivo
+    # Trocas fora da janela e /neg não contam
+    assert avaliar([uso(1, 2, "rep", 24 * 8), uso(2, 1, "rep", 48)], 1, 2, "rep", AGORA) == (0, None)
+    assert avaliar(trocados, 1, 2, "neg", AGORA) == (0, None)
+    monkeypatch.setattr(bot_rep, "REP_JANELA_RECIPROCA", 0)
+    assert avaliar(trocados, 1, 2, "rep", AGORA) == (0, None)
+
+
+def criar_tabela(cursor):
+    cursor.execute('''CREATE TABLE rep_cooldowns (id BIGSERIAL PRIMARY KEY, giver_id BIGINT NOT NULL,
+        receiver_id BIGINT NOT NULL, tipo TEXT NOT NULL, usado_em TIMESTAMP NOT NULL)''')
+
+
+def test_dois_processos_nao_furam_o_limite(bot_rep, postgres):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=2, maximo=4)
+        await banco.transacao(criar_tabela)
+        # Duas instâncias do bot, cada uma com seu cache, no mesmo banco
+        processo_a, processo_b = bot_rep.LimitesRep(banco), bot_rep.LimitesRep(banco)
+        resultados = await asyncio.gather(processo_a.consumir(1, 2, "rep"), processo_b.consumir(1, 3, "rep"))
+        liberados = [r for r in resultados if r[0]]
+        negados = [r for r in resultados if not r[0]]
+        # O uso liberado é desfeito (a reputação não foi salva): dá para usar de novo
+        dono = processo_a if resultados[0][0] else processo_b
+        await dono.devolver(1, liberados[0][0])
+        depois = await dono.consumir(1, 3, "rep")
+        total = await banco.buscar_um("SELECT COUNT(*) FROM rep_cooldowns")
+        await banco.fechar()
+        return liberados, negados, depois, total
+
+    liberados, negados, depois, total = asyncio.run(cenario())
+    assert len(liberados) == 1 and len(negados) == 1 and negados[0][1] > 0
+    assert depois[0] and total == (1,)
+
+
+def test_troca_repetida_vista_pelo_banco(bot_rep, postgres, monkeypatch):
+    # Só a regra da troca: os limites por usuário e por par ficam desligados
+    monkeypatch.setattr(bot_rep, "REP_JANELA_USUARIO", 0)
+    monkeypatch.setattr(bot_rep, "REP_JANELA_PAR", 0)
+
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(criar_tabela)
+        processo_a, processo_b = bot_rep.LimitesRep(banco), bot_rep.LimitesRep(banco)
+        ida = await processo_a.consumir(1, 2, "rep")
+        volta = await processo_b.consumir(2, 1, "rep")
+        # O cache do processo A não conhece a volta; quem nega é o banco
+        de_novo = await processo_a.consumir(1, 2, "rep")
+        await banco.fechar()
+        return ida, volta, de_novo
+
+    ida, volta, de_novo = asyncio.run(cenario())
+    assert ida[0] and volta[0]
+    assert de_novo[0] is None and "trocaram" in de_novo[2]
+
+
+def test_sem_banco_o_comando_e_negado(bot_rep):
+    class BancoFora:
+        async def transacao(self, func, *args):
+            raise RuntimeError("banco fora do ar")
+
+    uso_id, espera, motivo = asyncio.run(bot_rep.LimitesRep(BancoFora()).consumir(1, 2, "rep"))
+    assert uso_id is None and espera > 0 and "banco" in motivo
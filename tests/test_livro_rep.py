@@ -0,0 +1,295 @@
+import asyncio
+import threading
+
+
+class BancoFalso:
+    """Banco em memória: aplica os eventos como o _gravar (cada chave conta uma vez só)."""
+
+    def __init__(self, fichas=None):
+        self.fichas = {uid: list(f) for uid, f in (fichas or {}).items()}
+        self.chaves = set()
+        self.lotes = []
+        self.falhar = False
+
+    async def buscar_um(self, sql, params=(), nome=None):
+        ficha = self.fichas.get(params[0])
+        return tuple(ficha) if ficha else None
+
+    async def transacao(self, func, eventos):
+        if self.falhar: raise RuntimeError("banco fora do ar")
+        self.lotes.append(list(eventos))
+        for ev in eventos:
+            if ev["chave"] in self.chaves: continue
+            self.chaves.add(ev["chave"])
+            ficha = self.fichas.setdefault(ev["receiver"], [0, 0, 0])
+            if ev.get("valor") is not None:
+                ficha[0] = ev["valor"]
+                continue
+            ficha[0] += ev["delta"]
+            if ev["tipo"] == "rep" and ev["delta"] > 0: ficha[1] += 1
+            elif ev["tipo"] == "rep" and ev["delta"] < 0: ficha[2] += 1
+
+
+def test_alteracoes_saem_num_lote_so(bot_rep, tmp_path):
+    banco = BancoFalso({1: [10, 10, 0]})
+
+    async def cenario():
+        livro = bot_rep.LivroRep(banco, str(tmp_path / "journal.log"))
+        await livro.iniciar()
+        totais = [await livro.alterar(1, 1, giver=5), await livro.alterar(1, 1, giver=6), await livro.alterar(2, -1, giver=5),
+                  await livro.alterar(3, 50, definir=True), await livro.alterar(3, 1, giver=5)]
+        assert banco.lotes == []   # nada foi ao banco ainda
+        assert await livro.descarregar() == 5
+        livro.fechar()
+        return totais
+
+    assert asyncio.run(cenario()) == [11, 12, -1, 50, 51]
+    assert len(banco.lotes) == 1
+    assert banco.fichas == {1: [12, 12, 0], 2: [-1, 0, 1], 3: [51, 1, 0]}
+
+
+def test_journal_reaplicado_depois_de_um_crash(bot_rep, tmp_path):
+    banco = BancoFalso({1: [10, 10, 0]})
+    caminho = str(tmp_path / "journal.log")
+
+    async def cenario():
+        livro = bot_rep.LivroRep(banco, caminho)
+        await livro.iniciar()
+        await livro.alterar(1, 5, tipo="denuncia")
+        await livro.alterar(2, 7, definir=True)
+        livro.fechar()   # "cai" antes do flush
+        assert banco.lotes == []
+        outro = bot_rep.LivroRep(banco, caminho)
+        await outro.iniciar()
+        total = await outro.total(1)
+        outro.fechar()
+        return total
+
+    assert asyncio.run(cenario()) == 15
+    assert banco.fichas == {1: [15, 10, 0], 2: [7, 0, 0]}
+
+
+def test_flush_que_falha_volta_para_a_fila(bot_rep, tmp_path):
+    banco = BancoFalso()
+    caminho = str(tmp_path / "journal.log")
+
+    async def cenario():
+        livro = bot_rep.LivroRep(banco, caminho)
+        await livro.iniciar()
+        await livro.alterar(1, 3)
+        banco.falhar = True
+        try:
+            await livro.descarregar()
+        except RuntimeError:
+            pass
+        await livro.alterar(1, 2)   # chega depois da falha
+        banco.falhar = False
+        await livro.descarregar()
+        livro.fechar()
+        # Um restart depois do flush não reaplica nada
+        outro = bot_rep.LivroRep(banco, caminho)
+        await outro.iniciar()
+        outro.fechar()
+
+    asyncio.run(cenario())
+    assert banco.fichas == {1: [5, 2, 0]}
+
+
+
+def test_cache_limitado_nao_perde_ficha_com_evento_pendente(bot_rep, tmp_path):
+    banco = BancoFalso({uid: [uid, 0, 0] for uid in range(10)})
+
+    async def cenario():
+        livro = bot_rep.LivroRep(banco, str(tmp_path / "journal.log"), cache_limite=3)
+        await livro.iniciar()
+        await livro.alterar(0, 100, giver=99)   # pendente: não pode sair do cache
+        for uid in range(1, 10):
+            await livro.total(uid)
+        assert 0 in livro.fichas and len(livro.fichas) <= 4
+        assert await livro.total(0) == 100
+        await livro.descarregar()
+        livro.fechar()
+
+    asyncio.run(cenario())
+    assert banco.fichas[0] == [100, 1, 0]
+
+class BancoLento(BancoFalso):
+    """Segura a gravação (ou a leitura) até o teste liberar."""
+
+    def __init__(self, fichas=None):
+        super().__init__(fichas)
+        self.gravando = asyncio.Event()
+        self.lendo = asyncio.Event()
+        self.liberar = asyncio.Event()
+        self.segurar_leitura = False
+
+    async def buscar_um(self, sql, params=(), nome=None):
+        res = await super().buscar_um(sql, params, nome)
+        if self.segurar_leitura:
+            self.lendo.set()
+            await self.liberar.wait()
+        return res
+
+    async def transacao(self, func, eventos):
+        self.gravando.set()
+        await self.liberar.wait()
+        await super().transacao(func, eventos)
+
+
+def test_lote_em_gravacao_nao_sai_do_cache(bot_rep, tmp_path):
+    banco = BancoLento({uid: [uid, 0, 0] for uid in range(10)})
+
+    async def cenario():
+        livro = bot_rep.LivroRep(banco, str(tmp_path / "journal.log"), cache_limite=3)
+        banco.liberar.set()
+        await livro.iniciar()
+        banco.liberar.clear()
+        await livro.alterar(0, 100, giver=99)
+        flush = asyncio.create_task(livro.descarregar())
+        await banco.gravando.wait()
+        # O lote já saiu de pendentes, mas o banco ainda tem o valor velho
+        livro.esquecer()
+        for uid in range(1, 10):
+            await livro.total(uid)
+        durante = await livro.total(0)
+        banco.liberar.set()
+        await flush
+        livro.fechar()
+        return durante
+
+    assert asyncio.run(cenario()) == 100
+    assert banco.fichas[0] == [100, 1, 0]
+
+
+def test_alterar_espera_pausa_que_comecou_durante_a_leitura(bot_rep, tmp_path):
+    banco = BancoLento({1: [10, 0, 0]})
+    caminho = tmp_path / "journal.log"
+
+    async def cenario():
+        livro = bot_rep.LivroRep(banco, str(caminho))
+        banco.liberar.set()
+        await livro.iniciar()
+        banco.liberar.clear()
+        banco.segurar_leitura = True
+        alteracao = asyncio.create_task(livro.alterar(1, 5, giver=2))
+        await banco.lendo.wait()
+        async with livro.pausado():
+            banco.fichas[1] = [50, 0, 0]   # o /restore troca o banco por baixo
+            banco.segurar_leitura = False
+            banco.liberar.set()
+            await asyncio.sleep(0.05)
+            # A leitura velha voltou, mas nada foi para o journal nem para a fila
+            assert not alteracao.done() and livro.pendentes == []
+            assert not caminho.exists() or caminho.read_text() == ""
+        total = await alteracao
+        await livro.descarregar()
+        livro.fechar()
+        return total
+
+    assert asyncio.run(cenario()) == 55
+    assert banco.fichas[1] == [55, 1, 0]
+
+
+def test_fsync_do_flush_fora_do_loop(bot_rep, tmp_path, monkeypatch):
+    threads = []
+    fsync = bot_rep.os.fsync
+
+    def registrar(fd):
+        threads.append(threading.current_thread())
+        fsync(fd)
+    monkeypatch.setattr(bot_rep.os, "fsync", registrar)
+
+    async def cenario():
+        livro = bot_rep.LivroRep(BancoFalso(), str(tmp_path / "journal.log"))
+        await livro.iniciar()
+        await livro.alterar(1, 1, giver=2)
+        await livro.descarregar()
+        livro.fechar()
+
+    asyncio.run(cenario())
+    assert threads and threading.main_thread() not in threads
+
+
+def criar_tabelas(cursor):
+    cursor.execute('''CREATE TABLE usuarios (id BIGINT PRIMARY KEY, rep INTEGER DEFAULT 0, ultima_rep TIMESTAMP,
+        positivos INTEGER DEFAULT 0, negativos INTEGER DEFAULT 0)''')
+    cursor.execute('''CREATE TABLE rep_eventos (id BIGSERIAL PRIMARY KEY, chave TEXT UNIQUE NOT NULL, giver_id BIGINT,
+        receiver_id BIGINT NOT NULL, delta INTEGER NOT NULL, canal_id BIGINT, thread_id BIGINT,
+        tipo TEXT NOT NULL DEFAULT 'rep', criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def test_gravar_no_postgres_nao_conta_o_mesmo_evento_duas_vezes(bot_rep, postgres, tmp_path):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(criar_tabelas)
+        livro = bot_rep.LivroRep(banco, str(tmp_path / "journal.log"))
+        await livro.iniciar()
+        await livro.alterar(1, 1, giver=2)
+        await livro.alterar(1, 1, giver=3)
+        await livro.alterar(1, -1, giver=4)
+        await livro.alterar(2, 20, definir=True)
+        eventos = list(livro.pendentes)
+        await livro.descarregar()
+        # Reaplicar o mesmo lote (journal de um crash logo depois do commit) não muda nada
+        await banco.transacao(livro._gravar, eventos)
+        livro.fechar()
+        usuarios = await banco.buscar_todos("SELECT id, rep, positivos, negativos FROM usuarios ORDER BY id")
+        somas = await banco.buscar_todos("SELECT receiver_id, SUM(delta)::int FROM rep_eventos GROUP BY receiver_id ORDER BY receiver_id")
+        await banco.fechar()
+        return usuarios, somas
+
+    usuarios, somas = asyncio.run(cenario())
+    assert usuarios == [(1, 1, 2, 1), (2, 20, 0, 0)]
+    assert somas == [(1, 1), (2, 20)]
+
+
+def test_definir_usa_o_valor_do_banco_e_nao_o_do_cache(bot_rep, postgres, tmp_path):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(criar_tabelas)
+        livro = bot_rep.LivroRep(banco, str(tmp_path / "journal.log"))
+        await livro.iniciar()
+        await livro.alterar(1, 5, giver=2)
+        await livro.descarregar()
+        # Outro processo mexe no banco por fora; o cache do livro continua em 5
+        await banco.executar("UPDATE usuarios SET rep = 8 WHERE id = 1")
+        await livro.alterar(1, 0, definir=True, tipo="resetar")
+        await livro.descarregar()
+        livro.fechar()
+        rep = await banco.buscar_um("SELECT rep FROM usuarios WHERE id = 1")
+        historico = await banco.buscar_todos("SELECT tipo, delta FROM rep_eventos WHERE receiver_id = 1 ORDER BY id")
+        await banco.fechar()
+        return rep, historico
+
+    rep, historico = asyncio.run(cenario())
+    assert rep == (0,)
+    assert historico == [("rep", 5), ("resetar", -8)]
+
+
+def test_saldo_inicial_roda_uma_vez_e_a_conferencia_acha_divergencia(bot_rep, postgres):
+    def preparar(cursor):
+        criar_tabelas(cursor)
+        cursor.execute("CREATE TABLE migracoes (nome TEXT PRIMARY KEY, aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        cursor.execute("INSERT INTO usuarios (id, rep) VALUES (1, 30), (2, 0), (3, -5)")
+
+    def migrar(cursor):
+        return [bot_rep.aplicar_migracao(cursor, nome, sql) for nome, sql in bot_rep.MIGRACOES]
+
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.transacao(preparar)
+        primeira = await banco.transacao(migrar)
+        certo = await bot_rep.conferir_saldos(banco)
+        # Mudança feita por fora do bot: o próximo start não recalcula nada, a conferência acusa
+        await banco.executar("UPDATE usuarios SET rep = 40 WHERE id = 1")
+        await banco.executar("INSERT INTO rep_eventos (chave, receiver_id, delta) VALUES ('manual', 9, 2)")
+        segunda = await banco.transacao(migrar)
+        errado = await bot_rep.conferir_saldos(banco, amostra=1)
+        eventos = await banco.buscar_um("SELECT COUNT(*) FROM rep_eventos WHERE tipo = 'saldo_inicial'")
+        await banco.fechar()
+        return primeira, certo, segunda, errado, eventos
+
+    primeira, certo, segunda, errado, eventos = asyncio.run(cenario())
+    assert primeira == [True] and segunda == [False]
+    assert certo == (0, []) and eventos == (2,)
+    assert errado == (2, [(1, 40, 30)])
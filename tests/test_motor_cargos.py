@@ -0,0 +1,85 @@
+import asyncio
+
+
+class CargoFalso:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def is_default(self):
+        return self.name == "@everyone"
+
+
+class ServidorFalso:
+    def __init__(self, nomes):
+        self.id = 1
+        self.roles = [CargoFalso(i, nome) for i, nome in enumerate(nomes)]
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def cargo(self, nome):
+        return next(role for role in self.roles if role.name == nome)
+
+
+class MembroFalso:
+    def __init__(self, guild, nomes):
+        self.id = 42
+        self.guild = guild
+        self.roles = [guild.cargo(nome) for nome in nomes]
+        self.edicoes = []
+
+    async def edit(self, roles, reason=None):
+        # Como a API: @everyone não vem na lista e continua no membro
+        assert not any(role.is_default() for role in roles)
+        self.edicoes.append((roles, reason))
+        self.roles = [self.guild.cargo("@everyone")] + roles
+
+    def nomes(self):
+        return {role.name for role in self.roles}
+
+
+NOMES = ["@everyone", "trocador oficial", "trocador confiavel", "trocador iniciante", "trocador perigoso", "moderador"]
+
+
+def test_cargos_e_status_por_pontos(bot_rep):
+    assert bot_rep.cargos_para_pontos(120) == {"trocador oficial", "trocador confiavel", "trocador iniciante"}
+    assert bot_rep.cargos_para_pontos(10) == {"trocador iniciante"}
+    assert bot_rep.cargos_para_pontos(0) == set()
+    assert bot_rep.cargos_para_pontos(-10) == {"trocador perigoso"}
+    assert [bot_rep.status_para_pontos(p) for p in (100, 55, 10, 9, -10)] == [
+        "Trocador Oficial 💎", "Trocador Confiável ✅", "Trocador Iniciante ✅", "Neutro", "Trocador Perigoso ❌"]
+
+
+def test_aplicar_troca_so_os_cargos_de_nivel(bot_rep):
+    guild = ServidorFalso(NOMES)
+    membro = MembroFalso(guild, ["@everyone", "moderador", "trocador perigoso"])
+    motor = bot_rep.MotorCargos()
+
+    assert asyncio.run(motor.aplicar(membro, 60)) is True
+    assert membro.nomes() == {"@everyone", "moderador", "trocador confiavel", "trocador iniciante"}
+    assert len(membro.edicoes) == 1 and membro.edicoes[0][1] == "Nível de reputação: 60 pts"
+    # Já está certo: nenhuma chamada à API
+    assert asyncio.run(motor.aplicar(membro, 70)) is False
+    assert len(membro.edicoes) == 1
+
+
+def test_usa_o_membro_do_cache_sem_ir_a_api(bot_rep):
+    guild = ServidorFalso(NOMES)
+    membro = MembroFalso(guild, ["@everyone", "moderador", "trocador iniciante"])
+
+    # Nenhum fetch_member: o ServidorFalso nem tem esse método
+    asyncio.run(bot_rep.MotorCargos().aplicar(membro, -20))
+    assert membro.nomes() == {"@everyone", "moderador", "trocador perigoso"}
+
+
+def test_cargo_apagado_some_do_cache_no_evento(bot_rep):
+    guild = ServidorFalso(NOMES)
+    motor = bot_rep.MotorCargos()
+    assert "trocador oficial" in motor.resolver(guild)
+    guild.roles = [role for role in guild.roles if role.name != "trocador oficial"]
+    motor.atualizar(guild)
+
+    membro = MembroFalso(guild, ["@everyone"])
+    asyncio.run(motor.aplicar(membro, 150))
+    assert membro.nomes() == {"@everyone", "trocador confiavel", "trocador iniciante"}
@@ -0,0 +1,95 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+
+class Contador:
+    """Fábrica de conexões sqlite3 (o "Postgres" local dos testes) que conta quantas estão abertas."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.abertas = 0
+        self.pico = 0
+        self._trava = threading.Lock()
+
+    def __call__(self):
+        contador = self
+        conn = sqlite3.connect(self.caminho, check_same_thread=False, timeout=10)
+
+        class Conexao:
+            closed = False
+            def cursor(self): return conn.cursor()
+            def commit(self): conn.commit()
+            def rollback(self): conn.rollback()
+            def close(self):
+                if not self.closed:
+                    self.closed = True
+                    conn.close()
+                    with contador._trava: contador.abertas -= 1
+
+        with self._trava:
+            self.abertas += 1
+            self.pico = max(self.pico, self.abertas)
+        return Conexao()
+
+
+def test_transacao_commit_e_rollback(bot_rep, tmp_path):
+    async def cenario():
+        pool = bot_rep.PoolBanco(Contador(str(tmp_path / "banco.db")), minimo=1, maximo=2)
+        await pool.abrir()
+        await pool.transacao(lambda c: c.execute("CREATE TABLE usuarios (id INTEGER PRIMARY KEY, rep INTEGER)"))
+        await pool.transacao(lambda c: c.execute("INSERT INTO usuarios VALUES (1, 10)"))
+
+        def _falhar(cursor):
+            cursor.execute("UPDATE usuarios SET rep = 99 WHERE id = 1")
+            raise RuntimeError("erro no meio da transação")
+        try:
+            await pool.transacao(_falhar)
+        except RuntimeError:
+            pass
+        linhas = await pool.buscar_todos("SELECT id, rep FROM usuarios")
+        await pool.fechar()
+        return linhas
+
+    assert asyncio.run(cenario()) == [(1, 10)]
+
+
+def test_nunca_passa_do_maximo_com_manter_vivo(bot_rep, tmp_path):
+    fabrica = Contador(str(tmp_path / "banco.db"))
+
+    async def cenario():
+        pool = bot_rep.PoolBanco(fabrica, minimo=2, maximo=3)
+        await pool.abrir()
+
+        def _lento(cursor):
+            cursor.execute("SELECT 1")
+            time.sleep(0.01)
+            return cursor.fetchone()[0]
+
+        consultas = [pool.transacao(_lento) for _ in range(30)]
+        pings = [pool.manter_vivo() for _ in range(10)]
+        res = await asyncio.gather(*consultas, *pings)
+        assert res[:30] == [1] * 30
+        assert pool._abertas == fabrica.abertas
+        await pool.fechar()
+
+    asyncio.run(cenario())
+    assert fabrica.pico <= 3
+    assert fabrica.abertas == 0
+
+
+def test_descarta_conexao_quebrada(bot_rep, tmp_path):
+    fabrica = Contador(str(tmp_path / "banco.db"))
+
+    async def cenario():
+        pool = bot_rep.PoolBanco(fabrica, minimo=1, maximo=2)
+        await pool.abrir()
+        conn, _ = pool._livres[0]
+        def _quebrada(): raise sqlite3.OperationalError("conexão caiu")
+        conn.cursor = _quebrada   # parece viva, mas o ping falha
+        assert await pool.manter_vivo() == 1
+        assert await pool.buscar_um("SELECT 1") == (1,)
+        await pool.fechar()
+
+    asyncio.run(cenario())
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+class BancoFalso:
+    def __init__(self):
+        self.comandos = []
+
+    async def executar(self, sql, params=()):
+        self.comandos.append(sql.split()[0])
+        return 1
+
+
+class MensagemFalsa:
+    def __init__(self, id=1):
+        self.id = id
+        self.channel = SimpleNamespace(id=99)
+        self.edicoes = []
+
+    async def edit(self, embed, view):
+        self.edicoes.append((embed, view))
+
+
+def test_entradas_seguidas_viram_uma_edicao_so(bot_rep):
+    banco = BancoFalso()
+
+    async def cenario():
+        registro = bot_rep.RegistroRaids(banco, intervalo=0.05)
+        message = MensagemFalsa()
+        raid = await registro.criar(message, 10, "dam", 3)
+        registro.entrar(raid, 11, message)
+        registro.entrar(raid, 12, message)
+        await raid.edicao
+        return raid, message
+
+    raid, message = asyncio.run(cenario())
+    assert raid.completo and raid.participantes == [10, 11, 12]
+    assert banco.comandos == ["INSERT", "UPDATE"]
+    assert len(message.edicoes) == 1
+    embed, view = message.edicoes[0]
+    assert embed.fields[1].name == "Membros (3/3)" and "<@12>" in embed.fields[1].value
+    assert view.entrar_button.label == "Squad Completo (Clique p/ Salas)"
+    # Só desenha: parada, o discord.py não registra uma view nova por mensagem
+    assert view.is_finished() and view.entrar_button.custom_id == "btn_entrar_raid"
+
+
+def test_edicoes_reusam_o_mesmo_desenho(bot_rep):
+    async def cenario():
+        registro = bot_rep.RegistroRaids(BancoFalso(), intervalo=0)
+        mensagens = [MensagemFalsa(i) for i in range(3)]
+        for message in mensagens:
+            raid = await registro.criar(message, 10, "dam", 2)
+            registro.entrar(raid, 11, message)
+            await raid.edicao
+        return registro, [view for message in mensagens for _, view in message.edicoes]
+
+    registro, views = asyncio.run(cenario())
+    assert len(views) == 3 and all(view is registro.desenho(True) for view in views)
+    assert registro.desenho(False) is not registro.desenho(True)
+    assert registro.desenho(False).entrar_button.label == "Entrar no Squad"
+
+
+def test_chamada_velha_expira(bot_rep):
+    banco = BancoFalso()
+
+    async def cenario():
+        registro = bot_rep.RegistroRaids(banco, validade=3600)
+        nova = await registro.criar(MensagemFalsa(1), 10, "dam", 2)
+        velha = await registro.criar(MensagemFalsa(2), 20, "spaceport", 2)
+        velha.atualizado_em = datetime.now() - timedelta(hours=2)
+        assert registro.buscar(2) is None and registro.buscar(1) is nova
+        await registro.expirar()
+        return registro
+
+    assert list(asyncio.run(cenario()).raids) == [1]
+
+
+def test_chamadas_sobrevivem_a_um_restart(bot_rep, postgres):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.executar('''CREATE TABLE raids (message_id BIGINT PRIMARY KEY, canal_id BIGINT, host_id BIGINT, mapa TEXT,
+            vagas INTEGER, participantes BIGINT[], atualizado_em TIMESTAMP)''')
+        registro = bot_rep.RegistroRaids(banco, intervalo=0)
+        message = MensagemFalsa(5)
+        raid = await registro.criar(message, 10, "dam", 3)
+        registro.entrar(raid, 11, message)
+        await raid.edicao
+        await registro.criar(MensagemFalsa(6), 20, "dam", 2)
+        await banco.executar("UPDATE raids SET atualizado_em = %s WHERE message_id = 6", (datetime.now() - timedelta(hours=2),))
+        novo = bot_rep.RegistroRaids(banco, validade=3600)
+        await novo.carregar()
+        await banco.fechar()
+        return novo
+
+    novo = asyncio.run(cenario())
+    assert list(novo.raids) == [5]
+    assert novo.buscar(5).participantes == [10, 11] and novo.buscar(5).canal_id == 99
@@ -0,0 +1,32 @@
+import random
+
+
+def test_ordem_igual_a_ordenar_do_zero(bot_rep):
+    aleatorio = random.Random(4)
+    ranking = bot_rep.Ranking(por_pagina=10)
+    pontos = {uid: aleatorio.randint(-20, 100) for uid in range(1, 200)}
+    ranking.carregar(pontos)
+    for _ in range(2000):
+        uid = aleatorio.randint(1, 260)   # inclui usuários novos
+        pontos[uid] = aleatorio.randint(-20, 100)
+        ranking.atualizar(uid, pontos[uid])
+    esperado = sorted(pontos.items(), key=lambda item: (-item[1], item[0]))
+    obtido = [(uid, rep) for pagina in range(1, ranking.total_paginas() + 1) for _, uid, rep in ranking.pagina(pagina)]
+    assert obtido == esperado
+    assert ranking.pagina(1)[0][0] == 1 and ranking.pagina(2)[0][0] == 11
+
+
+def test_descarta_so_as_paginas_que_mudaram(bot_rep):
+    ranking = bot_rep.Ranking(por_pagina=10)
+    ranking.carregar({uid: 1000 - uid for uid in range(1, 51)})   # 5 páginas, uid 1 no topo
+    ranking.embeds.update({p: f"pagina {p}" for p in range(1, 6)})
+    ranking.atualizar(35, 1000 - 15)    # da página 4 para a 2 (empata com o uid 15, que tem id menor)
+    assert sorted(ranking.embeds) == [1, 5]
+    assert [uid for _, uid, _ in ranking.pagina(2)][4:7] == [15, 35, 16]
+
+    ranking.embeds.update({p: f"pagina {p}" for p in range(1, 6)})
+    ranking.atualizar(35, 1000 - 15)    # mesmo valor: nada muda
+    assert len(ranking.embeds) == 5
+
+    ranking.atualizar(51, -5)           # usuário novo cria a página 6: o rodapé muda em todas
+    assert ranking.embeds == {} and ranking.total_paginas() == 6
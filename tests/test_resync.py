@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+
+class CargoFalso:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def is_default(self):
+        return self.name == "@everyone"
+
+
+class MembroFalso:
+    def __init__(self, guild, id, nomes):
+        self.id = id
+        self.guild = guild
+        self.roles = [guild.cargo(nome) for nome in nomes]
+        self.edicoes = 0
+
+    async def edit(self, roles, reason=None):
+        self.edicoes += 1
+        self.roles = [self.guild.roles[0]] + roles
+
+
+class ServidorFalso:
+    def __init__(self):
+        self.id = 7
+        self.roles = [CargoFalso(i, nome) for i, nome in enumerate(
+            ["@everyone", "trocador oficial", "trocador confiavel", "trocador iniciante", "trocador perigoso"])]
+        self.membros = {}
+
+    def cargo(self, nome):
+        return next(role for role in self.roles if role.name == nome)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_member(self, user_id):
+        return self.membros.get(user_id)
+
+    @property
+    def members(self):
+        return list(self.membros.values())
+
+
+class MensagemFalsa:
+    def __init__(self, content):
+        self.content = content
+
+    async def edit(self, content):
+        self.content = content
+
+
+class CanalFalso:
+    id = 99
+
+    async def send(self, content):
+        self.relatorio = MensagemFalsa(content)
+        return self.relatorio
+
+
+class BancoFalso:
+    """Tabela "usuarios" e checkpoints em memória; pode falhar a partir de um id."""
+
+    def __init__(self, usuarios):
+        self.usuarios = usuarios
+        self.checkpoints = {}
+        self.falhar_depois_de = None
+
+    async def buscar_todos(self, sql, params=(), nome=None):
+        if "ANY" in sql: return [(uid,) for uid in params[0] if uid in self.usuarios]
+        cursor, limite = params
+        if self.falhar_depois_de is not None and cursor >= self.falhar_depois_de: raise RuntimeError("conexão perdida")
+        return sorted((uid, rep, 0, 0) for uid, rep in self.usuarios.items() if uid > cursor)[:limite]
+
+    async def buscar_um(self, sql, params=(), nome=None):
+        return self.checkpoints.get(params[0])
+
+    async def executar(self, sql, params=()):
+        if sql.startswith("DELETE"): self.checkpoints.pop(params[0], None)
+        else: self.checkpoints[params[0]] = params[1:]
+
+
+class RankingFalso:
+    pronto = False
+
+
+def test_limitador_respeita_a_taxa(bot_rep):
+    async def cenario():
+        limitador = bot_rep.LimitadorTaxa(50, rajada=2)
+        inicio = time.monotonic()
+        for _ in range(7):
+            await limitador.aguardar()
+        return time.monotonic() - inicio
+
+    # 2 saem na rajada, os outros 5 a 50/s
+    assert asyncio.run(cenario()) >= 0.09
+
+
+def test_resync_corrige_so_quem_esta_errado_e_retoma_do_checkpoint(bot_rep, monkeypatch, tmp_path):
+    guild = ServidorFalso()
+    certo = MembroFalso(guild, 1, ["@everyone", "trocador iniciante"])
+    errado = MembroFalso(guild, 2, ["@everyone"])
+    depois_da_falha = MembroFalso(guild, 5, ["@everyone", "trocador oficial"])
+    sem_registro = MembroFalso(guild, 9, ["@everyone", "trocador confiavel"])
+    for membro in (certo, errado, depois_da_falha, sem_registro):
+        guild.membros[membro.id] = membro
+    banco = BancoFalso({1: 20, 2: 60, 3: 0, 5: -15})
+    banco.falhar_depois_de = 2
+    monkeypatch.setattr(bot_rep, "db", banco)
+    livro = bot_rep.LivroRep(banco, str(tmp_path / "journal.log"))
+    asyncio.run(livro.iniciar())
+    # Cache velho: a rep do membro 2 mudou no banco por fora do bot
+    livro.fichas[2] = [5, 5, 0]
+    monkeypatch.setattr(bot_rep, "livro_rep", livro)
+    monkeypatch.setattr(bot_rep, "ranking", RankingFalso())
+    monkeypatch.setattr(bot_rep, "motor_cargos", bot_rep.MotorCargos())
+    monkeypatch.setattr(bot_rep, "RESYNC_LOTE", 2)
+    monkeypatch.setattr(bot_rep, "RESYNC_EDICOES_POR_SEGUNDO", 1000)
+    canal = CanalFalso()
+
+    asyncio.run(bot_rep.ressincronizar_cargos(guild, canal))
+    assert "interrompida" in canal.relatorio.content
+    assert banco.checkpoints["resync_cargos"] == (7, 2, 99)
+    assert (certo.edicoes, errado.edicoes, depois_da_falha.edicoes) == (0, 1, 0)
+    assert {role.name for role in errado.roles} == {"@everyone", "trocador confiavel", "trocador iniciante"}
+    assert livro.fichas[2] == [60, 0, 0]
+
+    banco.falhar_depois_de = None
+    asyncio.run(bot_rep.ressincronizar_cargos(guild, canal, inicio=2))
+    assert "concluída" in canal.relatorio.content
+    assert "resync_cargos" not in banco.checkpoints
+    assert (certo.edicoes, errado.edicoes, depois_da_falha.edicoes, sem_registro.edicoes) == (0, 1, 1, 1)
+    assert [role.name for role in depois_da_falha.roles] == ["@everyone", "trocador perigoso"]
+    assert [role.name for role in sem_registro.roles] == ["@everyone"]
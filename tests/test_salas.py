@@ -0,0 +1,215 @@
+import asyncio
+
+import pytest
+
+
+class Papel:
+    pass
+
+
+class CanalFalso:
+    def __init__(self, guild, id, name, overwrites=None):
+        self.guild = guild
+        self.id = id
+        self.name = name
+        self.overwrites = overwrites or {}
+        self.members = []
+        self.edicoes = []
+
+    async def edit(self, **mudancas):
+        self.edicoes.append(mudancas)
+        await asyncio.sleep(0.01)
+        self.name = mudancas.get("name", self.name)
+        self.overwrites = mudancas.get("overwrites", self.overwrites)
+
+    async def delete(self):
+        self.guild.canais.pop(self.id)
+
+
+class CategoriaFalsa:
+    def __init__(self, guild, id):
+        self.guild = guild
+        self.id = id
+
+    @property
+    def voice_channels(self):
+        return [c for c in self.guild.canais.values() if isinstance(c, CanalFalso)]
+
+
+class ServidorFalso:
+    def __init__(self):
+        self.default_role = Papel()
+        self.me = Papel()
+        self.canais = {}
+        self.criados = 0
+        self.canais[500] = CategoriaFalsa(self, 500)
+
+    def get_channel(self, canal_id):
+        return self.canais.get(canal_id)
+
+    async def create_voice_channel(self, name, category, user_limit, overwrites):
+        self.criados += 1
+        canal = CanalFalso(self, 1000 + self.criados, name, overwrites)
+        self.canais[canal.id] = canal
+        return canal
+
+
+class HubFalso:
+    id = 10
+
+
+class MembroFalso:
+    def __init__(self, guild, id):
+        self.guild = guild
+        self.id = id
+        self.name = f"membro{id}"
+
+    async def move_to(self, canal):
+        canal.members.append(self)
+
+
+def gerenciador(**kwargs):
+    from bot_rep import GerenciadorSalas
+    salas = GerenciadorSalas(**kwargs)
+    salas.registrar("duo", 10, 500, 2, "🛰️ DUO")
+    return salas
+
+
+async def esperar_tarefas():
+    pendentes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    if pendentes: await asyncio.gather(*pendentes)
+
+
+def test_entrar_no_hub_usa_uma_sala_do_pool_sem_criar(bot_rep):
+    async def cenario():
+        guild = ServidorFalso()
+        salas = gerenciador(minimo=1, maximo=4)
+        tipo = salas.tipos["duo"]
+        await salas.repor(guild, tipo)
+        assert guild.criados == 1 and len(tipo.livres) == 1
+        sala = guild.get_channel(tipo.livres[0])
+        assert sala.overwrites[guild.default_role].connect is False
+
+        membro = MembroFalso(guild, 1)
+        await salas.reservar(membro, HubFalso())
+        assert sala.members == [membro] and tipo.ocupadas == {sala.id: 1}
+        assert sala.overwrites[guild.default_role].connect is True and sala.overwrites[membro].manage_channels
+        await esperar_tarefas()   # o repor roda fora do caminho de quem entrou
+        return guild, tipo
+
+    guild, tipo = asyncio.run(cenario())
+    assert guild.criados == 2 and len(tipo.livres) == 1
+    assert sorted(c.name for c in guild.canais.values() if isinstance(c, CanalFalso)) == ["🛰️ DUO 01", "🛰️ DUO 02"]
+
+
+def test_sala_vazia_volta_escondida_ou_e_apagada_se_o_pool_esta_cheio(bot_rep):
+    async def cenario():
+        guild = ServidorFalso()
+        salas = gerenciador(minimo=1, maximo=4)
+        tipo = salas.tipos["duo"]
+        hub = HubFalso()
+        primeira, segunda = MembroFalso(guild, 1), MembroFalso(guild, 2)
+        await salas.reservar(primeira, hub)
+        await salas.reservar(segunda, hub)
+        await esperar_tarefas()
+        sala1, sala2 = (guild.get_channel(cid) for cid in list(tipo.ocupadas))
+        sala1.members.clear()
+        sala2.members.clear()
+        # Sem pedidos recentes o alvo cai para o mínimo
+        tipo.pedidos.clear()
+        tipo.livres.clear()
+        await salas.devolver(sala1)
+        await salas.devolver(sala2)
+        return guild, tipo, sala1, sala2
+
+    guild, tipo, sala1, sala2 = asyncio.run(cenario())
+    assert list(tipo.livres) == [sala1.id] and tipo.ocupadas == {}
+    assert sala1.overwrites[guild.default_role].view_channel is False
+    assert sala2.id not in guild.canais
+
+
+def test_pool_acompanha_os_pedidos_da_janela(bot_rep, monkeypatch):
+    salas = gerenciador(minimo=1, maximo=3, janela=600, fator=0.5)
+    tipo = salas.tipos["duo"]
+    relogio = [1000.0]
+    monkeypatch.setattr(bot_rep.time, "monotonic", lambda: relogio[0])
+    assert salas.alvo(tipo) == 1
+    tipo.pedidos.extend([500.0, 900.0, 950.0, 990.0])
+    assert salas.alvo(tipo) == 2   # o pedido de 500 já saiu da janela
+    tipo.pedidos.extend([995.0] * 10)
+    assert salas.alvo(tipo) == 3
+
+
+@pytest.mark.parametrize("nomes, numeros", [(["🛰️ DUO 03"], [1, 3]), (["🛰️ DUO 01", "🛰️ DUO 03"], [1, 2, 3])])
+def test_preparar_readota_as_salas_que_ja_existem(bot_rep, nomes, numeros):
+    async def cenario():
+        guild = ServidorFalso()
+        for i, nome in enumerate(nomes):
+            guild.canais[2000 + i] = CanalFalso(guild, 2000 + i, nome)
+        salas = gerenciador(minimo=len(nomes) + 1, maximo=4)
+        await salas.preparar(guild)
+        return guild, salas.tipos["duo"]
+
+    guild, tipo = asyncio.run(cenario())
+    assert guild.criados == 1
+    assert sorted(tipo.numeros.values()) == numeros
+
+
+def test_sala_vazia_so_e_recolhida_depois_da_carencia(bot_rep, monkeypatch):
+    relogio = [1000.0]
+    monkeypatch.setattr(bot_rep.time, "monotonic", lambda: relogio[0])
+
+    async def cenario():
+        guild = ServidorFalso()
+        monkeypatch.setattr(bot_rep.bot, "get_channel", guild.get_channel)
+        salas = gerenciador(minimo=1, maximo=4, carencia=60)
+        tipo = salas.tipos["duo"]
+        membro = MembroFalso(guild, 1)
+        await salas.reservar(membro, HubFalso())
+        await esperar_tarefas()
+        sala = guild.get_channel(next(iter(tipo.ocupadas)))
+        orfa = CanalFalso(guild, 3000, "Sala do Zé")   # criada antes de um restart
+        guild.canais[orfa.id] = orfa
+
+        sala.members.clear()
+        salas.marcar_vazia(sala)
+        salas.marcar_vazia(orfa)
+        relogio[0] += 30
+        assert await salas.varrer() == 0
+        sala.members.append(membro)   # caiu e voltou dentro da carência
+        salas.ocupada(sala.id)
+        relogio[0] += 60
+        assert await salas.varrer() == 1
+        assert sala.id in tipo.ocupadas and orfa.id not in guild.canais
+
+        sala.members.clear()
+        salas.marcar_vazia(sala)
+        relogio[0] += 61
+        assert await salas.varrer() == 1
+        return guild, tipo, sala
+
+    guild, tipo, sala = asyncio.run(cenario())
+    # O pool já tinha sido reposto, então a sala recolhida é apagada
+    assert tipo.ocupadas == {} and sala.id not in guild.canais
+
+
+def test_devolucoes_simultaneas_e_sala_renomeada(bot_rep):
+    async def cenario():
+        guild = ServidorFalso()
+        salas = gerenciador(minimo=2, maximo=4)
+        tipo = salas.tipos["duo"]
+        await salas.reservar(MembroFalso(guild, 1), HubFalso())
+        await salas.reservar(MembroFalso(guild, 2), HubFalso())
+        await esperar_tarefas()
+        sala, renomeada = (guild.get_channel(cid) for cid in tipo.ocupadas)
+        sala.members.clear()
+        renomeada.members.clear()
+        renomeada.name = "Sala do Zé"
+        tipo.livres.clear()
+        await asyncio.gather(salas.devolver(sala), salas.devolver(sala), salas.devolver(renomeada))
+        return guild, tipo, sala, renomeada
+
+    guild, tipo, sala, renomeada = asyncio.run(cenario())
+    assert list(tipo.livres) == [sala.id]
+    assert len(sala.edicoes) == 1   # criada na hora (pool vazio) e devolvida uma vez só
+    assert renomeada.id not in guild.canais and all("name" not in m for m in renomeada.edicoes)
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+class BancoFalso:
+    async def executar(self, sql, params=()):
+        return 1
+
+
+def test_indices_por_usuario_e_por_canal(bot_rep):
+    async def cenario():
+        registro = bot_rep.RegistroTickets(BancoFalso())
+        await registro.abrir(1, 100, 7)
+        await registro.abrir(2, 200, 7)
+        await registro.abrir(1, 101, 7)   # canal antigo sumiu e o usuário abriu outro
+        assert registro.do_canal(100) is None and registro.do_canal(101) == 1
+        assert await registro.atribuir(101, 50) is True
+        assert await registro.atribuir(101, 51) is False   # só o primeiro staff fica com o ticket
+        assert [uid for uid, _ in registro.por_staff(50)] == [1]
+        registro.por_usuario[2]["aberto_em"] = datetime.now() - timedelta(hours=30)
+        assert [uid for uid, _ in registro.mais_antigos_que(24)] == [2]
+        guild = SimpleNamespace(id=7, get_channel=lambda canal_id: None if canal_id == 200 else object())
+        assert await registro.reconciliar(guild) == 1
+        assert await registro.fechar(200) is False
+        assert await registro.fechar(101) is True
+        return registro
+
+    registro = asyncio.run(cenario())
+    assert registro.por_usuario == {} and registro.por_canal == {}
+
+
+def test_canal_criado_continua_contando_se_o_banco_falhar(bot_rep):
+    class BancoFora:
+        async def executar(self, sql, params=()):
+            raise RuntimeError("banco fora do ar")
+
+    async def cenario():
+        registro = bot_rep.RegistroTickets(BancoFora())
+        try:
+            await registro.abrir(1, 100, 7)
+        except RuntimeError:
+            pass
+        return registro
+
+    registro = asyncio.run(cenario())
+    assert registro.do_usuario(1)["canal_id"] == 100 and registro.do_canal(100) == 1
+
+
+def test_dois_cliques_seguidos_abrem_um_ticket_so(bot_rep):
+    abertos = []
+
+    async def clicar(registro, user_id):
+        async with registro.trava(user_id):
+            if registro.do_usuario(user_id): return
+            await asyncio.sleep(0.01)   # criando o canal no Discord
+            abertos.append(user_id)
+            await registro.abrir(user_id, 300 + len(abertos), 7)
+        registro.liberar(user_id)
+
+    async def cenario():
+        registro = bot_rep.RegistroTickets(BancoFalso())
+        await asyncio.gather(clicar(registro, 1), clicar(registro, 1), clicar(registro, 2))
+        return registro
+
+    registro = asyncio.run(cenario())
+    assert sorted(abertos) == [1, 2]
+    assert registro.travas == {}
+
+
+def test_tickets_sobrevivem_a_um_restart(bot_rep, postgres):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.executar('''CREATE TABLE tickets_abertos (user_id BIGINT PRIMARY KEY, canal_id BIGINT UNIQUE NOT NULL,
+            guild_id BIGINT, staff_id BIGINT, aberto_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        registro = bot_rep.RegistroTickets(banco)
+        await registro.abrir(1, 100, 7)
+        await registro.abrir(1, 101, 7)
+        await registro.abrir(2, 200, 7)
+        await registro.atribuir(101, 50)
+        await registro.fechar(200)
+        novo = bot_rep.RegistroTickets(banco)
+        await novo.carregar()
+        await banco.fechar()
+        return novo
+
+    novo = asyncio.run(cenario())
+    assert novo.por_canal == {101: 1}
+    assert novo.do_usuario(1)["staff_id"] == 50 and novo.do_usuario(1)["guild_id"] == 7
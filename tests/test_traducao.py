@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+
+class BackendFalso:
+    """Tradutor local: devolve o texto em maiúsculas e registra cada lote recebido."""
+
+    def __init__(self, liberar=None, erro=None):
+        self.lotes = []
+        self.liberar = liberar
+        self.erro = erro
+
+    def __call__(self, textos):
+        self.lotes.append(list(textos))
+        if self.liberar is not None:
+            self.liberar.wait(5)
+        if self.erro is not None:
+            raise self.erro
+        return [t.upper() for t in textos]
+
+
+def test_traduz_em_lote_e_usa_o_cache(bot_rep, tmp_path):
+    backend = BackendFalso()
+    caminho = str(tmp_path / "cache.json")
+
+    async def cenario():
+        servico = bot_rep.ServicoTraducao(backend, caminho)
+        primeiro = await servico.traduzir(["titulo", "", "resumo", "titulo"])
+        segundo = await servico.traduzir(["resumo"])
+        servico.fechar()
+        # Um serviço novo lê o cache gravado em disco
+        outro = bot_rep.ServicoTraducao(backend, caminho)
+        terceiro = await outro.traduzir(["titulo"])
+        outro.fechar()
+        return primeiro, segundo, terceiro
+
+    primeiro, segundo, terceiro = asyncio.run(cenario())
+    assert primeiro == ["TITULO", "", "RESUMO", "TITULO"]
+    assert segundo == ["RESUMO"] and terceiro == ["TITULO"]
+    assert backend.lotes == [["titulo", "resumo"]]
+
+
+def test_erro_devolve_o_original(bot_rep, tmp_path):
+    backend = BackendFalso(erro=RuntimeError("429"))
+
+    async def cenario():
+        servico = bot_rep.ServicoTraducao(backend, str(tmp_path / "cache.json"))
+        try:
+            return await servico.traduzir(["titulo"])
+        finally:
+            servico.fechar()
+
+    assert asyncio.run(cenario()) == ["titulo"]
+
+
+def test_lru_descarta_o_menos_usado(bot_rep, tmp_path):
+    backend = BackendFalso()
+
+    async def cenario():
+        servico = bot_rep.ServicoTraducao(backend, str(tmp_path / "cache.json"), limite=2)
+        await servico.traduzir(["a", "b"])
+        await servico.traduzir(["a"])          # "a" passa a ser o mais usado
+        await servico.traduzir(["c"])          # sai o "b"
+        await servico.traduzir(["a", "b"])
+        servico.fechar()
+
+    asyncio.run(cenario())
+    assert backend.lotes == [["a", "b"], ["c"], ["b"]]
+
+
+def test_chamada_presa_nao_segura_as_proximas(bot_rep, tmp_path):
+    liberar = threading.Event()
+    backend = BackendFalso(liberar=liberar)
+
+    async def cenario():
+        servico = bot_rep.ServicoTraducao(backend, str(tmp_path / "cache.json"), timeout=0.05, threads=1)
+        assert await servico.traduzir(["a"]) == ["a"]      # estourou o timeout, a thread segue presa
+        inicio = time.monotonic()
+        assert await servico.traduzir(["b"]) == ["b"]      # não entra na fila atrás da presa
+        assert time.monotonic() - inicio < 0.05
+        assert len(backend.lotes) == 1
+
+        liberar.set()
+        for _ in range(100):
+            if servico._em_andamento == 0: break
+            await asyncio.sleep(0.01)
+        assert await servico.traduzir(["c"]) == ["C"]
+        servico.fechar()
+
+    asyncio.run(cenario())
@@ -0,0 +1,99 @@
+import asyncio
+import io
+import json
+import zipfile
+from datetime import datetime
+from types import SimpleNamespace
+
+from aiohttp import web
+
+
+class CanalFalso:
+    def __init__(self, mensagens, limite_upload=10 * 1024 * 1024):
+        self.name = "ticket-ana"
+        self.mensagens = mensagens
+        self.guild = SimpleNamespace(filesize_limit=limite_upload)
+        self.enviados = []
+
+    async def history(self, limit=None, oldest_first=False):
+        for msg in self.mensagens:
+            yield msg
+
+    async def send(self, content=None, file=None):
+        self.enviados.append((content, file.filename, file.fp.read()))
+
+
+def mensagem(id, texto, anexos=()):
+    return SimpleNamespace(id=id, content=texto, created_at=datetime(2024, 5, 1, 12, id % 60),
+                           author=SimpleNamespace(name="ana", id=10),
+                           attachments=[SimpleNamespace(filename=nome, url=url) for nome, url in anexos])
+
+
+def test_transcricao_sem_limite_de_mensagens_nos_tres_formatos(bot_rep):
+    mensagens = [mensagem(i, f"mensagem {i} <b>") for i in range(1200)]
+    mensagens.append(mensagem(1200, "print", [("foto.png", "https://cdn/foto.png")]))
+    staff = SimpleNamespace(name="staff")
+
+    async def gerar(formato):
+        transcricao = bot_rep.TranscricaoTicket(CanalFalso(mensagens), staff, "resolvido", formato)
+        texto = (await transcricao.gerar()).read().decode("utf-8")
+        transcricao.arquivo.close()
+        return transcricao, texto
+
+    txt, texto = asyncio.run(gerar("txt"))
+    assert txt.total_mensagens == 1201 and "mensagem 1199 <b>" in texto
+    assert "   > Anexo: 1200_foto.png (https://cdn/foto.png)" in texto
+    assert txt.anexos == [("1200_foto.png", "https://cdn/foto.png")]
+
+    _, texto = asyncio.run(gerar("html"))
+    assert "mensagem 0 &lt;b&gt;" in texto and texto.endswith("</body></html>\n")
+
+    _, texto = asyncio.run(gerar("jsonl"))
+    linhas = [json.loads(linha) for linha in texto.splitlines()]
+    assert linhas[0]["motivo"] == "resolvido" and len(linhas) == 1202
+    assert linhas[-1]["anexos"] == [{"arquivo": "1200_foto.png", "url": "https://cdn/foto.png"}]
+
+
+def test_arquivo_maior_que_o_limite_vai_em_partes(bot_rep):
+    canal = CanalFalso([], limite_upload=64 * 1024 + 1000)
+    dados = bytes(range(256)) * 10
+
+    partes = asyncio.run(bot_rep.enviar_em_partes(canal, io.BytesIO(dados), "log.txt", "📄 Transcrição"))
+    assert partes == 3
+    assert [nome for _, nome, _ in canal.enviados] == ["log.txt.001", "log.txt.002", "log.txt.003"]
+    assert b"".join(bloco for _, _, bloco in canal.enviados) == dados
+    assert canal.enviados[0][0].startswith("📄 Transcrição\n📦 Arquivo grande: parte 1/3")
+
+    canal = CanalFalso([])
+    assert asyncio.run(bot_rep.enviar_em_partes(canal, io.BytesIO(dados), "log.txt", "📄")) == 1
+    assert canal.enviados == [("📄", "log.txt", dados)]
+
+
+def test_anexos_vao_para_um_zip_e_as_falhas_sao_listadas(bot_rep, monkeypatch):
+    async def foto(request):
+        return web.Response(body=b"\x89PNG" * 1000)
+
+    async def sumiu(request):
+        return web.Response(status=404)
+
+    async def cenario():
+        monkeypatch.setattr(bot_rep, "http", bot_rep.ClienteHTTP(tentativas=1))
+        app = web.Application()
+        app.router.add_get("/foto.png", foto)
+        app.router.add_get("/sumiu.png", sumiu)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        try:
+            arquivo, falhas = await bot_rep.arquivar_anexos([("1_foto.png", base + "/foto.png"), ("2_sumiu.png", base + "/sumiu.png")])
+        finally:
+            await bot_rep.http.fechar()
+            await runner.cleanup()
+        with zipfile.ZipFile(arquivo) as zf:
+            return {nome: zf.read(nome) for nome in zf.namelist()}, falhas
+
+    arquivos, falhas = asyncio.run(cenario())
+    assert arquivos == {"1_foto.png": b"\x89PNG" * 1000}
+    assert falhas == ["2_sumiu.png"]
@@ -0,0 +1,94 @@
+import asyncio
+
+
+class BancoFalso:
+    """Só conta as gravações: o que importa aqui é o espelho em memória."""
+
+    def __init__(self):
+        self.gravacoes = 0
+
+    async def buscar_todos(self, sql, params=(), nome=None):
+        return []
+
+    async def transacao(self, func, *args):
+        self.gravacoes += 1
+
+
+def test_posta_so_o_que_e_novo_do_mais_antigo_para_o_mais_novo(bot_rep, monkeypatch):
+    monkeypatch.setattr(bot_rep, "vistos", bot_rep.RegistroVistos(BancoFalso()))
+    postados = []
+
+    async def publicar(item, marcar_visto):
+        postados.append(item)
+
+    async def cenario():
+        # Primeira varredura: só registra o que já está no feed
+        await bot_rep.publicar_novos("noticias", ["/news/b", "/news/a"], publicar, "feed")
+        assert postados == []
+        # Feed com dois itens novos no topo (o mais novo primeiro, como o site mostra)
+        await bot_rep.publicar_novos("noticias", ["/news/d", "/news/c", "/news/b", "/news/a"], publicar, "feed")
+        await bot_rep.publicar_novos("noticias", ["/news/d", "/news/c", "/news/b"], publicar, "feed")
+
+    asyncio.run(cenario())
+    assert postados == ["/news/c", "/news/d"]
+
+
+def test_item_que_falhou_fica_para_a_proxima_varredura(bot_rep, monkeypatch):
+    monkeypatch.setattr(bot_rep, "vistos", bot_rep.RegistroVistos(BancoFalso()))
+    bot_rep.http.validadores["feed"] = {"etag": '"v1"', "modificado": None, "hash": "x"}
+    tentativas = []
+
+    async def publicar(item, marcar_visto):
+        tentativas.append(item)
+        if len(tentativas) == 1: raise RuntimeError("Discord fora do ar")
+
+    async def cenario():
+        await bot_rep.publicar_novos("videos", ["a"], publicar, "feed")
+        await bot_rep.publicar_novos("videos", ["b", "a"], publicar, "feed")
+        assert "feed" not in bot_rep.http.validadores   # a próxima varredura não pode receber 304
+        await bot_rep.publicar_novos("videos", ["b", "a"], publicar, "feed")
+        await bot_rep.publicar_novos("videos", ["b", "a"], publicar, "feed")
+
+    asyncio.run(cenario())
+    assert tentativas == ["b", "b"]
+
+
+def test_parte_extra_que_falha_nao_repete_o_post(bot_rep, monkeypatch):
+    monkeypatch.setattr(bot_rep, "vistos", bot_rep.RegistroVistos(BancoFalso()))
+    postados = []
+
+    async def publicar(item, marcar_visto):
+        postados.append(item)
+        await marcar_visto()
+        raise RuntimeError("falhou ao enviar as mídias da notícia")
+
+    async def cenario():
+        await bot_rep.publicar_novos("noticias", ["/news/a"], publicar, "feed")
+        await bot_rep.publicar_novos("noticias", ["/news/b", "/news/a"], publicar, "feed")
+        await bot_rep.publicar_novos("noticias", ["/news/b", "/news/a"], publicar, "feed")
+
+    asyncio.run(cenario())
+    assert postados == ["/news/b"]
+
+
+def test_itens_sobrevivem_a_um_restart_e_expiram(bot_rep, postgres):
+    async def cenario():
+        banco = bot_rep.PoolBanco(postgres, minimo=1, maximo=2)
+        await banco.executar('''CREATE TABLE itens_vistos (fonte TEXT NOT NULL, item_id TEXT NOT NULL,
+            visto_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (fonte, item_id))''')
+        registro = bot_rep.RegistroVistos(banco, ttl_dias=90)
+        await registro.marcar("videos", ["a", "b", "a"])
+        await registro.marcar("noticias", ["/news/x"])
+        await banco.executar("UPDATE itens_vistos SET visto_em = CURRENT_TIMESTAMP - INTERVAL '100 days' WHERE item_id = 'a'")
+        novo = bot_rep.RegistroVistos(banco, ttl_dias=90)
+        await novo.carregar()
+        antes = {fonte: sorted(itens) for fonte, itens in novo.itens.items()}
+        removidos = await novo.expirar()
+        depois = novo.novos("videos", ["a", "b", "c"])
+        await banco.fechar()
+        return antes, removidos, depois
+
+    antes, removidos, depois = asyncio.run(cenario())
+    assert antes == {"videos": ["a", "b"], "noticias": ["/news/x"]}
+    assert removidos == 1
+    assert depois == ["a", "c"]